@@ -1,3 +1,6 @@
+import os
+from typing import AsyncIterator
+
 from fastapi import Depends, Header, HTTPException, status
 
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -5,10 +8,28 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.db import get_session
 from app.models.schemas import User
 from app.services import auth, logic
+from app.services.repository import Repository, SqlRepository
+
+STORAGE = os.getenv("YH_STORAGE", "postgres")
+
+
+async def get_repository(session: AsyncSession = Depends(get_session)) -> AsyncIterator[Repository]:
+    # 与同一请求中的 get_session 共用一个会话；内存模式下会话不会建立连接
+    if STORAGE == "memory":
+        from app.services import memory_store
+
+        repo = memory_store.MemoryRepository(memory_store.get_store())
+    else:
+        repo = SqlRepository(session)
+    try:
+        yield repo
+    finally:
+        # 已 commit 时为空操作；异常或提前返回时释放锁并撤销未提交的修改
+        await repo.rollback()
 
 
 async def get_current_user(
-    authorization: str | None = Header(default=None), session: AsyncSession = Depends(get_session)
+    authorization: str | None = Header(default=None), repo: Repository = Depends(get_repository)
 ) -> User:
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
@@ -17,7 +38,7 @@ async def get_current_user(
     if not payload:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     user_id = payload.get("sub")
-    user = await logic.get_user_by_id(session, user_id)
+    user = await logic.get_user_by_id(repo, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
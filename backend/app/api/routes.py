@@ -1,30 +1,46 @@
-from datetime import datetime
+import asyncio
+from datetime import date, datetime, timedelta
 from typing import List
 
 import sqlalchemy as sa
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi import Response, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.api import deps
 from app.db import get_session
 from app.models import schemas
-from app.models.entities import InventoryLog, Product, PurchaseOrder, Category, ProductCategory
-from app.services import auth, logic
+from app.models.entities import InventoryLog, Product, PurchaseOrder
+from app.services import (
+    auth,
+    catalog,
+    events,
+    export,
+    forecast,
+    http_cache,
+    idempotency,
+    logic,
+    metrics,
+    reorder,
+    repricing,
+    serialization,
+)
+from app.services.repository import Repository
 
 router = APIRouter(prefix="/api")
 
 
 @router.post("/auth/weapp", response_model=schemas.LoginResponse)
-async def login_weapp(payload: schemas.WeappLoginRequest, session: AsyncSession = Depends(get_session)):
+async def login_weapp(payload: schemas.WeappLoginRequest, repo: Repository = Depends(deps.get_repository)):
     try:
         openid = await auth.weapp_code_to_openid(payload.code)
     except ValueError:
         # fallback: 未配置或微信返回错误时，使用本地 mock，便于开发环境
         openid = auth.make_openid_from_code(payload.code)
-    user = await logic.get_or_create_user_by_openid(session, openid, payload.nickname)
-    await session.commit()
+    user = await logic.get_or_create_user_by_openid(repo, openid, payload.nickname)
+    await repo.commit()
     token = auth.create_access_token(user)
     return schemas.LoginResponse(token=token, username=user.username, role=user.role)
 
@@ -35,11 +51,44 @@ async def me(current_user=Depends(deps.get_current_user)):
 
 
 @router.get("/price/calculate/{product_id}", response_model=schemas.PriceCalcResponse)
-async def calculate_price(product_id: str, session: AsyncSession = Depends(get_session)):
-    product = await session.get(Product, product_id)
+async def calculate_price(product_id: str, repo: Repository = Depends(deps.get_repository)):
+    product = (await repo.get_products([product_id])).get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="product not found")
-    return await logic.calculate_price_for_product(session, product)
+    return await logic.calculate_price_for_product(repo, product)
+
+
+@router.post("/price/calculate", response_model=schemas.PriceBatchResponse)
+async def calculate_prices(payload: schemas.PriceBatchRequest, repo: Repository = Depends(deps.get_repository)):
+    items, missing = await logic.calculate_prices_for_ids(repo, payload.product_ids)
+    return schemas.PriceBatchResponse(items=items, missing=missing)
+
+
+@router.post("/pricing/simulate", response_model=schemas.PricingSimulation)
+async def simulate_pricing(scenario: schemas.PricingScenario, session: AsyncSession = Depends(get_session)):
+    try:
+        result, *_ = await repricing.simulate(session, scenario)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return result
+
+
+@router.post("/pricing/apply", response_model=schemas.PricingSimulation)
+async def apply_pricing(
+    scenario: schemas.PricingScenario,
+    session: AsyncSession = Depends(get_session),
+    current_user=Depends(deps.get_current_user),
+):
+    if not current_user or getattr(current_user, "role", None) != "owner":
+        raise HTTPException(status_code=403, detail="forbidden")
+    try:
+        result = await repricing.apply(session, scenario)
+        await session.commit()
+    except ValueError as exc:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    events.publish("pricing")
+    return result
 
 
 @router.post("/products", response_model=schemas.Product)
@@ -49,6 +98,7 @@ async def create_product(product: schemas.Product, session: AsyncSession = Depen
         raise HTTPException(status_code=400, detail="product id already exists")
     created = await logic.create_product(session, product)
     await session.commit()
+    events.publish("product", [created.id])
     return schemas.Product(
         id=created.id,
         name=created.name,
@@ -57,6 +107,7 @@ async def create_product(product: schemas.Product, session: AsyncSession = Depen
         base_cost_price=created.base_cost_price,
         fixed_retail_price=created.fixed_retail_price,
         img_url=created.img_url,
+        version=created.version,
     )
 
 
@@ -69,9 +120,8 @@ async def list_products(
     custom_category_ids: str | None = None,
     merchant_category_ids: str | None = None,
     keyword: str | None = None,
-    session: AsyncSession = Depends(get_session),
+    repo: Repository = Depends(deps.get_repository),
     request: Request = None,
-    response: Response = None,
 ):
     limit = max(1, min(limit, 100))
     ids_list = [c for c in (category_ids.split(",") if category_ids else []) if c]
@@ -81,7 +131,7 @@ async def list_products(
         # 兼容老参数，若未使用 category_ids 则使用 custom_category_ids
         ids_list = custom_ids_list
     items, total, version = await logic.list_products_with_inventory(
-        session,
+        repo,
         offset=offset,
         limit=limit,
         category_id=category_id,
@@ -90,12 +140,24 @@ async def list_products(
         merchant_category_ids=merchant_ids_list,
         keyword=keyword,
     )
-    etag = f'W/"{version}"'
-    inm = request.headers.get("if-none-match") if request else None
-    if inm == etag:
-        return Response(status_code=304)
-    response.headers["ETag"] = etag
-    return schemas.ProductListResponse(items=items, total=total)
+    http_cache.check(request, etag=f'W/"{version}"')
+    return serialization.FastJSONResponse({"items": items, "total": total})
+
+
+@router.get("/catalog/snapshot")
+async def catalog_snapshot(request: Request, session: AsyncSession = Depends(get_session)):
+    encoded = await catalog.snapshot.get(session)
+    encoding = catalog.choose_encoding(request.headers.get("accept-encoding"), encoded.bodies)
+    headers = {
+        "ETag": catalog.etag_for(encoded, encoding),
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+    }
+    if catalog.etag_matches(request.headers.get("if-none-match"), encoded):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=encoded.bodies[encoding], media_type="application/json", headers=headers)
 
 
 @router.get("/products/{product_id}", response_model=schemas.Product)
@@ -107,23 +169,31 @@ async def get_product(product_id: str, session: AsyncSession = Depends(get_sessi
 
 
 @router.get("/categories", response_model=list[schemas.Category])
-async def list_categories(session: AsyncSession = Depends(get_session), request: Request = None, response: Response = None):
+async def list_categories(request: Request, session: AsyncSession = Depends(get_session)):
     cats = (await session.execute(sa.select(logic.Category))).scalars().all()
-    version = logic.compute_version_from_models(cats)
-    etag = f'W/"{version}"'
-    inm = request.headers.get("if-none-match") if request else None
-    if inm == etag:
-        return Response(status_code=304)
-    response.headers["ETag"] = etag
+    http_cache.check(request, etag=f'W/"{logic.compute_version_from_models(cats)}"')
     return cats
 
 
+@router.get("/categories/summary", response_model=list[schemas.CategorySummary])
+async def category_summary(request: Request, session: AsyncSession = Depends(get_session)):
+    # 由目录快照汇总并按快照版本缓存，写入后随快照增量刷新
+    etag, items = await catalog.snapshot.category_summaries(session)
+    http_cache.check(request, etag=f'W/"{etag}"')
+    return serialization.FastJSONResponse(items)
+
+
 @router.post("/categories", response_model=schemas.Category)
 async def create_category(category: schemas.Category, session: AsyncSession = Depends(get_session)):
     created = await logic.create_category(session, category)
     await session.commit()
+    events.publish("category")
     return schemas.Category(
-        id=created.id, name=created.name, retail_multiplier=created.retail_multiplier, is_custom=created.is_custom
+        id=created.id,
+        name=created.name,
+        retail_multiplier=created.retail_multiplier,
+        is_custom=created.is_custom,
+        version=created.version,
     )
 
 
@@ -132,36 +202,67 @@ async def delete_category(category_id: str, force: bool = False, session: AsyncS
     try:
         cleared = await logic.delete_category(session, category_id, force=force)
         await session.commit()
+        events.publish("category")
         return {"cleared_products": cleared}
     except ValueError as exc:
         await session.rollback()
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
-@router.put("/categories/{category_id}/products")
-async def replace_products_in_category(category_id: str, data: dict, session: AsyncSession = Depends(get_session)):
-    product_ids = data.get("product_ids") or []
-    if not isinstance(product_ids, list):
-        raise HTTPException(status_code=400, detail="product_ids must be list")
-    # ensure category exists
-    cat = await session.get(Category, category_id)
-    if not cat:
-        raise HTTPException(status_code=404, detail="category not found")
-    unique_ids = [pid for pid in dict.fromkeys(product_ids) if pid]
-    # remove all existing mappings for this category, then insert selected
-    await session.execute(sa.delete(ProductCategory).where(ProductCategory.category_id == category_id))
-    if unique_ids:
-        session.add_all([ProductCategory(product_id=pid, category_id=category_id) for pid in unique_ids])
-    await session.commit()
-    return {"count": len(unique_ids)}
+async def _assign_categories(session: AsyncSession, items: list[schemas.CategoryAssignment]):
+    try:
+        results = await logic.assign_category_products(session, items)
+        await session.commit()
+    except ValueError as exc:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    changed = list({pid for r in results for pid in r.added + r.removed})
+    if changed:
+        events.publish("product", changed)
+    return results
+
+
+@router.put("/categories/{category_id}/products", response_model=schemas.CategoryAssignResult)
+async def replace_products_in_category(
+    category_id: str, payload: schemas.CategoryAssignRequest, session: AsyncSession = Depends(get_session)
+):
+    # 整体替换为 product_ids，库内按差异只增删变化的关联
+    item = schemas.CategoryAssignment(category_id=category_id, product_ids=payload.product_ids or [])
+    return (await _assign_categories(session, [item]))[0]
+
+
+@router.patch("/categories/{category_id}/products", response_model=schemas.CategoryAssignResult)
+async def update_products_in_category(
+    category_id: str, payload: schemas.CategoryAssignRequest, session: AsyncSession = Depends(get_session)
+):
+    item = schemas.CategoryAssignment(category_id=category_id, **payload.model_dump())
+    return (await _assign_categories(session, [item]))[0]
+
+
+@router.post("/categories/assignments", response_model=list[schemas.CategoryAssignResult])
+async def assign_categories(payload: schemas.CategoryAssignBatch, session: AsyncSession = Depends(get_session)):
+    # 多个分类的增删在同一事务内完成，版本号与事件每批只更新一次
+    return await _assign_categories(session, payload.items)
 
 
 @router.put("/products/{product_id}", response_model=schemas.Product)
-async def update_product(product_id: str, payload: schemas.Product, session: AsyncSession = Depends(get_session)):
+async def update_product(
+    product_id: str,
+    payload: schemas.Product,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    session: AsyncSession = Depends(get_session),
+):
+    version = http_cache.expected_version(if_match, payload.version)
     try:
-        updated = await logic.update_product(session, product_id, payload)
+        updated = await logic.update_product(session, product_id, payload, version)
         await session.commit()
+        events.publish("product", [product_id])
+        response.headers["ETag"] = http_cache.version_etag(updated.version)
         return updated
+    except logic.VersionConflict as exc:
+        await session.rollback()
+        raise HTTPException(status_code=412, detail=str(exc)) from exc
     except ValueError as exc:
         await session.rollback()
         raise HTTPException(status_code=404, detail=str(exc)) from exc
@@ -172,18 +273,57 @@ async def delete_product(product_id: str, session: AsyncSession = Depends(get_se
     try:
         await logic.delete_product(session, product_id)
         await session.commit()
+        events.publish("product", [product_id])
         return {"status": "ok"}
     except ValueError as exc:
         await session.rollback()
         raise HTTPException(status_code=404, detail=str(exc)) from exc
 
 
-@router.put("/categories/{category_id}", response_model=schemas.Category)
-async def update_category(category_id: str, category: schemas.Category, session: AsyncSession = Depends(get_session)):
-    updated = await logic.upsert_category(session, category_id, category)
+@router.post("/products/batch", response_model=list[schemas.ProductBulkResult])
+async def update_products_batch(payload: schemas.ProductBulkUpdate, session: AsyncSession = Depends(get_session)):
+    # 批量部分更新：一个事务内按字段分组执行 UPDATE ... FROM (VALUES ...)，逐条返回结果
+    results = await logic.update_products_bulk(session, payload.items)
     await session.commit()
+    changed = [r.id for r in results if r.status == "updated"]
+    if changed:
+        events.publish("product", changed)
+    return results
+
+
+@router.post("/products/batch/delete", response_model=list[schemas.ProductBulkResult])
+async def delete_products_batch(payload: schemas.ProductBulkDelete, session: AsyncSession = Depends(get_session)):
+    results = await logic.delete_products_bulk(session, payload.product_ids)
+    await session.commit()
+    deleted = [r.id for r in results if r.status == "deleted"]
+    if deleted:
+        events.publish("product", deleted)
+    return results
+
+
+@router.put("/categories/{category_id}", response_model=schemas.Category)
+async def update_category(
+    category_id: str,
+    category: schemas.Category,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    session: AsyncSession = Depends(get_session),
+):
+    version = http_cache.expected_version(if_match, category.version)
+    try:
+        updated = await logic.upsert_category(session, category_id, category, version)
+        await session.commit()
+    except logic.VersionConflict as exc:
+        await session.rollback()
+        raise HTTPException(status_code=412, detail=str(exc)) from exc
+    events.publish("category")
+    response.headers["ETag"] = http_cache.version_etag(updated.version)
     return schemas.Category(
-        id=updated.id, name=updated.name, retail_multiplier=updated.retail_multiplier, is_custom=updated.is_custom
+        id=updated.id,
+        name=updated.name,
+        retail_multiplier=updated.retail_multiplier,
+        is_custom=updated.is_custom,
+        version=updated.version,
     )
 
 
@@ -218,44 +358,156 @@ async def get_import_job(job_id: str):
 async def create_sales(
     items: List[schemas.SalesItemPayload],
     username: str = "owner",
+    idempotency_key: str | None = Header(default=None, max_length=128),
+    repo: Repository = Depends(deps.get_repository),
+):
+    if not idempotency_key:
+        try:
+            order = await logic.create_sales_order(repo, items, username)
+            await repo.commit()
+            metrics.record_sales(1, len(items))
+            events.publish("sales", [i.product_id for i in items])
+            return order
+        except ValueError as exc:
+            await repo.rollback()
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    async def submit():
+        # 弱网重试：已有结果直接返回，不再重复扣库存
+        existing = await repo.get_sales_order_by_idempotency_key(idempotency_key)
+        metrics.record_cache("idempotency", existing is not None)
+        if existing:
+            return existing
+        if idempotency.should_purge():
+            await repo.purge_expired_idempotency_keys()
+        if not await repo.claim_idempotency_key(idempotency_key, idempotency.IDEMPOTENCY_TTL_SECONDS):
+            await repo.rollback()
+            existing = await repo.get_sales_order_by_idempotency_key(idempotency_key)
+            if existing:
+                return existing
+            raise HTTPException(status_code=409, detail="duplicate request in progress")
+        try:
+            order = await logic.create_sales_order(repo, items, username)
+            await repo.bind_idempotency_key(idempotency_key, order.id)
+            await repo.commit()
+        except ValueError as exc:
+            await repo.rollback()
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        metrics.record_sales(1, len(items))
+        events.publish("sales", [i.product_id for i in items])
+        return order
+
+    return await idempotency.coalesce(idempotency_key, submit)
+
+
+@router.post("/sales/batch", response_model=List[schemas.SalesBatchResult])
+async def create_sales_batch(
+    payload: schemas.SalesBatchRequest,
+    username: str = "owner",
     session: AsyncSession = Depends(get_session),
 ):
+    results = await logic.create_sales_orders_batch(
+        session, payload.orders, username, idempotency.IDEMPOTENCY_TTL_SECONDS
+    )
+    await session.commit()
+    created = [o for o, r in zip(payload.orders, results) if r.status == "created"]
+    metrics.record_sales(len(created), sum(len(o.items) for o in created), source="batch")
+    if created:
+        events.publish("sales", list({i.product_id for o in created for i in o.items}))
+    return results
+
+
+@router.get("/sales", response_model=schemas.SalesOrderPage)
+async def list_sales(
+    date_from: date | None = None,
+    date_to: date | None = None,
+    created_by: str | None = None,
+    product_id: str | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+    session: AsyncSession = Depends(get_session),
+):
+    limit = max(1, min(limit, 100))
     try:
-        order = await logic.create_sales_order(session, items, username)
-        await session.commit()
-        return order
+        items, next_cursor = await logic.list_sales_orders(
+            session,
+            date_from=date_from,
+            date_to=date_to,
+            created_by=created_by,
+            product_id=product_id,
+            cursor=cursor,
+            limit=limit,
+        )
     except ValueError as exc:
-        await session.rollback()
         raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return schemas.SalesOrderPage(items=items, next_cursor=next_cursor)
 
 
 @router.post("/inventory/adjust", response_model=schemas.InventoryRecord)
 async def adjust_inventory(
-    req: schemas.InventoryAdjustRequest, username: str = "owner", session: AsyncSession = Depends(get_session)
+    req: schemas.InventoryAdjustRequest,
+    response: Response,
+    username: str = "owner",
+    if_match: str | None = Header(default=None),
+    repo: Repository = Depends(deps.get_repository),
 ):
+    # 增减量天然可合并，不带版本时只在并发冲突时重试；带版本时按版本校验
+    version = http_cache.expected_version(if_match, req.version)
     try:
-        inv = await logic.adjust_inventory(session, req, username)
-        await session.commit()
+        inv = await logic.adjust_inventory(repo, req, username, version)
+        await repo.commit()
+        events.publish("inventory", [req.product_id])
+        response.headers["ETag"] = http_cache.version_etag(inv.version)
         return inv
+    except logic.VersionConflict as exc:
+        await repo.rollback()
+        raise HTTPException(status_code=412, detail=str(exc)) from exc
     except ValueError as exc:
-        await session.rollback()
+        await repo.rollback()
         raise HTTPException(status_code=404, detail=str(exc)) from exc
 
 
 @router.get("/inventory/overview", response_model=list[schemas.InventoryOverviewItem])
-async def inventory_overview(session: AsyncSession = Depends(get_session), request: Request = None, response: Response = None):
+async def inventory_overview(request: Request, session: AsyncSession = Depends(get_session)):
     items, version = await logic.inventory_overview(session, with_version=True)
-    etag = f'W/"{version}"'
-    inm = request.headers.get("if-none-match") if request else None
-    if inm == etag:
-        return Response(status_code=304)
-    response.headers["ETag"] = etag
-    return items
+    http_cache.check(request, etag=f'W/"{version}"')
+    return serialization.FastJSONResponse(items)
+
+
+@router.get("/inventory/reorder", response_model=list[schemas.ReorderSuggestion])
+async def reorder_suggestions(
+    lead_days: int = 7,
+    cover_days: int = 14,
+    safety_days: int = 3,
+    include_ok: bool = False,
+    use_forecast: bool = False,
+    session: AsyncSession = Depends(get_session),
+):
+    # 低库存预警与建议采购量，按级别（out/critical/low）与可售天数排序
+    params = reorder.ReorderParams(
+        lead_days=lead_days, cover_days=cover_days, safety_days=safety_days, use_forecast=use_forecast
+    )
+    try:
+        return await reorder.suggest(session, params, include_ok=include_ok)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+
+
+@router.get("/forecast/festival", response_model=schemas.FestivalForecast)
+async def festival_forecast(
+    category_id: str | None = None, limit: int = 50, session: AsyncSession = Depends(get_session)
+):
+    # 本季春节窗口的分类与商品预测；未安装 numpy 或未配置春节日期时 503
+    limit = max(1, min(limit, 500))
+    try:
+        return await forecast.festival_summary(session, category_id=category_id, limit=limit)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
 
 
 @router.get("/inventory/{product_id}", response_model=schemas.InventoryRecord)
-async def get_inventory(product_id: str, session: AsyncSession = Depends(get_session)):
-    inv = await logic.get_inventory_record(session, product_id, create_if_missing=False)
+async def get_inventory(product_id: str, repo: Repository = Depends(deps.get_repository)):
+    inv = await repo.get_inventory(product_id)
     if not inv:
         raise HTTPException(status_code=404, detail="product not found")
     return inv
@@ -275,6 +527,35 @@ async def list_purchase_orders(session: AsyncSession = Depends(get_session)):
     return orders
 
 
+@router.get("/purchase-orders/query", response_model=schemas.PurchaseOrderPage)
+async def query_purchase_orders(
+    status: str | None = None,
+    supplier: str | None = None,
+    expected_from: date | None = None,
+    expected_to: date | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+    include_items: bool = False,
+    session: AsyncSession = Depends(get_session),
+):
+    limit = max(1, min(limit, 100))
+    statuses = [s for s in (status.split(",") if status else []) if s]
+    try:
+        items, next_cursor = await logic.list_purchase_orders(
+            session,
+            statuses=statuses,
+            supplier=supplier,
+            expected_from=expected_from,
+            expected_to=expected_to,
+            cursor=cursor,
+            limit=limit,
+            include_items=include_items,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return schemas.PurchaseOrderPage(items=items, next_cursor=next_cursor)
+
+
 @router.post("/purchase-orders", response_model=schemas.PurchaseOrder)
 async def create_purchase_order(po: schemas.PurchaseOrder, session: AsyncSession = Depends(get_session)):
     order = await logic.create_purchase_order(session, po)
@@ -282,11 +563,37 @@ async def create_purchase_order(po: schemas.PurchaseOrder, session: AsyncSession
     return order
 
 
+@router.post("/purchase-orders/reorder", response_model=schemas.PurchaseOrder)
+async def create_reorder_purchase(payload: schemas.ReorderDraftRequest, session: AsyncSession = Depends(get_session)):
+    # 按补货建议生成采购单（走 create_purchase_order），只包含建议箱数大于 0 的商品
+    params = reorder.ReorderParams(
+        lead_days=payload.lead_days,
+        cover_days=payload.cover_days,
+        safety_days=payload.safety_days,
+        use_forecast=payload.use_forecast,
+    )
+    try:
+        suggestions = await reorder.suggest(session, params)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    if payload.product_ids is not None:
+        wanted = set(payload.product_ids)
+        suggestions = [s for s in suggestions if s.product_id in wanted]
+    expected_date = payload.expected_date or date.today() + timedelta(days=payload.lead_days)
+    draft = reorder.build_purchase_draft(suggestions, payload.supplier, expected_date, payload.created_by, payload.remark)
+    if not draft.items:
+        raise HTTPException(status_code=400, detail="no products need reordering")
+    order = await logic.create_purchase_order(session, draft)
+    await session.commit()
+    return order
+
+
 @router.put("/purchase-orders/{po_id}/receive", response_model=schemas.PurchaseOrder)
 async def receive_purchase(po_id: str, items: List[schemas.PurchaseItem], session: AsyncSession = Depends(get_session)):
     try:
         order = await logic.receive_purchase(session, po_id, items)
         await session.commit()
+        events.publish("purchase", [i.product_id for i in items])
         return order
     except ValueError as exc:
         await session.rollback()
@@ -295,19 +602,7 @@ async def receive_purchase(po_id: str, items: List[schemas.PurchaseItem], sessio
 
 @router.get("/dashboard/realtime", response_model=schemas.DashboardRealtime)
 async def dashboard_realtime(session: AsyncSession = Depends(get_session)):
-    actual, expected, diff, diff_rate, gp, orders, avg, manual = await logic.dashboard_realtime(session)
-    gross_margin = (gp / actual * 100) if actual else 0
-    return schemas.DashboardRealtime(
-        actual_sales=round(actual, 2),
-        expected_sales=round(expected, 2),
-        receipt_diff=round(diff, 2),
-        receipt_diff_rate=round(diff_rate, 2),
-        gross_profit=round(gp, 2),
-        orders=orders,
-        avg_ticket=round(avg, 2),
-        gross_margin=round(gross_margin, 2),
-        manual_receipt=manual,
-    )
+    return await logic.build_dashboard_realtime(session)
 
 
 @router.post("/dashboard/manual_receipt")
@@ -323,6 +618,7 @@ async def set_manual_receipt(
         raise HTTPException(status_code=400, detail="invalid value")
     await logic.set_manual_receipt(session, amount)
     await session.commit()
+    events.publish("manual_receipt")
     return {"status": "ok", "value": amount}
 
 
@@ -340,3 +636,67 @@ async def dashboard_receipt_total(session: AsyncSession = Depends(get_session)):
 @router.get("/dashboard/performance", response_model=schemas.PerformanceResponse)
 async def dashboard_performance(session: AsyncSession = Depends(get_session)):
     return await logic.dashboard_performance(session)
+
+
+@router.get("/export/{dataset}")
+async def export_data(dataset: str, start: date | None = None, end: date | None = None, format: str = "csv"):
+    # 流式下载 sales_items / orders / inventory_logs / products，逐批从服务端游标读取；列式格式用 utils/export_data.py
+    if format not in ("csv", "csv.gz"):
+        raise HTTPException(status_code=400, detail="format must be csv or csv.gz")
+    try:
+        body = export.stream_csv(dataset, start, end, compressed=format == "csv.gz")
+        # 先取表头，数据集/参数错误在响应开始前返回 400
+        head = await anext(body)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    async def stream():
+        yield head
+        async for chunk in body:
+            yield chunk
+
+    suffix = "_".join(str(d) for d in (start, end) if d)
+    filename = f"{dataset}{'_' + suffix if suffix else ''}.{format}"
+    media_type = "application/gzip" if format == "csv.gz" else "text/csv; charset=utf-8"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type=media_type, headers=headers)
+
+
+@router.get("/dashboard/stream")
+async def dashboard_stream(request: Request):
+    # SSE：先发当前快照，之后每次数据变化推送一次（只含变化的分区），空闲时发心跳注释
+    async def stream():
+        queue = events.broker.subscribe()
+        try:
+            yield events.format_sse(await events.broker.initial())
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=events.HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield events.format_sse(message)
+        finally:
+            events.broker.unsubscribe(queue)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+
+@router.websocket("/dashboard/ws")
+async def dashboard_ws(websocket: WebSocket):
+    # 小程序不支持 EventSource，使用 WebSocket 接收同样的消息
+    await websocket.accept()
+    queue = events.broker.subscribe()
+    try:
+        await websocket.send_json(await events.broker.initial())
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=events.HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                message = {"type": "ping"}
+            await websocket.send_json(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        events.broker.unsubscribe(queue)
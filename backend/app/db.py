@@ -1,15 +1,33 @@
 import os
+from pathlib import Path
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
 
+ENV_FILE = Path(__file__).resolve().parent.parent / ".env"
+
+
+def _async_driver(url: str) -> str:
+    if url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def read_env_file(key: str, path: Path = ENV_FILE) -> str | None:
+    if not path.exists():
+        return None
+    for line in path.read_text().splitlines():
+        name, sep, val = line.partition("=")
+        if sep and name.strip() == key:
+            return val.strip().strip('"').strip("'")
+    return None
+
+
 def build_database_url() -> str:
     url = os.getenv("DATABASE_URL")
     if url:
-        if url.startswith("postgresql://"):
-            url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
-        return url
+        return _async_driver(url)
     user = os.getenv("POSTGRES_USER", "postgres")
     pwd = os.getenv("POSTGRES_PASSWORD", "postgres")
     host = os.getenv("POSTGRES_HOST", "postgres")
@@ -18,6 +36,14 @@ def build_database_url() -> str:
     return f"postgresql+asyncpg://{user}:{pwd}@{host}:{port}/{db}"
 
 
+def load_database_url() -> str:
+    # utils 脚本用：环境变量优先，其次 backend/.env，均未设置时报错（不回退到 POSTGRES_* 默认值）
+    url = os.getenv("DATABASE_URL") or read_env_file("DATABASE_URL")
+    if not url:
+        raise RuntimeError("DATABASE_URL is not set")
+    return _async_driver(url)
+
+
 DATABASE_URL = build_database_url()
 
 
@@ -3,18 +3,25 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api import deps
 from app.api.routes import router
-from app.db import Base, engine, SessionLocal
-from app.services.logic import ensure_defaults
+from app.db import engine
+from app.migrations import run_migrations
+from app.services import events, http_cache, metrics, profiling
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    async with SessionLocal() as session:
-        await ensure_defaults(session)
+    if deps.STORAGE == "memory":
+        # 内存模式不连数据库，见 app/services/memory_store.py
+        yield
+        return
+    # 版本已是最新时只有一次查询；多 worker 并发启动由 advisory lock 串行化
+    await run_migrations(engine)
+    await events.start()
     yield
+    await events.stop()
+    metrics.mark_process_dead()
 
 
 app = FastAPI(title="烟花爆竹后台管理系统 API", version="0.1.0", lifespan=lifespan)
@@ -26,9 +33,28 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 压缩与条件请求（ETag/Last-Modified、304）
+app.add_middleware(http_cache.HttpCacheMiddleware)
 
 app.include_router(router)
 
+if metrics.METRICS_ENABLED:
+    metrics.instrument_pool(engine.sync_engine)
+    app.add_middleware(metrics.MetricsMiddleware)
+
+if profiling.PROFILING_ENABLED:
+    profiling.instrument_engine(engine.sync_engine)
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+    @app.get("/metrics/requests")
+    async def request_profile():
+        return profiling.snapshot()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return metrics.render()
+
 
 @app.get("/health")
 async def health():
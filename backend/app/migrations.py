@@ -0,0 +1,195 @@
+"""
+版本化数据库迁移。
+
+- `schema_version` 表记录已执行的迁移版本；各 worker 启动时只读一次版本号，已是最新则直接跳过，不做元数据反射。
+- 需要迁移时通过 Postgres advisory lock 保证只有一个 worker 执行，其余 worker 等锁释放后复查版本即可。
+- 索引迁移使用 `CREATE INDEX CONCURRENTLY`，不阻塞线上读写；迁移均为幂等写法，中断后可重复执行。
+
+新增迁移：在 `MIGRATIONS` 末尾追加一项，版本号递增。
+"""
+
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.schema import CreateIndex
+
+from app.db import Base
+from app.models import entities
+
+ADVISORY_LOCK_KEY = 0x79685F6D  # "yh_m"
+
+schema_version = sa.Table(
+    "schema_version",
+    sa.MetaData(),
+    sa.Column("version", sa.Integer, primary_key=True),
+    sa.Column("description", sa.String(200), nullable=False),
+    sa.Column("applied_at", sa.DateTime, nullable=False, server_default=sa.func.now()),
+)
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    statements: list[str] = field(default_factory=list)
+    run: Callable[[AsyncConnection], Awaitable[None]] | None = None
+    # 需要并发创建的索引名（须已在 entities 中声明）
+    indexes: list[str] = field(default_factory=list)
+
+
+async def _create_baseline(conn: AsyncConnection):
+    await conn.run_sync(Base.metadata.create_all)
+
+
+async def _seed_defaults(conn: AsyncConnection):
+    from app.services.logic import DEFAULT_GLOBAL_MULTIPLIER
+
+    await conn.execute(
+        pg_insert(entities.SystemConfig)
+        .values(key="global_multiplier", value=str(DEFAULT_GLOBAL_MULTIPLIER))
+        .on_conflict_do_nothing(index_elements=["key"])
+    )
+    await conn.execute(
+        pg_insert(entities.Warehouse).values(id="default", name="默认仓").on_conflict_do_nothing(index_elements=["id"])
+    )
+
+
+async def _create_sales_daily(conn: AsyncConnection):
+    # 建表后按历史销售回填一次，此后由下单流程增量维护
+    from app.services.logic import rebuild_sales_daily
+
+    await conn.run_sync(lambda sync_conn: entities.SalesDaily.__table__.create(sync_conn, checkfirst=True))
+    await rebuild_sales_daily(conn)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "baseline tables", run=_create_baseline),
+    Migration(
+        2,
+        "legacy columns",
+        statements=[
+            "ALTER TABLE product ADD COLUMN IF NOT EXISTS retail_multiplier double precision",
+            "ALTER TABLE product ADD COLUMN IF NOT EXISTS pack_price_ref double precision",
+            "ALTER TABLE product ADD COLUMN IF NOT EXISTS effect_url varchar(500)",
+            "ALTER TABLE product ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT now()",
+            "ALTER TABLE category ADD COLUMN IF NOT EXISTS is_custom boolean DEFAULT false",
+            "ALTER TABLE category ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT now()",
+            "ALTER TABLE inventory ADD COLUMN IF NOT EXISTS loose_units integer DEFAULT 0",
+            "ALTER TABLE inventory ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT now()",
+            "ALTER TABLE purchase_order ADD COLUMN IF NOT EXISTS created_at timestamp DEFAULT now()",
+        ],
+    ),
+    Migration(3, "seed defaults", run=_seed_defaults),
+    Migration(
+        4,
+        "hot query indexes",
+        indexes=[
+            "ix_product_category_id",
+            "ix_product_category_category_id",
+            "ix_purchase_order_created",
+            "ix_purchase_order_status_created",
+            "ix_purchase_order_supplier_created",
+            "ix_purchase_order_expected_date",
+            "ix_purchase_item_order_id",
+            "ix_sales_order_date",
+            "ix_sales_order_created_by_date",
+            "ix_sales_item_order_id",
+            "ix_sales_item_product_created",
+            "ix_sales_item_created_at",
+            "ix_idempotency_key_expires",
+        ],
+    ),
+    # CREATE EXTENSION 需要超级用户（PG13 起 pg_trgm 为 trusted 扩展，对库有 CREATE 权限即可）；
+    # 权限不足时由 DBA 预先执行该语句，此处 IF NOT EXISTS 即跳过
+    Migration(
+        5,
+        "name lookup indexes",
+        statements=["CREATE EXTENSION IF NOT EXISTS pg_trgm"],
+        indexes=["ix_product_name", "ix_category_name", "ix_product_name_trgm"],
+    ),
+    Migration(
+        6,
+        "optimistic concurrency versions",
+        statements=[
+            "ALTER TABLE product ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+            "ALTER TABLE category ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+            "ALTER TABLE inventory ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+        ],
+    ),
+    Migration(7, "sales daily rollup", run=_create_sales_daily),
+    Migration(8, "export range indexes", indexes=["ix_inventory_log_change_date"]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def find_index(name: str) -> sa.Index:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f"index {name} is not declared in entities")
+
+
+def create_index_concurrently_sql(index: sa.Index) -> str:
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=postgresql.dialect()))
+    return ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+
+
+async def current_version(conn: AsyncConnection) -> int:
+    exists = (await conn.execute(sa.text("SELECT to_regclass('schema_version') IS NOT NULL"))).scalar_one()
+    if not exists:
+        return 0
+    return (await conn.execute(sa.select(sa.func.coalesce(sa.func.max(schema_version.c.version), 0)))).scalar_one()
+
+
+async def _build_index(conn: AsyncConnection, name: str):
+    # 并发建索引失败会留下 INVALID 索引，IF NOT EXISTS 会跳过它，需先清理
+    invalid = (
+        await conn.execute(
+            sa.text(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ),
+            {"name": name},
+        )
+    ).first()
+    if invalid:
+        await conn.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+    await conn.exec_driver_sql(create_index_concurrently_sql(find_index(name)))
+
+
+async def _apply(engine: AsyncEngine, lock_conn: AsyncConnection, migration: Migration):
+    if migration.statements or migration.run:
+        async with engine.begin() as conn:
+            for stmt in migration.statements:
+                await conn.exec_driver_sql(stmt)
+            if migration.run:
+                await migration.run(conn)
+    # CONCURRENTLY 不能在事务内执行，使用持锁的 autocommit 连接
+    for name in migration.indexes:
+        await _build_index(lock_conn, name)
+    await lock_conn.execute(schema_version.insert().values(version=migration.version, description=migration.description))
+
+
+async def run_migrations(engine: AsyncEngine) -> int:
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        version = await current_version(conn)
+        if version >= LATEST_VERSION:
+            return version
+        await conn.execute(sa.text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        try:
+            await conn.run_sync(lambda sync_conn: schema_version.create(sync_conn, checkfirst=True))
+            version = await current_version(conn)
+            for migration in MIGRATIONS:
+                if migration.version > version:
+                    await _apply(engine, conn, migration)
+                    version = migration.version
+        finally:
+            await conn.execute(sa.text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    return version
@@ -11,6 +11,13 @@ def gen_uuid() -> str:
     return str(uuid.uuid4())
 
 
+def _has_pg_trgm(ddl, target, bind, **kw) -> bool:
+    # 扩展由迁移 5 创建，迁移 1 建表时尚未安装则跳过该索引，由迁移 5 补建
+    if bind.dialect.name != "postgresql":
+        return True
+    return bind.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").first() is not None
+
+
 class SystemConfig(Base):
     __tablename__ = "system_config"
 
@@ -28,18 +35,29 @@ class DailyReceipt(Base):
 
 class Category(Base):
     __tablename__ = "category"
+    __table_args__ = (sa.Index("ix_category_name", "name"),)
 
     id: Mapped[str] = mapped_column(sa.String(64), primary_key=True, default=gen_uuid)
     name: Mapped[str] = mapped_column(sa.String(200), nullable=False)
     retail_multiplier: Mapped[float | None] = mapped_column(sa.Float, nullable=True)
     is_custom: Mapped[bool] = mapped_column(sa.Boolean, nullable=False, default=False)
     updated_at: Mapped[datetime] = mapped_column(sa.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # 乐观并发版本号，条件更新时 +1
+    version: Mapped[int] = mapped_column(sa.Integer, nullable=False, default=1, server_default="1")
 
     products: Mapped[list["Product"]] = relationship(back_populates="category")
 
 
 class Product(Base):
     __tablename__ = "product"
+    __table_args__ = (
+        sa.Index("ix_product_category_id", "category_id"),
+        sa.Index("ix_product_name", "name"),
+        # 关键字搜索 ilike '%kw%' 依赖 pg_trgm
+        sa.Index(
+            "ix_product_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+        ).ddl_if(callable_=_has_pg_trgm),
+    )
 
     id: Mapped[str] = mapped_column(sa.String(64), primary_key=True, default=gen_uuid)
     name: Mapped[str] = mapped_column(sa.String(200), nullable=False)
@@ -52,6 +70,7 @@ class Product(Base):
     img_url: Mapped[str | None] = mapped_column(sa.String(500), nullable=True)
     effect_url: Mapped[str | None] = mapped_column(sa.String(500), nullable=True)
     updated_at: Mapped[datetime] = mapped_column(sa.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version: Mapped[int] = mapped_column(sa.Integer, nullable=False, default=1, server_default="1")
 
     category: Mapped[Category | None] = relationship(back_populates="products")
     aliases: Mapped[list["ProductAlias"]] = relationship(back_populates="product", cascade="all, delete-orphan")
@@ -59,7 +78,10 @@ class Product(Base):
 
 class ProductCategory(Base):
     __tablename__ = "product_category"
-    __table_args__ = (sa.PrimaryKeyConstraint("product_id", "category_id", name="product_category_pk"),)
+    __table_args__ = (
+        sa.PrimaryKeyConstraint("product_id", "category_id", name="product_category_pk"),
+        sa.Index("ix_product_category_category_id", "category_id"),
+    )
 
     product_id: Mapped[str] = mapped_column(sa.String(64), sa.ForeignKey("product.id"), nullable=False)
     category_id: Mapped[str] = mapped_column(sa.String(64), sa.ForeignKey("category.id"), nullable=False)
@@ -100,10 +122,12 @@ class Inventory(Base):
     current_stock: Mapped[int] = mapped_column(sa.Integer, nullable=False, default=0)
     loose_units: Mapped[int] = mapped_column(sa.Integer, nullable=False, default=0)
     updated_at: Mapped[datetime] = mapped_column(sa.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version: Mapped[int] = mapped_column(sa.Integer, nullable=False, default=1, server_default="1")
 
 
 class InventoryLog(Base):
     __tablename__ = "inventory_log"
+    __table_args__ = (sa.Index("ix_inventory_log_change_date", "change_date"),)
 
     id: Mapped[str] = mapped_column(sa.String(64), primary_key=True, default=gen_uuid)
     product_id: Mapped[str] = mapped_column(sa.String(64), sa.ForeignKey("product.id"), nullable=False)
@@ -117,6 +141,12 @@ class InventoryLog(Base):
 
 class PurchaseOrder(Base):
     __tablename__ = "purchase_order"
+    __table_args__ = (
+        sa.Index("ix_purchase_order_created", "created_at", "id"),
+        sa.Index("ix_purchase_order_status_created", "status", "created_at"),
+        sa.Index("ix_purchase_order_supplier_created", "supplier", "created_at"),
+        sa.Index("ix_purchase_order_expected_date", "expected_date"),
+    )
 
     id: Mapped[str] = mapped_column(sa.String(64), primary_key=True, default=gen_uuid)
     status: Mapped[str] = mapped_column(sa.String(50), nullable=False, default="待到货")
@@ -124,12 +154,14 @@ class PurchaseOrder(Base):
     expected_date: Mapped[date | None] = mapped_column(sa.Date, nullable=True)
     remark: Mapped[str | None] = mapped_column(sa.String(500), nullable=True)
     created_by: Mapped[str] = mapped_column(sa.String(64), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(sa.DateTime, default=datetime.utcnow)
 
     items: Mapped[list["PurchaseItem"]] = relationship(back_populates="order", cascade="all, delete-orphan")
 
 
 class PurchaseItem(Base):
     __tablename__ = "purchase_item"
+    __table_args__ = (sa.Index("ix_purchase_item_order_id", "purchase_order_id"),)
 
     id: Mapped[str] = mapped_column(sa.String(64), primary_key=True, default=gen_uuid)
     purchase_order_id: Mapped[str] = mapped_column(sa.String(64), sa.ForeignKey("purchase_order.id"), nullable=False)
@@ -157,6 +189,10 @@ class InventoryImportJob(Base):
 
 class SalesOrder(Base):
     __tablename__ = "sales_order"
+    __table_args__ = (
+        sa.Index("ix_sales_order_date", "order_date", "id"),
+        sa.Index("ix_sales_order_created_by_date", "created_by", "order_date"),
+    )
 
     id: Mapped[str] = mapped_column(sa.String(64), primary_key=True, default=gen_uuid)
     order_date: Mapped[datetime] = mapped_column(sa.DateTime, default=datetime.utcnow)
@@ -168,6 +204,11 @@ class SalesOrder(Base):
 
 class SalesItem(Base):
     __tablename__ = "sales_item"
+    __table_args__ = (
+        sa.Index("ix_sales_item_order_id", "order_id"),
+        sa.Index("ix_sales_item_product_created", "product_id", "created_at"),
+        sa.Index("ix_sales_item_created_at", "created_at"),
+    )
 
     id: Mapped[str] = mapped_column(sa.String(64), primary_key=True, default=gen_uuid)
     order_id: Mapped[str] = mapped_column(sa.String(64), sa.ForeignKey("sales_order.id"), nullable=False)
@@ -179,3 +220,27 @@ class SalesItem(Base):
     created_at: Mapped[datetime] = mapped_column(sa.DateTime, default=datetime.utcnow)
 
     order: Mapped[SalesOrder] = relationship(back_populates="items")
+
+
+class SalesDaily(Base):
+    # 按商品、日期（UTC）汇总的销量，下单时在同一事务内累加；补货、预测按日期窗口读取，不再扫描 sales_item
+    __tablename__ = "sales_daily"
+    __table_args__ = (
+        sa.PrimaryKeyConstraint("product_id", "day", name="sales_daily_pk"),
+        sa.Index("ix_sales_daily_day", "day"),
+    )
+
+    product_id: Mapped[str] = mapped_column(sa.String(64), sa.ForeignKey("product.id"), nullable=False)
+    day: Mapped[date] = mapped_column(sa.Date, nullable=False)
+    quantity: Mapped[int] = mapped_column(sa.Integer, nullable=False, default=0)
+    amount: Mapped[float] = mapped_column(sa.Float, nullable=False, default=0)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_key"
+    __table_args__ = (sa.Index("ix_idempotency_key_expires", "expires_at"),)
+
+    key: Mapped[str] = mapped_column(sa.String(128), primary_key=True)
+    order_id: Mapped[str | None] = mapped_column(sa.String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(sa.DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(sa.DateTime, nullable=False)
@@ -5,7 +5,7 @@ from pydantic import BaseModel, Field, ConfigDict
 
 
 Role = Literal["owner", "clerk"]
-PricingBasis = Literal["例外价", "分类系数", "全局系数"]
+PricingBasis = Literal["例外价", "商品系数", "分类系数", "全局系数"]
 
 
 class ORMBase(BaseModel):
@@ -46,6 +46,7 @@ class Category(ORMBase):
     name: Optional[str] = None
     retail_multiplier: Optional[float] = None
     is_custom: Optional[bool] = False
+    version: Optional[int] = None  # 更新时携带读取到的版本（或 If-Match 头），不一致返回 412
 
 
 class Product(ORMBase):
@@ -61,6 +62,72 @@ class Product(ORMBase):
     pack_price_ref: Optional[float] = None
     img_url: Optional[str] = None
     effect_url: Optional[str] = None
+    version: Optional[int] = None
+
+
+class CategorySummary(BaseModel):
+    id: str  # 未分类商品的汇总行为 "__uncategorized__"
+    name: str
+    is_custom: bool
+    retail_multiplier: Optional[float] = None
+    product_count: int
+    total_units: int
+    cost_value: float
+    retail_value: float
+
+
+class CategoryAssignRequest(BaseModel):
+    # 给出 product_ids 时按目标集合整体替换，否则按 add/remove 增量修改
+    product_ids: Optional[List[str]] = None
+    add: List[str] = []
+    remove: List[str] = []
+
+
+class CategoryAssignment(CategoryAssignRequest):
+    category_id: str
+
+
+class CategoryAssignBatch(BaseModel):
+    items: List[CategoryAssignment] = Field(min_length=1, max_length=200)
+
+
+class CategoryAssignResult(BaseModel):
+    category_id: str
+    count: int = 0  # 调整后分类下的商品数
+    added: List[str] = []
+    removed: List[str] = []
+    missing: List[str] = []  # 不存在的商品
+
+
+class ProductPatch(BaseModel):
+    # 批量编辑：只修改请求中出现的字段；version 给出时按版本条件更新
+    id: str
+    version: Optional[int] = None
+    name: Optional[str] = None
+    category_id: Optional[str] = None
+    spec: Optional[str] = None
+    base_cost_price: Optional[float] = None
+    fixed_retail_price: Optional[float] = None
+    retail_multiplier: Optional[float] = None
+    pack_price_ref: Optional[float] = None
+    img_url: Optional[str] = None
+    effect_url: Optional[str] = None
+    categories: Optional[List[str]] = None  # 自定义分类 id，给出时整体替换
+
+
+class ProductBulkUpdate(BaseModel):
+    items: List[ProductPatch] = Field(min_length=1, max_length=500)
+
+
+class ProductBulkDelete(BaseModel):
+    product_ids: List[str] = Field(min_length=1, max_length=500)
+
+
+class ProductBulkResult(BaseModel):
+    id: str
+    status: Literal["updated", "deleted", "not_found", "conflict", "in_use", "error"]
+    version: Optional[int] = None
+    error: Optional[str] = None
 
 
 class PriceCalcResponse(BaseModel):
@@ -68,6 +135,52 @@ class PriceCalcResponse(BaseModel):
     basis: PricingBasis
 
 
+class PriceBatchRequest(BaseModel):
+    product_ids: List[str] = Field(min_length=1, max_length=500)
+
+
+class PriceBatchItem(PriceCalcResponse):
+    product_id: str
+
+
+class PriceBatchResponse(BaseModel):
+    items: List[PriceBatchItem]
+    missing: List[str] = []
+
+
+class PricingScenario(BaseModel):
+    # 未给出的系数沿用当前值；分类系数为 null 表示取消该分类系数
+    global_multiplier: Optional[float] = Field(default=None, gt=0)
+    category_multipliers: dict[str, Optional[float]] = {}
+    top: int = Field(default=20, ge=0, le=200)
+
+
+class PricingChange(BaseModel):
+    product_id: str
+    name: str
+    old_price: float
+    new_price: float
+    basis: PricingBasis
+    units: float
+
+
+class PricingSimulation(BaseModel):
+    products: int
+    changed: int
+    raised: int
+    lowered: int
+    global_multiplier: float
+    basis_counts: dict[str, int]
+    cost_value: float
+    retail_value_before: float
+    retail_value_after: float
+    retail_value_diff: float
+    margin_rate_before: float
+    margin_rate_after: float
+    avg_change_rate: float
+    top_changes: List[PricingChange] = []
+
+
 class ProductImportJob(BaseModel):
     id: Optional[str] = None
     file_name: str
@@ -102,11 +215,47 @@ class SalesOrder(ORMBase):
     created_by: str
 
 
+class OfflineSalesOrder(BaseModel):
+    client_id: str = Field(min_length=1, max_length=128)  # 客户端生成的幂等键
+    created_at: Optional[datetime] = None  # 客户端离线下单时间
+    items: List[SalesItemPayload]
+
+
+class SalesBatchRequest(BaseModel):
+    orders: List[OfflineSalesOrder] = Field(min_length=1, max_length=500)
+
+
+class SalesBatchResult(BaseModel):
+    client_id: str
+    status: Literal["created", "duplicate", "error"]
+    order_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class SalesOrderSummary(BaseModel):
+    id: str
+    order_date: datetime
+    created_by: str
+    total_actual_amount: float
+    item_count: int
+    total_qty: int
+    expected_amount: float
+    cost_amount: float
+    gross_profit: float
+    gross_margin: float
+
+
+class SalesOrderPage(BaseModel):
+    items: List[SalesOrderSummary]
+    next_cursor: Optional[str] = None
+
+
 class InventoryRecord(ORMBase):
     product_id: str
     warehouse_id: str = "default"
     current_stock: int
     loose_units: int | None = 0
+    version: Optional[int] = None
 
 
 class InventoryLog(ORMBase):
@@ -124,6 +273,7 @@ class InventoryAdjustRequest(BaseModel):
     product_id: str
     delta: int
     reason: str
+    version: Optional[int] = None
 
 
 class PurchaseItem(ORMBase):
@@ -145,6 +295,86 @@ class PurchaseOrder(ORMBase):
     created_by: str
 
 
+class PurchaseOrderSummary(ORMBase):
+    id: str
+    status: str
+    supplier: Optional[str] = None
+    expected_date: Optional[date] = None
+    remark: Optional[str] = None
+    created_by: str
+    created_at: Optional[datetime] = None
+    line_count: int = 0
+    total_qty: int = 0
+    received_qty: int = 0
+    progress: float = 0  # 已到 / 需求
+    items: Optional[List[PurchaseItem]] = None
+
+
+class PurchaseOrderPage(BaseModel):
+    items: List[PurchaseOrderSummary]
+    next_cursor: Optional[str] = None
+
+
+class ReorderSuggestion(BaseModel):
+    product_id: str
+    name: str
+    spec: Optional[str] = None
+    level: Literal["out", "critical", "low", "ok"]
+    stock_units: int
+    on_order_units: int  # 未到货采购（件）
+    velocity_short: float  # 近 7 天日均销量（件）
+    velocity_long: float  # 近 28 天日均销量（件）
+    velocity_forecast: Optional[float] = None  # 按春节预测的计划期日均需求
+    days_of_cover: Optional[float] = None  # 按日均销量可售天数
+    suggested_boxes: int
+    expected_cost: float
+
+
+class ReorderDraftRequest(BaseModel):
+    supplier: str
+    created_by: str
+    expected_date: Optional[date] = None  # 默认今天 + lead_days
+    remark: Optional[str] = None
+    product_ids: Optional[List[str]] = None  # 只为这些商品下单，默认全部有建议量的商品
+    lead_days: int = Field(default=7, ge=0, le=180)
+    cover_days: int = Field(default=14, ge=0, le=365)
+    safety_days: int = Field(default=3, ge=0, le=90)
+    use_forecast: bool = False  # 日均销量取近期与春节预测中的较大值
+
+
+class ProductForecast(BaseModel):
+    product_id: str
+    name: str
+    category_id: Optional[str] = None
+    source: Literal["history", "category", "none"]  # 往年曲线 / 分类曲线（新品）/ 无销量
+    base_rate: float  # 当前日常日均销量
+    growth: float  # 相对往年同期的增长系数
+    last_season_qty: float
+    season_total: float  # 本季窗口预测总量
+    sold: float  # 本季已售
+    remaining: float  # 本季剩余预测量
+
+
+class CategoryForecast(BaseModel):
+    category_id: str
+    name: str
+    product_count: int
+    last_season_qty: float
+    season_total: float
+    sold: float
+    remaining: float
+
+
+class FestivalForecast(BaseModel):
+    lunar_new_year: date
+    window_start: date
+    window_end: date
+    as_of: date  # 预测使用的最后一个完整日期
+    seasons: List[date]  # 参与计算的往年春节
+    categories: List[CategoryForecast]
+    products: List[ProductForecast]
+
+
 class DashboardRealtime(BaseModel):
     actual_sales: float  # 实际入账（来自入账表）
     expected_sales: float
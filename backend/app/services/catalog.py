@@ -0,0 +1,297 @@
+"""
+商品目录快照：小程序冷启动时一次下载整个目录（商品、分类、标准价、库存），代替逐页请求商品与分类列表。
+
+- 列式 JSON：每个字段一个数组，分类以下标引用，避免每个商品重复分类名；
+- 预先编码 identity / gzip /（安装 brotli 时）br 三种表示，直接从内存返回，强 ETag 为内容哈希；
+- 增量重建：通过 events 钩子接收写事件，销售、库存、到货、商品编辑只重新加载涉及的商品；
+  分类、调价等影响面广的变更整体重建。重建在下一次请求时进行，多个写入合并为一次。
+- 分类汇总（商品数、库存件数、成本与零售货值）由同一份内存数据算出，按快照版本缓存。
+"""
+
+import asyncio
+import gzip
+import hashlib
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.entities import Category, Inventory, Product, ProductCategory
+from app.services import events, logic, metrics, pricing, serialization
+from app.services.repository import UNCATEGORIZED
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 可选依赖
+    brotli = None
+
+PRODUCT_EVENTS = {"sales", "inventory", "purchase", "product"}
+FULL_EVENTS = {"category", "pricing", "resync"}
+# 兜底：导入脚本等不经 API 的写入没有事件，超过该时长整体重建一次
+MAX_AGE_SECONDS = int(os.getenv("YH_CATALOG_MAX_AGE", "600"))
+LOAD_CHUNK = 1000
+# 与 http_cache.compress 相同的 brotli 等级：快照随写操作频繁重建，高等级压缩耗时远大于省下的字节
+BROTLI_QUALITY = 4
+PRODUCT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.spec,
+    Product.category_id,
+    Product.base_cost_price,
+    Product.fixed_retail_price,
+    Product.retail_multiplier,
+    Product.effect_url,
+)
+
+
+@dataclass
+class ProductRow:
+    product: Any
+    units: float = 0
+    links: list[str] = field(default_factory=list)
+    price: pricing.PriceResult | None = None
+
+
+@dataclass
+class Encoded:
+    etag: str
+    bodies: dict[str, bytes]
+    version: int
+    built_at: datetime
+
+
+class CatalogSnapshot:
+    def __init__(self):
+        self.rows: dict[str, ProductRow] = {}
+        self.categories: list[Any] = []
+        self.global_multiplier = logic.DEFAULT_GLOBAL_MULTIPLIER
+        self.version = 0
+        self.encoded: Encoded | None = None
+        self._full = True
+        self._dirty: set[str] = set()
+        self._built_at = 0.0
+        self._lock = asyncio.Lock()
+        self._summaries: tuple[int, list[dict[str, Any]]] | None = None
+
+    @property
+    def stale(self) -> bool:
+        if self.encoded is not None and time.monotonic() - self._built_at > MAX_AGE_SECONDS:
+            self._full = True
+        return self._full or bool(self._dirty) or self.encoded is None
+
+    def on_event(self, reason: str, product_ids: list[str] | None):
+        if reason in FULL_EVENTS or (reason in PRODUCT_EVENTS and product_ids is None):
+            self._full = True
+        elif reason in PRODUCT_EVENTS:
+            self._dirty.update(product_ids)
+
+    async def get(self, session: AsyncSession) -> Encoded:
+        metrics.record_cache("catalog", not self.stale)
+        if self.stale:
+            if self.encoded is not None and self._lock.locked():
+                # 其它请求正在重建：先返回上一版，不排队等待
+                return self.encoded
+            async with self._lock:
+                if self.stale:
+                    await self._refresh(session)
+        return self.encoded
+
+    async def category_summaries(self, session: AsyncSession) -> tuple[str, list[dict[str, Any]]]:
+        # 返回 (快照内容哈希, 汇总行)；快照未变化时直接复用上次的汇总
+        encoded = await self.get(session)
+        hit = self._summaries is not None and self._summaries[0] == encoded.version
+        metrics.record_cache("category_summary", hit)
+        if not hit:
+            self._summaries = (encoded.version, self._summarize())
+        return encoded.etag, self._summaries[1]
+
+    def _summarize(self) -> list[dict[str, Any]]:
+        # 商家分类按 product.category_id、自定义分类按 product_category 归属，一个商品可计入多个分类；
+        # 没有商家分类的商品单独汇总为“未分类”
+        totals: dict[str, list[float]] = {c.id: [0, 0, 0.0, 0.0] for c in self.categories}
+        uncategorized = [0, 0, 0.0, 0.0]
+        for row in self.rows.values():
+            p = row.product
+            buckets = [totals[c] for c in dict.fromkeys([p.category_id, *row.links]) if c in totals]
+            if not p.category_id:
+                buckets.append(uncategorized)
+            for bucket in buckets:
+                bucket[0] += 1
+                bucket[1] += row.units
+                bucket[2] += p.base_cost_price * row.units
+                bucket[3] += row.price.price * row.units
+        items = [
+            self._summary_row(c.id, c.name, c.is_custom, c.retail_multiplier, totals[c.id]) for c in self.categories
+        ]
+        if uncategorized[0]:
+            items.append(self._summary_row(UNCATEGORIZED, "未分类", False, None, uncategorized))
+        return items
+
+    @staticmethod
+    def _summary_row(cid: str, name: str, is_custom: bool, multiplier: float | None, total: list[float]):
+        count, units, cost, retail = total
+        return {
+            "id": cid,
+            "name": name,
+            "is_custom": bool(is_custom),
+            "retail_multiplier": multiplier,
+            "product_count": int(count),
+            "total_units": int(units),
+            "cost_value": pricing.round2(cost),
+            "retail_value": pricing.round2(retail),
+        }
+
+    async def _refresh(self, session: AsyncSession):
+        # 先取走脏标记：重建期间新到的事件留给下一次
+        full, self._full = self._full, False
+        dirty, self._dirty = self._dirty, set()
+        try:
+            if full:
+                await self._load_all(session)
+                self._built_at = time.monotonic()
+            elif dirty:
+                await self._load_products(session, list(dirty))
+        except BaseException:
+            self._full = self._full or full
+            self._dirty |= dirty
+            raise
+        self.version += 1
+        # 序列化与压缩是 CPU 密集的整表操作，放到线程中执行，不阻塞事件循环；持锁期间 rows 不会被修改
+        self.encoded = await asyncio.to_thread(self._encode)
+
+    async def _load_all(self, session: AsyncSession):
+        self.categories = (
+            await session.execute(
+                sa.select(Category.id, Category.name, Category.retail_multiplier, Category.is_custom).order_by(
+                    Category.is_custom, Category.name, Category.id
+                )
+            )
+        ).all()
+        self.global_multiplier = await logic.get_global_multiplier(session)
+        products = (await session.execute(sa.select(*PRODUCT_COLUMNS))).all()
+        rows = {p.id: ProductRow(product=p) for p in products}
+        stock = await session.execute(
+            sa.select(Inventory.product_id, sa.func.sum(Inventory.current_stock), sa.func.sum(Inventory.loose_units))
+            .group_by(Inventory.product_id)
+        )
+        self._apply_stock(rows, stock.all())
+        for pid, cid in (await session.execute(sa.select(ProductCategory.product_id, ProductCategory.category_id))).all():
+            if pid in rows:
+                rows[pid].links.append(cid)
+        self.rows = rows
+        self._price(rows.values())
+
+    async def _load_products(self, session: AsyncSession, product_ids: list[str]):
+        for i in range(0, len(product_ids), LOAD_CHUNK):
+            chunk = product_ids[i : i + LOAD_CHUNK]
+            products = (await session.execute(sa.select(*PRODUCT_COLUMNS).where(Product.id.in_(chunk)))).all()
+            rows = {p.id: ProductRow(product=p) for p in products}
+            for pid in set(chunk) - rows.keys():
+                self.rows.pop(pid, None)
+            stock = await session.execute(
+                sa.select(Inventory.product_id, sa.func.sum(Inventory.current_stock), sa.func.sum(Inventory.loose_units))
+                .where(Inventory.product_id.in_(chunk))
+                .group_by(Inventory.product_id)
+            )
+            self._apply_stock(rows, stock.all())
+            links = await session.execute(
+                sa.select(ProductCategory.product_id, ProductCategory.category_id).where(ProductCategory.product_id.in_(chunk))
+            )
+            for pid, cid in links.all():
+                if pid in rows:
+                    rows[pid].links.append(cid)
+            self._price(rows.values())
+            self.rows.update(rows)
+
+    @staticmethod
+    def _apply_stock(rows: dict[str, ProductRow], stock_rows: list[Any]):
+        for pid, boxes, loose in stock_rows:
+            row = rows.get(pid)
+            if row:
+                row.units = int(boxes or 0) * logic.parse_spec_qty(row.product.spec) + int(loose or 0)
+
+    def _price(self, rows):
+        rows = list(rows)
+        ctx = pricing.build_context(self.categories, self.global_multiplier, {r.product.id: r.links for r in rows})
+        for row in rows:
+            row.price = pricing.price_product(row.product, ctx)
+
+    def build_payload(self) -> dict[str, Any]:
+        category_index = {c.id: i for i, c in enumerate(self.categories)}
+        basis_index = {name: i for i, name in enumerate(pricing.BASIS_ORDER)}
+        rows = sorted(self.rows.values(), key=lambda r: (r.product.name, r.product.id))
+        columns: dict[str, list[Any]] = {
+            "id": [],
+            "name": [],
+            "spec": [],
+            "categories": [],
+            "cost": [],
+            "price": [],
+            "basis": [],
+            "stock": [],
+            "effect_url": [],
+        }
+        for row in rows:
+            p = row.product
+            cats = [category_index[c] for c in dict.fromkeys([p.category_id, *row.links]) if c in category_index]
+            columns["id"].append(p.id)
+            columns["name"].append(p.name)
+            columns["spec"].append(logic.normalize_spec(p.spec))
+            columns["categories"].append(cats)
+            columns["cost"].append(p.base_cost_price)
+            columns["price"].append(row.price.price)
+            columns["basis"].append(basis_index[row.price.basis])
+            columns["stock"].append(int(row.units))
+            columns["effect_url"].append(p.effect_url)
+        return {
+            "global_multiplier": self.global_multiplier,
+            "basis_names": list(pricing.BASIS_ORDER),
+            "categories": {
+                "id": [c.id for c in self.categories],
+                "name": [c.name for c in self.categories],
+                "multiplier": [c.retail_multiplier for c in self.categories],
+                "is_custom": [bool(c.is_custom) for c in self.categories],
+            },
+            "products": columns,
+        }
+
+    def _encode(self) -> Encoded:
+        raw = serialization.dumps(self.build_payload())
+        # 内容哈希：重建后内容未变时 ETag 保持不变
+        etag = hashlib.sha1(raw).hexdigest()[:20]
+        bodies = {"identity": raw, "gzip": gzip.compress(raw, compresslevel=6, mtime=0)}
+        if brotli is not None:
+            bodies["br"] = brotli.compress(raw, quality=BROTLI_QUALITY)
+        return Encoded(etag=etag, bodies=bodies, version=self.version, built_at=datetime.utcnow())
+
+
+def etag_for(encoded: Encoded, encoding: str) -> str:
+    # 强 ETag 区分不同编码的表示
+    return f'"{encoded.etag}"' if encoding == "identity" else f'"{encoded.etag}-{encoding}"'
+
+
+def etag_matches(if_none_match: str | None, encoded: Encoded) -> bool:
+    # If-None-Match 使用弱比较：代理或压缩层会把 ETag 改为 W/"..."，忽略 W/ 前缀与编码后缀
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/").strip('"').split("-")[0] == encoded.etag:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding: str | None, available: dict[str, bytes]) -> str:
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    for encoding in ("br", "gzip"):
+        if encoding in available and encoding in accepted:
+            return encoding
+    return "identity"
+
+
+snapshot = CatalogSnapshot()
+events.broker.add_hook(snapshot.on_event)
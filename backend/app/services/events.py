@@ -0,0 +1,263 @@
+"""
+看板实时推送：写操作提交后发布事件，由一次服务端计算把结果扇出给所有订阅者（SSE / WebSocket）。
+
+- 进程内：`DashboardBroker` 合并短时间内的多次事件（去抖），只重算受影响的看板分区，
+  新结果带递增的 version 推送给所有订阅队列；订阅队列只保留最新若干条，慢客户端不会拖住发布方；
+- 跨 worker：设置 `YH_EVENTS_BACKEND=postgres` 后通过 Postgres LISTEN/NOTIFY 转发事件，
+  其它 worker 收到后在本进程内重算并推送（事件本身不带数据，只带原因与涉及的商品 id）；
+  LISTEN 连接断开后按退避间隔重连，重连成功后本地发布一次 `resync`（断线期间的事件已丢失，按全部失效处理）；
+- 进程内缓存（如商品目录快照）可通过 `add_hook` 接收同样的事件做失效处理。
+
+分区：realtime（今日实时）、inventory_value（库存货值）、receipt_total（收款合计）。
+员工业绩需扫描全部销售明细，不随每笔销售推送，仍由 `GET /api/dashboard/performance` 按需查询。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from typing import Any, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import DATABASE_URL, SessionLocal
+from app.services import logic
+
+logger = logging.getLogger(__name__)
+
+EVENTS_BACKEND = os.getenv("YH_EVENTS_BACKEND", "local").lower()
+DEBOUNCE_SECONDS = float(os.getenv("YH_EVENTS_DEBOUNCE", "0.3"))
+HEARTBEAT_SECONDS = 15
+# 订阅时若缓存的快照过旧则整体重算（例如跨天后的今日数据）
+SNAPSHOT_MAX_AGE = 60
+QUEUE_SIZE = 8
+PG_CHANNEL = "yh_dashboard"
+# LISTEN 连接断开后的重连间隔（秒），逐次翻倍
+RECONNECT_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+# NOTIFY 载荷上限 8000 字节，商品 id 过多时只转发原因，接收方按全部失效处理
+MAX_FORWARD_IDS = 100
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}"
+
+ALL_SECTIONS = frozenset({"realtime", "inventory_value", "receipt_total"})
+SECTIONS_BY_REASON = {
+    "sales": frozenset({"realtime", "inventory_value"}),
+    "inventory": frozenset({"inventory_value"}),
+    "purchase": frozenset({"inventory_value"}),
+    "pricing": frozenset({"inventory_value"}),
+    "product": frozenset({"inventory_value"}),
+    "category": frozenset({"inventory_value"}),
+    "manual_receipt": frozenset({"realtime", "receipt_total"}),
+}
+
+
+async def compute_sections(session: AsyncSession, sections: set[str] | frozenset[str]) -> dict[str, Any]:
+    data: dict[str, Any] = {}
+    if "realtime" in sections:
+        data["realtime"] = (await logic.build_dashboard_realtime(session)).model_dump()
+    if "inventory_value" in sections:
+        cost, retail = await logic.dashboard_inventory_value(session)
+        data["inventory_value"] = {"cost_total": round(cost, 2), "retail_total": round(retail, 2)}
+    if "receipt_total" in sections:
+        data["receipt_total"] = {"total": round(await logic.total_receipts(session), 2)}
+    return data
+
+
+class DashboardBroker:
+    def __init__(self, session_factory: Callable[[], AsyncSession], debounce: float = DEBOUNCE_SECONDS):
+        self.session_factory = session_factory
+        self.debounce = debounce
+        self.version = 0
+        self.snapshot: dict[str, Any] = {}
+        self.snapshot_at = 0.0
+        self.relay: "PostgresRelay | None" = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self._hooks: list[Callable[[str, list[str] | None], None]] = []
+        self._pending: set[str] = set()
+        self._reasons: set[str] = set()
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def add_hook(self, hook: Callable[[str, list[str] | None], None]):
+        self._hooks.append(hook)
+
+    def publish(self, reason: str, product_ids: list[str] | None = None, forward: bool = True):
+        # 在写请求 commit 之后调用；只登记事件，重算在后台任务中合并进行
+        for hook in self._hooks:
+            hook(reason, product_ids)
+        self._pending |= SECTIONS_BY_REASON.get(reason, ALL_SECTIONS)
+        self._reasons.add(reason)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._flush())
+        if forward and self.relay is not None:
+            self.relay.forward(reason, product_ids)
+
+    async def _flush(self):
+        # 计算期间新到的事件留在 _pending 中，本轮推送后继续处理，直到没有待处理的分区
+        while self._pending:
+            await asyncio.sleep(self.debounce)
+            sections, self._pending = self._pending, set()
+            reasons, self._reasons = self._reasons, set()
+            if not self._subscribers:
+                # 无人订阅时不计算，只作废快照，下一个订阅者会重新拉取
+                for name in sections:
+                    self.snapshot.pop(name, None)
+                continue
+            try:
+                data = await self._compute(sections)
+            except Exception:
+                logger.exception("dashboard recompute failed")
+                continue
+            self.version += 1
+            self._broadcast({"version": self.version, "reasons": sorted(reasons), **data})
+
+    async def _compute(self, sections: set[str] | frozenset[str]) -> dict[str, Any]:
+        async with self._lock:
+            async with self.session_factory() as session:
+                data = await compute_sections(session, sections)
+            self.snapshot.update(data)
+            if sections >= ALL_SECTIONS:
+                self.snapshot_at = time.monotonic()
+            return data
+
+    def _broadcast(self, message: dict[str, Any]):
+        for queue in list(self._subscribers):
+            if queue.full():
+                # 慢客户端：丢弃最旧的一条，保证最新版本一定能送达
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def initial(self) -> dict[str, Any]:
+        missing = ALL_SECTIONS - self.snapshot.keys()
+        if time.monotonic() - self.snapshot_at > SNAPSHOT_MAX_AGE:
+            missing = ALL_SECTIONS
+        if missing:
+            await self._compute(missing)
+        return {"version": self.version, "reasons": ["snapshot"], **self.snapshot}
+
+
+class PostgresRelay:
+    # 专用 asyncpg 连接：LISTEN 接收其它 worker 的事件，NOTIFY 转发本 worker 的事件
+    def __init__(self, dsn: str, broker: DashboardBroker):
+        self.dsn = dsn
+        self.broker = broker
+        self._conn = None
+        self._send_lock = asyncio.Lock()
+        self._reconnect_task: asyncio.Task | None = None
+        self._closing = False
+
+    async def start(self):
+        self._closing = False
+        await self._connect()
+
+    async def stop(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await conn.close()
+
+    async def _connect(self):
+        import asyncpg
+
+        conn = await asyncpg.connect(self.dsn)
+        await conn.add_listener(PG_CHANNEL, self._on_notify)
+        conn.add_termination_listener(self._on_terminate)
+        self._conn = conn
+
+    def _on_terminate(self, conn):
+        # 连接意外断开（数据库重启、网络中断）；stop() 主动关闭时不重连
+        if self._closing or conn is not self._conn:
+            return
+        logger.warning("dashboard event relay connection lost, reconnecting")
+        self._conn = None
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = RECONNECT_DELAY
+        while not self._closing:
+            try:
+                await self._connect()
+            except Exception:
+                logger.warning("dashboard event relay reconnect failed, retrying in %.0fs", delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+            logger.info("dashboard event relay reconnected")
+            self.broker.publish("resync", None, forward=False)
+            return
+
+    def _on_notify(self, conn, pid, channel, payload: str):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return
+        if data.get("origin") == ORIGIN:
+            return
+        self.broker.publish(data.get("reason", ""), data.get("product_ids"), forward=False)
+
+    def forward(self, reason: str, product_ids: list[str] | None = None):
+        if product_ids is not None and len(product_ids) > MAX_FORWARD_IDS:
+            product_ids = None
+        asyncio.get_running_loop().create_task(self._notify(reason, product_ids))
+
+    async def _notify(self, reason: str, product_ids: list[str] | None):
+        conn = self._conn
+        if conn is None:
+            # 重连中：本 worker 已在本地处理，其它 worker 重连后会收到 resync
+            return
+        payload = json.dumps({"origin": ORIGIN, "reason": reason, "product_ids": product_ids})
+        try:
+            async with self._send_lock:
+                await conn.execute("SELECT pg_notify($1, $2)", PG_CHANNEL, payload)
+        except Exception:
+            logger.exception("dashboard event forward failed")
+            if conn.is_closed():
+                self._on_terminate(conn)
+
+
+def _asyncpg_dsn(url: str) -> str:
+    return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+def format_sse(message: dict[str, Any]) -> str:
+    return f"id: {message['version']}\nevent: dashboard\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+
+
+broker = DashboardBroker(SessionLocal)
+
+
+def publish(reason: str, product_ids: list[str] | None = None):
+    # product_ids 为 None 表示影响范围未知（按全部处理）
+    broker.publish(reason, product_ids)
+
+
+async def start():
+    if EVENTS_BACKEND != "postgres":
+        return
+    relay = PostgresRelay(_asyncpg_dsn(DATABASE_URL), broker)
+    await relay.start()
+    broker.relay = relay
+
+
+async def stop():
+    if broker.relay is not None:
+        await broker.relay.stop()
+        broker.relay = None
@@ -0,0 +1,355 @@
+"""
+流式导出：销售明细、销售单、库存流水与商品快照，供离线分析。
+
+- 通过服务端游标分批读取（每批 CHUNK_SIZE 行），逐批写出，内存占用与数据量无关；
+- 格式：csv、csv.gz，以及安装 pyarrow（`pip install ".[export]"`）后的 parquet / arrow（IPC 文件），
+  列式格式按 zstd 压缩，每批一个 row group / record batch；`columnar` 有 pyarrow 时为 parquet，否则退回 csv.gz；
+- 按日期区间（`start`/`end`，含两端，UTC 日期）筛选，可按天或按月分区：每个分区一次区间查询、写一个文件，
+  无数据的分区不生成文件；文件先写临时名，写完再改名，中断不会留下半截文件；
+- Postgres 上整次导出在同一个 REPEATABLE READ 事务内完成，各分区看到同一份数据。
+
+`utils/export_data.py` 写文件；`GET /api/export/{dataset}` 直接流式返回 csv / csv.gz。
+"""
+
+import csv
+import gzip
+import io
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.db import engine
+from app.models.entities import Inventory, InventoryLog, Product, SalesItem, SalesOrder
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - 可选依赖
+    pa = None
+    pq = None
+
+CHUNK_SIZE = 5000
+FORMATS = ("csv", "csv.gz", "parquet", "arrow", "columnar")
+PARTITIONS = ("none", "day", "month")
+
+
+@dataclass
+class Dataset:
+    name: str
+    query: sa.Select
+    date_column: sa.ColumnElement | None = None  # 无日期列的数据集（商品快照）不支持区间与分区
+
+    @property
+    def columns(self) -> list[sa.ColumnElement]:
+        return list(self.query.selected_columns)
+
+    def select(self, start: datetime | None = None, end: datetime | None = None) -> sa.Select:
+        stmt = self.query
+        if self.date_column is not None:
+            if start is not None:
+                stmt = stmt.where(self.date_column >= start)
+            if end is not None:
+                stmt = stmt.where(self.date_column < end)
+            stmt = stmt.order_by(self.date_column)
+        return stmt
+
+
+_stock = (
+    sa.select(
+        Inventory.product_id,
+        sa.func.sum(Inventory.current_stock).label("boxes"),
+        sa.func.sum(Inventory.loose_units).label("loose"),
+    )
+    .group_by(Inventory.product_id)
+    .subquery()
+)
+
+DATASETS: dict[str, Dataset] = {
+    "sales_items": Dataset(
+        "sales_items",
+        sa.select(
+            SalesItem.id,
+            SalesItem.order_id,
+            SalesItem.product_id,
+            SalesItem.quantity,
+            SalesItem.snapshot_cost,
+            SalesItem.snapshot_standard_price,
+            SalesItem.actual_sale_price,
+            SalesItem.created_at,
+        ),
+        SalesItem.created_at,
+    ),
+    "orders": Dataset(
+        "orders",
+        sa.select(SalesOrder.id, SalesOrder.order_date, SalesOrder.total_actual_amount, SalesOrder.created_by),
+        SalesOrder.order_date,
+    ),
+    "inventory_logs": Dataset(
+        "inventory_logs",
+        sa.select(
+            InventoryLog.id,
+            InventoryLog.product_id,
+            InventoryLog.warehouse_id,
+            InventoryLog.change_date,
+            InventoryLog.change_qty,
+            InventoryLog.type,
+            InventoryLog.ref_type,
+            InventoryLog.ref_id,
+        ),
+        InventoryLog.change_date,
+    ),
+    # 商品当前状态 + 各仓库存合计
+    "products": Dataset(
+        "products",
+        sa.select(
+            Product.id,
+            Product.name,
+            Product.category_id,
+            Product.spec,
+            Product.base_cost_price,
+            Product.fixed_retail_price,
+            Product.retail_multiplier,
+            Product.pack_price_ref,
+            Product.updated_at,
+            Product.version,
+            sa.func.coalesce(_stock.c.boxes, 0).label("stock_boxes"),
+            sa.func.coalesce(_stock.c.loose, 0).label("stock_loose_units"),
+        )
+        .outerjoin(_stock, _stock.c.product_id == Product.id)
+        .order_by(Product.id),
+    ),
+}
+
+
+@dataclass
+class ExportFile:
+    dataset: str
+    partition: str | None
+    path: Path
+    rows: int
+
+
+def resolve_format(fmt: str) -> str:
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format: {fmt}")
+    if fmt == "columnar":
+        return "parquet" if pa is not None else "csv.gz"
+    if fmt in ("parquet", "arrow") and pa is None:
+        raise RuntimeError(f'{fmt} export requires pyarrow: pip install ".[export]"')
+    return fmt
+
+
+def get_dataset(name: str) -> Dataset:
+    dataset = DATASETS.get(name)
+    if dataset is None:
+        raise ValueError(f"unknown dataset: {name}")
+    return dataset
+
+
+def partition_ranges(start: date, end: date, partition: str) -> list[tuple[str | None, datetime, datetime]]:
+    # [start, end] 按天/按月切成左闭右开的时间区间
+    if partition not in PARTITIONS:
+        raise ValueError(f"unknown partition: {partition}")
+    if end < start:
+        raise ValueError("end must not be earlier than start")
+    stop = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    lo = datetime.combine(start, datetime.min.time())
+    if partition == "none":
+        return [(None, lo, stop)]
+    ranges = []
+    while lo < stop:
+        if partition == "day":
+            hi, key = lo + timedelta(days=1), lo.strftime("%Y-%m-%d")
+        else:
+            hi, key = (lo.replace(day=1) + timedelta(days=32)).replace(day=1), lo.strftime("%Y-%m")
+        hi = min(hi, stop)
+        ranges.append((key, lo, hi))
+        lo = hi
+    return ranges
+
+
+async def _date_bounds(conn: AsyncConnection, dataset: Dataset) -> tuple[date, date] | None:
+    column = dataset.date_column
+    low, high = (await conn.execute(sa.select(sa.func.min(column), sa.func.max(column)))).one()
+    if low is None:
+        return None
+    return _as_date(low), _as_date(high)
+
+
+def _as_date(value: Any) -> date:
+    # sqlite 返回字符串
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.date() if isinstance(value, datetime) else value
+
+
+async def _begin(conn: AsyncConnection):
+    if conn.dialect.name == "postgresql":
+        await conn.execution_options(isolation_level="REPEATABLE READ")
+    await conn.begin()
+
+
+async def iter_chunks(
+    conn: AsyncConnection, stmt: sa.Select, chunk_size: int = CHUNK_SIZE
+) -> AsyncIterator[list[tuple]]:
+    # 服务端游标，每次只取一批
+    result = await conn.stream(stmt.execution_options(yield_per=chunk_size))
+    async for rows in result.partitions(chunk_size):
+        yield [tuple(row) for row in rows]
+
+
+class _CsvWriter:
+    def __init__(self, path: Path, headers: list[str], compressed: bool):
+        if compressed:
+            self._file = gzip.open(path, "wt", newline="", encoding="utf-8")
+        else:
+            self._file = path.open("w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(headers)
+
+    def write(self, rows: list[tuple]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _ArrowWriter:
+    def __init__(self, path: Path, columns: list[sa.ColumnElement], fmt: str):
+        self.schema = pa.schema([(c.key, _arrow_type(c.type)) for c in columns])
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(str(path), self.schema, compression="zstd")
+        else:
+            options = pa.ipc.IpcWriteOptions(compression="zstd")
+            self._sink = pa.OSFile(str(path), "wb")
+            self._writer = pa.ipc.new_file(self._sink, self.schema, options=options)
+        self._fmt = fmt
+
+    def write(self, rows: list[tuple]):
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+        if self._fmt == "arrow":
+            self._sink.close()
+
+
+def _arrow_type(sql_type: sa.types.TypeEngine):
+    if isinstance(sql_type, sa.Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, sa.Integer):
+        return pa.int64()
+    if isinstance(sql_type, sa.Float):
+        return pa.float64()
+    if isinstance(sql_type, sa.DateTime):
+        return pa.timestamp("us")
+    if isinstance(sql_type, sa.Date):
+        return pa.date32()
+    return pa.string()
+
+
+SUFFIXES = {"csv": ".csv", "csv.gz": ".csv.gz", "parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _open_writer(path: Path, dataset: Dataset, fmt: str):
+    if fmt in ("csv", "csv.gz"):
+        return _CsvWriter(path, [c.key for c in dataset.columns], compressed=fmt == "csv.gz")
+    return _ArrowWriter(path, dataset.columns, fmt)
+
+
+async def export_dataset(
+    name: str,
+    out_dir: Path,
+    fmt: str = "csv",
+    start: date | None = None,
+    end: date | None = None,
+    partition: str = "none",
+    chunk_size: int = CHUNK_SIZE,
+) -> list[ExportFile]:
+    dataset = get_dataset(name)
+    fmt = resolve_format(fmt)
+    if dataset.date_column is None and (start or end or partition != "none"):
+        raise ValueError(f"{name} has no date column; date range and partition are not supported")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    files: list[ExportFile] = []
+    async with engine.connect() as conn:
+        await _begin(conn)
+        if dataset.date_column is None:
+            ranges = [(None, None, None)]
+        else:
+            if start is None or end is None:
+                bounds = await _date_bounds(conn, dataset)
+                if bounds is None:
+                    return files
+                start, end = start or bounds[0], end or bounds[1]
+            ranges = partition_ranges(start, end, partition)
+        for key, lo, hi in ranges:
+            path = out_dir / f"{name}{'_' + key if key else ''}{SUFFIXES[fmt]}"
+            exported = await _write_file(conn, dataset.select(lo, hi), dataset, path, fmt, chunk_size)
+            if exported is not None:
+                files.append(ExportFile(name, key, path, exported))
+    return files
+
+
+async def _write_file(
+    conn: AsyncConnection, stmt: sa.Select, dataset: Dataset, path: Path, fmt: str, chunk_size: int
+) -> int | None:
+    # 首批数据到达才建文件；返回行数，无数据返回 None
+    tmp = path.with_name(path.name + ".part")
+    writer = None
+    rows = 0
+    try:
+        async for chunk in iter_chunks(conn, stmt, chunk_size):
+            if writer is None:
+                writer = _open_writer(tmp, dataset, fmt)
+            writer.write(chunk)
+            rows += len(chunk)
+        if writer is None:
+            return None
+        writer.close()
+        writer = None
+        tmp.replace(path)
+        return rows
+    finally:
+        if writer is not None:
+            writer.close()
+            tmp.unlink(missing_ok=True)
+
+
+async def stream_csv(
+    name: str, start: date | None = None, end: date | None = None, compressed: bool = False
+) -> AsyncIterator[bytes]:
+    # HTTP 下载：逐批编码为 CSV（可选 gzip）后立即发送
+    dataset = get_dataset(name)
+    if dataset.date_column is None and (start or end):
+        raise ValueError(f"{name} has no date column; date range is not supported")
+    lo = datetime.combine(start, datetime.min.time()) if start else None
+    hi = datetime.combine(end + timedelta(days=1), datetime.min.time()) if end else None
+    stmt = dataset.select(lo, hi)
+    compressor = zlib.compressobj(wbits=31) if compressed else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow([c.key for c in dataset.columns])
+    yield drain()
+    async with engine.connect() as conn:
+        await _begin(conn)
+        async for chunk in iter_chunks(conn, stmt):
+            writer.writerows(chunk)
+            data = drain()
+            if data:
+                yield data
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,438 @@
+"""
+春节备货预测：按商品与商家分类，从销量日汇总（sales_daily）中取出往年春节窗口
+（除夕前 PRE_DAYS 天到正月十五前后 POST_DAYS 天）的逐日销量，以农历新年为对齐点得到季节曲线，
+再按今年的日常销量水平缩放，得到本季窗口内每个商品每天的预测销量。
+
+- 有往年窗口销量的商品：往年曲线按季加权平均（越近的季权重越高），乘以增长系数
+  = 当前日常水平 / 往年同期（窗口前 BASE_DAYS 天）日常水平，限制在 GROWTH_LIMITS 内；
+- 没有往年销量的商品（新品）：当前日常水平 × 所属分类的季节放大曲线（分类内有历史商品的曲线之和 / 日常水平之和）；
+- 窗口外的日期按当前日常水平预测。
+
+计算使用 NumPy（`pip install ".[forecast]"`），几千个商品在毫秒级完成。往年数据只在目标季变化时加载一次；
+之后每过一天滚动近期数据，重读新结束的日期以及之前 MAX_CLIENT_BACKDATE_DAYS 天（离线单可能补记到这些天，
+其它 worker 写入的补记也在这里补上），再重算（当天未结束的销量不参与）。本进程内补记已结束的日期
+（`add_sales_daily`）或重算汇总（`rebuild_sales_daily`）会调用 `mark_dirty`，下次请求即重读受影响的日期，
+落在往年季节窗口内时整体重新加载。
+补货建议（reorder）可选用预测的日均需求。
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import schemas
+from app.models.entities import Category, Product, SalesDaily
+from app.services import logic, metrics
+from app.services.repository import UNCATEGORIZED
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+# 农历新年（春节）公历日期
+LUNAR_NEW_YEAR = {
+    2019: date(2019, 2, 5),
+    2020: date(2020, 1, 25),
+    2021: date(2021, 2, 12),
+    2022: date(2022, 2, 1),
+    2023: date(2023, 1, 22),
+    2024: date(2024, 2, 10),
+    2025: date(2025, 1, 29),
+    2026: date(2026, 2, 17),
+    2027: date(2027, 2, 6),
+    2028: date(2028, 1, 26),
+    2029: date(2029, 2, 13),
+    2030: date(2030, 2, 3),
+}
+PRE_DAYS = 35
+POST_DAYS = 15
+BASE_DAYS = 60
+# 上一季权重为 1，再往前每季乘以该系数
+SEASON_DECAY = 0.6
+GROWTH_LIMITS = (0.5, 2.0)
+OFFSETS = PRE_DAYS + POST_DAYS + 1
+RECENT_DAYS = BASE_DAYS + OFFSETS
+
+
+def festival_for(day: date) -> date | None:
+    # 尚未结束（含正在进行）的最近一个春节窗口
+    for lny in sorted(LUNAR_NEW_YEAR.values()):
+        if day <= lny + timedelta(days=POST_DAYS):
+            return lny
+    return None
+
+
+@dataclass
+class Forecast:
+    lunar_new_year: date
+    as_of: date  # 最后一个已结束的日期
+    seasons: list[date]
+    product_ids: list[str]
+    names: list[str]
+    category_ids: list[str | None]
+    daily: Any  # (商品, 窗口内第几天) 的预测销量
+    base: Any  # 当前日常水平（件/日）
+    growth: Any
+    last_season: Any  # 上一季窗口内的实际销量
+    sold: Any  # 本季窗口内截至 as_of 的实际销量
+    source: Any  # 0 无数据，1 往年曲线，2 分类曲线
+    active: Any  # 商品仍存在（已删除的商品保留行但不输出）
+
+    @property
+    def window_start(self) -> date:
+        return self.lunar_new_year - timedelta(days=PRE_DAYS)
+
+    @property
+    def window_end(self) -> date:
+        return self.lunar_new_year + timedelta(days=POST_DAYS)
+
+    @property
+    def elapsed(self) -> int:
+        # 窗口内已结束的天数
+        return min(max((self.as_of - self.window_start).days + 1, 0), OFFSETS)
+
+    def demand(self, start: date, days: int):
+        # [start, start + days) 内每个商品的预测销量合计；窗口外的日期按日常水平
+        first = (start - self.window_start).days
+        lo, hi = max(first, 0), min(first + days, OFFSETS)
+        inside = max(hi - lo, 0)
+        total = self.base * (days - inside)
+        if inside:
+            total = total + self.daily[:, lo:hi].sum(axis=1)
+        return total
+
+    def rates(self, start: date, days: int) -> dict[str, float]:
+        if days <= 0:
+            return {}
+        demand = self.demand(start, days) / days
+        return {self.product_ids[i]: float(demand[i]) for i in np.flatnonzero((demand > 0) & self.active)}
+
+
+@dataclass
+class _History:
+    lunar_new_year: date
+    seasons: list[date]
+    index: dict[str, int]
+    present: set[str] = field(default_factory=set)
+    names: list[str] = field(default_factory=list)
+    category_ids: list[str | None] = field(default_factory=list)
+    season_qty: Any = None  # (商品, 季, 窗口内第几天)
+    season_base: Any = None  # (商品, 季) 窗口前的日均销量，数据不足为 NaN
+    recent: Any = None  # (商品, RECENT_DAYS)，最后一列为 as_of
+    as_of: date | None = None
+
+
+class ForecastCache:
+    def __init__(self):
+        self._history: _History | None = None
+        self._result: Forecast | None = None
+        self._dirty_from: date | None = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._history = None
+        self._result = None
+        self._dirty_from = None
+
+    def mark_dirty(self, day: date | None):
+        # 已结束日期的汇总有变动（补记离线单、重算）；None 表示全部。在写入事务内调用，
+        # 若重读早于提交，次日滚动时的尾部重读会再补上
+        if day is None:
+            self.invalidate()
+            return
+        self._result = None
+        self._dirty_from = day if self._dirty_from is None else min(self._dirty_from, day)
+
+    async def get(self, session: AsyncSession, today: date | None = None) -> Forecast:
+        if np is None:
+            raise RuntimeError('forecasting requires numpy: pip install ".[forecast]"')
+        today = today or datetime.utcnow().date()
+        as_of = today - timedelta(days=1)
+        lny = festival_for(today)
+        if lny is None:
+            raise RuntimeError(f"lunar new year date after {today} is not configured")
+        result = self._result
+        hit = (
+            result is not None
+            and self._dirty_from is None
+            and result.as_of == as_of
+            and result.lunar_new_year == lny
+        )
+        metrics.record_cache("forecast", hit)
+        if hit:
+            return result
+        async with self._lock:
+            history = self._history
+            dirty, self._dirty_from = self._dirty_from, None
+            if history is None or history.lunar_new_year != lny or history.as_of > as_of:
+                history = await self._load(session, lny, as_of)
+            else:
+                start = _reread_from(history, as_of, dirty)
+                if start is not None and _needs_reload(history, start):
+                    history = await self._load(session, lny, as_of)
+                else:
+                    await self._advance(session, history, as_of, start)
+            self._history = history
+            self._result = compute(history)
+        return self._result
+
+    async def demand_rates(self, session: AsyncSession, start: date, days: int) -> dict[str, float]:
+        forecast = await self.get(session, start)
+        return forecast.rates(start, days)
+
+    async def _load(self, session: AsyncSession, lny: date, as_of: date) -> _History:
+        first_day = (await session.execute(sa.select(sa.func.min(SalesDaily.day)))).scalar_one()
+        seasons = [
+            d
+            for d in sorted(LUNAR_NEW_YEAR.values(), reverse=True)
+            if d < lny and first_day is not None and d - timedelta(days=PRE_DAYS) >= first_day
+        ]
+        history = _History(lunar_new_year=lny, seasons=seasons, index={})
+        await self._sync_products(session, history)
+        size = len(history.index)
+        history.season_qty = np.zeros((size, len(seasons), OFFSETS))
+        base_sum = np.zeros((size, len(seasons)))
+        base_days = np.zeros(len(seasons))
+        # 日期 -> (季, 窗口内第几天)；窗口前的日常水平区间第几天记为负数
+        slots: dict[date, tuple[int, int]] = {}
+        for s, season in enumerate(seasons):
+            window_start = season - timedelta(days=PRE_DAYS)
+            for o in range(-BASE_DAYS, OFFSETS):
+                day = window_start + timedelta(days=o)
+                if day >= first_day:
+                    slots[day] = (s, o)
+                    if o < 0:
+                        base_days[s] += 1
+        ranges = [
+            SalesDaily.day.between(s - timedelta(days=PRE_DAYS + BASE_DAYS), s + timedelta(days=POST_DAYS))
+            for s in seasons
+        ]
+        if ranges:
+            rows = (
+                await session.execute(
+                    sa.select(SalesDaily.product_id, SalesDaily.day, SalesDaily.quantity).where(sa.or_(*ranges))
+                )
+            ).all()
+            p_idx, s_idx, o_idx, qty = _scatter(rows, history.index, slots)
+            inside = o_idx >= 0
+            np.add.at(history.season_qty, (p_idx[inside], s_idx[inside], o_idx[inside]), qty[inside])
+            np.add.at(base_sum, (p_idx[~inside], s_idx[~inside]), qty[~inside])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            history.season_base = np.where(base_days > 0, base_sum / base_days, np.nan)
+
+        history.recent = np.zeros((size, RECENT_DAYS))
+        history.as_of = as_of
+        await self._fill_recent(session, history, as_of - timedelta(days=RECENT_DAYS - 1), as_of)
+        return history
+
+    async def _advance(self, session: AsyncSession, history: _History, as_of: date, start: date | None):
+        # 新品补零行；近期数据左移，清空并重读 start 之后的日期
+        await self._sync_products(session, history)
+        shift = (as_of - history.as_of).days
+        if shift >= RECENT_DAYS:
+            history.recent[:] = 0
+        elif shift:
+            history.recent = np.roll(history.recent, -shift, axis=1)
+        history.as_of = as_of
+        if start is None:
+            return
+        history.recent[:, RECENT_DAYS - 1 - (as_of - start).days :] = 0
+        await self._fill_recent(session, history, start, as_of)
+
+    async def _fill_recent(self, session: AsyncSession, history: _History, start: date, end: date):
+        rows = (
+            await session.execute(
+                sa.select(SalesDaily.product_id, SalesDaily.day, SalesDaily.quantity).where(
+                    SalesDaily.day >= start, SalesDaily.day <= end
+                )
+            )
+        ).all()
+        first = history.as_of - timedelta(days=RECENT_DAYS - 1)
+        slots = {first + timedelta(days=i): (0, i) for i in range(RECENT_DAYS)}
+        p_idx, _, o_idx, qty = _scatter(rows, history.index, slots)
+        np.add.at(history.recent, (p_idx, o_idx), qty)
+
+    async def _sync_products(self, session: AsyncSession, history: _History):
+        rows = (await session.execute(sa.select(Product.id, Product.name, Product.category_id))).all()
+        history.present = {row[0] for row in rows}
+        added = 0
+        for pid, name, category_id in rows:
+            i = history.index.get(pid)
+            if i is None:
+                history.index[pid] = len(history.names)
+                history.names.append(name)
+                history.category_ids.append(category_id)
+                added += 1
+            else:
+                history.names[i] = name
+                history.category_ids[i] = category_id
+        if added and history.season_qty is not None:
+            seasons = len(history.seasons)
+            history.season_qty = np.concatenate([history.season_qty, np.zeros((added, seasons, OFFSETS))])
+            history.season_base = np.concatenate([history.season_base, np.full((added, seasons), np.nan)])
+            history.recent = np.concatenate([history.recent, np.zeros((added, RECENT_DAYS))])
+
+
+def _reread_from(history: _History, as_of: date, dirty: date | None) -> date | None:
+    # 需要重读的第一天：新结束的日期及其前 MAX_CLIENT_BACKDATE_DAYS 天（离线单最多补记到这里），
+    # 以及本进程标记的变动日期；不需要重读时为 None
+    shift = (as_of - history.as_of).days
+    start = as_of - timedelta(days=shift + logic.MAX_CLIENT_BACKDATE_DAYS - 1) if shift else None
+    if dirty is not None and dirty <= as_of:
+        start = dirty if start is None else min(start, dirty)
+    return start
+
+
+def _needs_reload(history: _History, day: date) -> bool:
+    # 重读范围超出近期数据，或落在已加载的往年季节窗口内：整体重新加载
+    if day < history.as_of - timedelta(days=RECENT_DAYS - 1):
+        return True
+    return bool(history.seasons) and day <= history.seasons[0] + timedelta(days=POST_DAYS)
+
+
+def _scatter(rows: list[Any], index: dict[str, int], slots: dict[date, tuple[int, int]]):
+    # 把 (商品, 日期, 数量) 行换算成数组下标，未知商品或不在区间内的日期丢弃
+    p_idx, s_idx, o_idx, qty = [], [], [], []
+    for pid, day, quantity in rows:
+        i = index.get(pid)
+        slot = slots.get(day)
+        if i is None or slot is None:
+            continue
+        p_idx.append(i)
+        s_idx.append(slot[0])
+        o_idx.append(slot[1])
+        qty.append(quantity)
+    return (
+        np.asarray(p_idx, dtype=np.int64),
+        np.asarray(s_idx, dtype=np.int64),
+        np.asarray(o_idx, dtype=np.int64),
+        np.asarray(qty, dtype=np.float64),
+    )
+
+
+def compute(history: _History) -> Forecast:
+    size = len(history.names)
+    window_start = history.lunar_new_year - timedelta(days=PRE_DAYS)
+    # 当前日常水平：窗口开始前（已进入窗口时）或截至 as_of 的 BASE_DAYS 天日均
+    base_end = min(history.as_of, window_start - timedelta(days=1))
+    end_col = RECENT_DAYS - 1 - (history.as_of - base_end).days
+    base = history.recent[:, end_col - BASE_DAYS + 1 : end_col + 1].sum(axis=1) / BASE_DAYS
+
+    seasons = len(history.seasons)
+    if seasons:
+        weights = SEASON_DECAY ** np.arange(seasons)
+        profile = np.tensordot(history.season_qty, weights, axes=([1], [0])) / weights.sum()
+        valid = ~np.isnan(history.season_base)
+        base_weights = valid * weights
+        with np.errstate(invalid="ignore", divide="ignore"):
+            hist_base = np.where(valid, history.season_base, 0) @ weights / base_weights.sum(axis=1)
+        last_season = history.season_qty[:, 0, :].sum(axis=1)
+    else:
+        profile = np.zeros((size, OFFSETS))
+        hist_base = np.full(size, np.nan)
+        last_season = np.zeros(size)
+
+    has_history = profile.sum(axis=1) > 0
+    usable = has_history & (hist_base > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        growth = np.where(usable & (base > 0), np.clip(base / hist_base, *GROWTH_LIMITS), 1.0)
+
+    # 分类季节放大曲线：分类内有历史商品的往年曲线之和 / 其日常水平之和；分类内没有时用全店曲线
+    categories = sorted({c for c in history.category_ids if c is not None})
+    cat_lookup = {c: i + 1 for i, c in enumerate(categories)}
+    cat_idx = np.asarray([cat_lookup.get(c, 0) for c in history.category_ids], dtype=np.int64)
+    cat_profile = np.zeros((len(categories) + 1, OFFSETS))
+    cat_base = np.zeros(len(categories) + 1)
+    np.add.at(cat_profile, cat_idx[usable], profile[usable])
+    np.add.at(cat_base, cat_idx[usable], hist_base[usable])
+    total_base = cat_base.sum()
+    overall = profile[usable].sum(axis=0) / total_base if total_base > 0 else np.ones(OFFSETS)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lift = np.where(cat_base[:, None] > 0, cat_profile / cat_base[:, None], overall)
+
+    daily = np.where(has_history[:, None], profile * growth[:, None], base[:, None] * lift[cat_idx])
+    source = np.where(has_history, 1, np.where(base > 0, 2, 0))
+    # 本季已结束的天数对应近期数据的最后几列
+    elapsed = min(max((history.as_of - window_start).days + 1, 0), OFFSETS)
+    sold = history.recent[:, RECENT_DAYS - elapsed :].sum(axis=1) if elapsed else np.zeros(size)
+    return Forecast(
+        lunar_new_year=history.lunar_new_year,
+        as_of=history.as_of,
+        seasons=list(history.seasons),
+        product_ids=list(history.index),
+        names=list(history.names),
+        category_ids=list(history.category_ids),
+        daily=daily,
+        base=base,
+        growth=growth,
+        last_season=last_season,
+        sold=sold,
+        source=source,
+        active=np.asarray([pid in history.present for pid in history.index], dtype=bool),
+    )
+
+
+async def festival_summary(
+    session: AsyncSession, category_id: str | None = None, limit: int = 50, today: date | None = None
+) -> schemas.FestivalForecast:
+    # 商家分类汇总全部输出；商品按本季剩余预测量取前 limit 个
+    forecast = await cache.get(session, today)
+    remaining = forecast.daily[:, forecast.elapsed :].sum(axis=1)
+    season_total = forecast.daily.sum(axis=1)
+    keys = np.asarray([c or UNCATEGORIZED for c in forecast.category_ids], dtype=object)
+    mask = forecast.active.copy()
+    if category_id:
+        mask &= keys == category_id
+
+    names = dict((await session.execute(sa.select(Category.id, Category.name))).all())
+    categories: list[schemas.CategoryForecast] = []
+    for key in sorted(set(keys[forecast.active])):
+        rows = forecast.active & (keys == key)
+        categories.append(
+            schemas.CategoryForecast(
+                category_id=key,
+                name=names.get(key, "未分类"),
+                product_count=int(rows.sum()),
+                last_season_qty=round(float(forecast.last_season[rows].sum()), 1),
+                season_total=round(float(season_total[rows].sum()), 1),
+                sold=round(float(forecast.sold[rows].sum()), 1),
+                remaining=round(float(remaining[rows].sum()), 1),
+            )
+        )
+    categories.sort(key=lambda c: -c.remaining)
+
+    ranked = np.flatnonzero(mask)
+    ranked = ranked[np.argsort(-remaining[ranked], kind="stable")][:limit]
+    sources = ("none", "history", "category")
+    products = [
+        schemas.ProductForecast(
+            product_id=forecast.product_ids[i],
+            name=forecast.names[i],
+            category_id=forecast.category_ids[i],
+            source=sources[int(forecast.source[i])],
+            base_rate=round(float(forecast.base[i]), 2),
+            growth=round(float(forecast.growth[i]), 2),
+            last_season_qty=round(float(forecast.last_season[i]), 1),
+            season_total=round(float(season_total[i]), 1),
+            sold=round(float(forecast.sold[i]), 1),
+            remaining=round(float(remaining[i]), 1),
+        )
+        for i in ranked
+    ]
+    return schemas.FestivalForecast(
+        lunar_new_year=forecast.lunar_new_year,
+        window_start=forecast.window_start,
+        window_end=forecast.window_end,
+        as_of=forecast.as_of,
+        seasons=forecast.seasons,
+        categories=categories,
+        products=products,
+    )
+
+
+cache = ForecastCache()
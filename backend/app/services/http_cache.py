@@ -0,0 +1,188 @@
+"""
+HTTP 缓存与压缩（纯 ASGI 中间件，对所有路由生效）：
+
+- 条件请求：路由在查数据前后用 `check(request, etag=..., last_modified=...)` 提交版本，命中
+  `If-None-Match` / `If-Modified-Since` 时直接返回 304，不再序列化响应体；未提交版本的 GET 响应
+  由中间件按响应体哈希生成弱 ETag，命中时返回 304（省带宽）。
+- 压缩：响应体不小于 `YH_COMPRESS_MIN_BYTES`（默认 1024）的 JSON/文本响应按 Accept-Encoding
+  压缩为 br（安装 brotli 时）或 gzip。已带 Content-Encoding（如目录快照的预压缩结果）、
+  没有 Content-Length 的流式响应（SSE、导出）原样透传。
+"""
+
+import gzip
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import HTTPException, Request
+
+from app.services import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 可选依赖
+    brotli = None
+
+MIN_COMPRESS_BYTES = int(os.getenv("YH_COMPRESS_MIN_BYTES", "1024"))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+SCOPE_KEY = "yh.validators"
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # If-None-Match 使用弱比较
+    if not if_none_match:
+        return False
+    target = etag.removeprefix("W/")
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == target:
+            return True
+    return False
+
+
+def modified_since(if_modified_since: str | None, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return True
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return _utc(last_modified).replace(microsecond=0) > since
+
+
+def _utc(value: datetime) -> datetime:
+    # 库中时间均为 naive UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def validator_headers(etag: str | None, last_modified: datetime | None) -> dict[str, str]:
+    headers = {}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(_utc(last_modified), usegmt=True)
+    return headers
+
+
+def check(request: Request, etag: str | None = None, last_modified: datetime | None = None):
+    headers = validator_headers(etag, last_modified)
+    # 中间件给 200 响应补上这些头
+    request.scope[SCOPE_KEY] = headers
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag:
+        hit = etag_matches(if_none_match, etag)
+    elif last_modified and request.headers.get("if-modified-since"):
+        hit = not modified_since(request.headers.get("if-modified-since"), last_modified)
+    else:
+        hit = False
+    metrics.record_cache("etag", hit)
+    if hit:
+        raise HTTPException(status_code=304, headers=headers)
+
+
+def expected_version(if_match: str | None, body_version: int | None = None) -> int | None:
+    # 写接口的前置条件：If-Match（"3"、W/"3" 或 3）优先于请求体中的 version，"*" 表示不校验
+    if not if_match:
+        return body_version
+    tag = if_match.split(",")[0].strip()
+    if tag == "*":
+        return None
+    try:
+        return int(tag.removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid If-Match") from None
+
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        # 动态内容取较低质量，压缩耗时与 gzip 相当
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=5)
+
+
+class HttpCacheMiddleware:
+    def __init__(self, app, minimum_size: int = MIN_COMPRESS_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        conditional = scope["method"] in ("GET", "HEAD")
+        start: dict | None = None
+        chunks: list[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = {k.decode("latin-1").lower() for k, _ in message.get("headers", [])}
+                content_type = _header(message, b"content-type") or ""
+                if (
+                    message["status"] != 200
+                    or "content-encoding" in headers
+                    or "content-length" not in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                await self._finish(scope, request_headers, conditional, start, b"".join(chunks), send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _finish(self, scope, request_headers: dict[str, str], conditional: bool, start: dict, body: bytes, send):
+        headers = [(k, v) for k, v in start.get("headers", []) if k.lower() != b"content-length"]
+        names = {k.lower() for k, _ in headers}
+        if conditional:
+            for name, value in scope.get(SCOPE_KEY, {}).items():
+                if name.lower().encode() not in names:
+                    headers.append((name.lower().encode(), value.encode("latin-1")))
+            if b"etag" not in names and SCOPE_KEY not in scope:
+                etag = f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+                headers.append((b"etag", etag.encode()))
+                hit = etag_matches(request_headers.get("if-none-match"), etag)
+                metrics.record_cache("etag", hit)
+                if hit:
+                    await send({"type": "http.response.start", "status": 304, "headers": headers})
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+        if len(body) >= self.minimum_size:
+            headers.append((b"vary", b"Accept-Encoding"))
+            encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+            if encoding:
+                body = compress(body, encoding)
+                headers.append((b"content-encoding", encoding.encode()))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({**start, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _header(message: dict, name: bytes) -> str | None:
+    for key, value in message.get("headers", []):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
@@ -0,0 +1,42 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(60 * 60 * 24)))
+PURGE_EVERY = 500
+
+_inflight: dict[str, asyncio.Future] = {}
+_claims = 0
+
+
+async def coalesce(key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    同一 worker 内相同幂等键的并发请求合并为一次执行，其余请求等待并复用结果（含异常）。
+    跨 worker 的重复由数据库中的幂等键主键保证。
+    """
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+    future: asyncio.Future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await factory()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as exc:
+        future.set_exception(exc)
+        # 没有等待者时避免 "exception was never retrieved" 警告
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(key, None)
+
+
+def should_purge() -> bool:
+    global _claims
+    _claims += 1
+    return _claims % PURGE_EVERY == 0
@@ -1,29 +1,53 @@
 import re
 import asyncio
-from datetime import datetime
-from typing import Any, List, Tuple
+import base64
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import TYPE_CHECKING, Any, List, Tuple
 
 import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.models import schemas
+from app.services import metrics, pricing
+from app.services.pricing import round2
 from app.models.entities import (
+    gen_uuid,
     Category,
     DailyReceipt,
+    IdempotencyKey,
     Inventory,
     InventoryLog,
     Product,
+    ProductAlias,
     ProductCategory,
     PurchaseItem,
     PurchaseOrder,
+    SalesDaily,
     SalesItem,
     SalesOrder,
     SystemConfig,
     User,
     Warehouse,
 )
+
+if TYPE_CHECKING:
+    from app.services.repository import Repository
+
 DEFAULT_GLOBAL_MULTIPLIER = 1.5
+# 库存调整的乐观更新重试次数，仍冲突时退回行锁
+OPTIMISTIC_RETRIES = 3
+# 离线单下单时间最多回溯的天数，更早的按该下限记账（客户端时钟错误时不会把销量记到几年前）
+MAX_CLIENT_BACKDATE_DAYS = int(os.getenv("YH_OFFLINE_MAX_BACKDATE_DAYS", "7"))
+# 多行 upsert 每条语句的行数，asyncpg 单条语句最多 32767 个绑定参数
+UPSERT_CHUNK = 1000
+
+
+class VersionConflict(ValueError):
+    # 条件更新时版本不一致（路由返回 412）
+    pass
 
 
 def normalize_spec(spec: str | None) -> str | None:
@@ -46,6 +70,23 @@ def compute_version_from_models(models: list[Any]) -> str:
     return (max_ts or datetime.utcnow()).isoformat()
 
 
+def encode_cursor(ts: datetime | None, row_id: str) -> str:
+    raw = f"{ts.isoformat() if ts else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        ts_part, _, row_id = raw.partition("|")
+        ts = datetime.fromisoformat(ts_part) if ts_part else None
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("invalid cursor") from exc
+    if not row_id:
+        raise ValueError("invalid cursor")
+    return ts, row_id
+
+
 def parse_spec_qty(spec: str | None) -> float:
     clean = normalize_spec(spec)
     if not clean:
@@ -58,13 +99,111 @@ def parse_spec_qty(spec: str | None) -> float:
 
 
 async def replace_product_categories(session: AsyncSession, product_id: str, category_ids: list[str]):
-    await session.execute(sa.delete(ProductCategory).where(ProductCategory.product_id == product_id))
+    # 只删除不再需要的关联、补上缺少的关联，未变化的行不动
     unique_ids = [cid for cid in dict.fromkeys(category_ids) if cid]
+    await session.execute(
+        sa.delete(ProductCategory).where(
+            ProductCategory.product_id == product_id, ProductCategory.category_id.not_in(unique_ids)
+        )
+    )
     if unique_ids:
-        session.add_all([ProductCategory(product_id=product_id, category_id=cid) for cid in unique_ids])
+        await session.execute(
+            pg_insert(ProductCategory)
+            .values([{"product_id": product_id, "category_id": cid} for cid in unique_ids])
+            .on_conflict_do_nothing()
+        )
     await session.flush()
 
 
+async def assign_category_products(
+    session: AsyncSession, assignments: list[schemas.CategoryAssignment]
+) -> list[schemas.CategoryAssignResult]:
+    # 批量调整分类下的商品：product_ids 为目标集合（整体替换），否则按 add/remove 增量修改。
+    # 差异由 DELETE ... RETURNING / INSERT ... ON CONFLICT DO NOTHING RETURNING 在库内算出，
+    # 只写变化的行；受影响商品与分类的版本号在整批结束时各 +1 一次。
+    category_ids = list(dict.fromkeys(a.category_id for a in assignments))
+    found = set(
+        (await session.execute(sa.select(Category.id).where(Category.id.in_(category_ids)))).scalars().all()
+    )
+    absent = [cid for cid in category_ids if cid not in found]
+    if absent:
+        raise ValueError(f"category not found: {', '.join(absent)}")
+
+    requested = {pid for a in assignments for pid in (a.product_ids or []) + a.add if pid}
+    existing: set[str] = set()
+    if requested:
+        existing = set(
+            (await session.execute(sa.select(Product.id).where(Product.id.in_(requested)))).scalars().all()
+        )
+
+    results: list[schemas.CategoryAssignResult] = []
+    for a in assignments:
+        if a.product_ids is not None:
+            wanted = [pid for pid in dict.fromkeys(a.product_ids) if pid]
+            delete_stmt = sa.delete(ProductCategory).where(
+                ProductCategory.category_id == a.category_id,
+                ProductCategory.product_id.not_in([pid for pid in wanted if pid in existing]),
+            )
+        else:
+            wanted = [pid for pid in dict.fromkeys(a.add) if pid]
+            dropped = [pid for pid in dict.fromkeys(a.remove) if pid and pid not in wanted]
+            delete_stmt = None
+            if dropped:
+                delete_stmt = sa.delete(ProductCategory).where(
+                    ProductCategory.category_id == a.category_id, ProductCategory.product_id.in_(dropped)
+                )
+        removed: list[str] = []
+        if delete_stmt is not None:
+            removed = list((await session.execute(delete_stmt.returning(ProductCategory.product_id))).scalars().all())
+        insert_ids = [pid for pid in wanted if pid in existing]
+        added: list[str] = []
+        if insert_ids:
+            stmt = (
+                pg_insert(ProductCategory)
+                .values([{"product_id": pid, "category_id": a.category_id} for pid in insert_ids])
+                .on_conflict_do_nothing()
+                .returning(ProductCategory.product_id)
+            )
+            added = list((await session.execute(stmt)).scalars().all())
+        results.append(
+            schemas.CategoryAssignResult(
+                category_id=a.category_id,
+                added=added,
+                removed=removed,
+                missing=[pid for pid in wanted if pid not in existing],
+            )
+        )
+
+    changed_products = list({pid for r in results for pid in r.added + r.removed})
+    changed_categories = list(dict.fromkeys(r.category_id for r in results if r.added or r.removed))
+    now = datetime.utcnow()
+    if changed_products:
+        await session.execute(
+            sa.update(Product)
+            .where(Product.id.in_(changed_products))
+            .values(updated_at=now, version=Product.version + 1)
+        )
+    if changed_categories:
+        await session.execute(
+            sa.update(Category)
+            .where(Category.id.in_(changed_categories))
+            .values(updated_at=now, version=Category.version + 1)
+        )
+    counts = dict(
+        (
+            await session.execute(
+                sa.select(ProductCategory.category_id, sa.func.count())
+                .where(ProductCategory.category_id.in_(category_ids))
+                .group_by(ProductCategory.category_id)
+            )
+        ).all()
+    )
+    for r in results:
+        r.count = counts.get(r.category_id, 0)
+    await session.flush()
+    return results
+
+
 def extract_category_ids(categories: list[Any]) -> list[str]:
     ids: list[str] = []
     for c in categories:
@@ -112,52 +251,35 @@ async def get_global_multiplier(session: AsyncSession) -> float:
         return DEFAULT_GLOBAL_MULTIPLIER
 
 
-async def get_or_create_user_by_openid(session: AsyncSession, openid: str, nickname: str | None = None) -> User:
-    stmt = sa.select(User).where(User.openid == openid)
-    user = (await session.execute(stmt)).scalars().first()
+async def get_or_create_user_by_openid(repo: "Repository", openid: str, nickname: str | None = None) -> User:
+    user = await repo.get_user_by_openid(openid)
     if user:
         return user
-    user = User(username=nickname or "店员", role="clerk", openid=openid)
-    session.add(user)
-    await session.flush()
-    return user
-
-
-async def get_user_by_id(session: AsyncSession, user_id: str) -> User | None:
-    stmt = sa.select(User).where(User.id == user_id)
-    return (await session.execute(stmt)).scalars().first()
+    return await repo.add_user(User(username=nickname or "店员", role="clerk", openid=openid))
 
 
-async def calculate_price_for_product(session: AsyncSession, product: Product) -> schemas.PriceCalcResponse:
-    if product.fixed_retail_price is not None and product.fixed_retail_price > 0:
-        return schemas.PriceCalcResponse(price=product.fixed_retail_price, basis="例外价")
+async def get_user_by_id(repo: "Repository", user_id: str) -> User | None:
+    return await repo.get_user(user_id)
 
-    if product.retail_multiplier:
-        return schemas.PriceCalcResponse(price=round2(product.base_cost_price * product.retail_multiplier), basis="商品系数")
 
-    multipliers: list[float] = []
-    # 多分类
-    stmt_pc = sa.select(ProductCategory.category_id).where(ProductCategory.product_id == product.id)
-    pc_ids = [row[0] for row in (await session.execute(stmt_pc)).all()]
-    if pc_ids:
-        stmt = sa.select(Category).where(Category.id.in_(pc_ids))
-        categories = (await session.execute(stmt)).scalars().all()
-        multipliers = [c.retail_multiplier for c in categories if c.retail_multiplier]
+async def calculate_price_for_product(repo: "Repository", product: Product) -> schemas.PriceCalcResponse:
+    result = pricing.price_product(product, await repo.load_pricing_context([product]))
+    return schemas.PriceCalcResponse(price=result.price, basis=result.basis)
 
-    if product.category_id and not multipliers:
-        category = await session.get(Category, product.category_id)
-        if category and category.retail_multiplier:
-            multipliers.append(category.retail_multiplier)
-
-    if multipliers:
-        chosen = max(multipliers)
-        # 回写商品系数，便于下次直接使用
-        product.retail_multiplier = chosen
-        await session.flush()
-        return schemas.PriceCalcResponse(price=round2(product.base_cost_price * chosen), basis="分类系数")
 
-    multiplier = await get_global_multiplier(session)
-    return schemas.PriceCalcResponse(price=round2(product.base_cost_price * multiplier), basis="全局系数")
+async def calculate_prices_for_ids(
+    repo: "Repository", product_ids: list[str]
+) -> tuple[list[schemas.PriceBatchItem], list[str]]:
+    # 按请求顺序返回，重复 id 只算一次；不存在的 id 放入 missing
+    unique_ids = list(dict.fromkeys(product_ids))
+    products = list((await repo.get_products(unique_ids)).values())
+    prices = pricing.price_products(products, await repo.load_pricing_context(products)) if products else {}
+    items = [
+        schemas.PriceBatchItem(product_id=pid, price=prices[pid].price, basis=prices[pid].basis)
+        for pid in unique_ids
+        if pid in prices
+    ]
+    return items, [pid for pid in unique_ids if pid not in prices]
 
 
 async def create_product(session: AsyncSession, payload: schemas.Product) -> Product:
@@ -185,22 +307,34 @@ async def create_product(session: AsyncSession, payload: schemas.Product) -> Pro
     return product
 
 
-async def update_product(session: AsyncSession, product_id: str, payload: schemas.Product) -> Product:
+async def update_product(
+    session: AsyncSession, product_id: str, payload: schemas.Product, expected_version: int | None = None
+) -> Product:
+    # 单条条件 UPDATE（WHERE version = :v），不加行锁；版本不一致抛 VersionConflict
     fixed_price = payload.fixed_retail_price if (payload.fixed_retail_price or 0) > 0 else None
-    spec_value = normalize_spec(payload.spec)
-    product = await session.get(Product, product_id)
+    values: dict[str, Any] = {
+        "category_id": payload.category_id,
+        "spec": normalize_spec(payload.spec),
+        "base_cost_price": payload.base_cost_price,
+        "fixed_retail_price": fixed_price,
+        "retail_multiplier": payload.retail_multiplier,
+        "pack_price_ref": payload.pack_price_ref,
+        "img_url": payload.img_url,
+        "effect_url": payload.effect_url,
+        "updated_at": datetime.utcnow(),
+        "version": Product.version + 1,
+    }
+    if payload.name:
+        values["name"] = payload.name
+    stmt = sa.update(Product).where(Product.id == product_id)
+    if expected_version is not None:
+        stmt = stmt.where(Product.version == expected_version)
+    stmt = stmt.values(**values).returning(Product).execution_options(populate_existing=True)
+    product = (await session.execute(stmt)).scalars().first()
     if not product:
+        if expected_version is not None and await session.get(Product, product_id):
+            raise VersionConflict("product was modified by another request")
         raise ValueError("product not found")
-    product.name = payload.name or product.name
-    product.category_id = payload.category_id
-    product.spec = spec_value
-    product.base_cost_price = payload.base_cost_price
-    product.fixed_retail_price = fixed_price
-    product.retail_multiplier = payload.retail_multiplier
-    product.pack_price_ref = payload.pack_price_ref
-    product.img_url = payload.img_url
-    product.effect_url = payload.effect_url
-    product.updated_at = datetime.utcnow()
     if payload.categories is not None:
         category_ids = extract_category_ids(payload.categories)
         await replace_product_categories(session, product_id, category_ids)
@@ -218,6 +352,152 @@ async def delete_product(session: AsyncSession, product_id: str):
     await session.flush()
 
 
+# 批量编辑允许修改的字段（未出现在请求中的字段保持不变）
+PRODUCT_PATCH_FIELDS = (
+    "name",
+    "category_id",
+    "spec",
+    "base_cost_price",
+    "fixed_retail_price",
+    "retail_multiplier",
+    "pack_price_ref",
+    "img_url",
+    "effect_url",
+)
+
+
+def _patch_values(item: schemas.ProductPatch) -> dict[str, Any]:
+    # 与 update_product 相同的规整：规格只保留数字，非正的例外价视为清除
+    values = {f: getattr(item, f) for f in PRODUCT_PATCH_FIELDS if f in item.model_fields_set}
+    if "spec" in values:
+        values["spec"] = normalize_spec(values["spec"])
+    if "fixed_retail_price" in values and not (values["fixed_retail_price"] or 0) > 0:
+        values["fixed_retail_price"] = None
+    for field in ("name", "base_cost_price"):  # 非空列，null 或空串视为不修改
+        if field in values and values[field] in (None, ""):
+            values.pop(field)
+    return values
+
+
+async def update_products_bulk(
+    session: AsyncSession, items: list[schemas.ProductPatch]
+) -> list[schemas.ProductBulkResult]:
+    # 同一组修改字段的商品合并为一条 UPDATE product ... FROM (VALUES ...)，带 version 的按版本条件更新；
+    # categories 给出时按差异替换自定义分类。逐条返回结果，失败的条目不影响其它条目。
+    results: dict[str, schemas.ProductBulkResult] = {}
+    patches: dict[str, tuple[dict[str, Any], int | None, list[str] | None]] = {}
+    for item in items:
+        if item.id in patches or item.id in results:
+            results[item.id] = schemas.ProductBulkResult(id=item.id, status="error", error="duplicate product id")
+            patches.pop(item.id, None)
+            continue
+        category_ids = [cid for cid in dict.fromkeys(item.categories) if cid] if item.categories is not None else None
+        patches[item.id] = (_patch_values(item), item.version, category_ids)
+
+    referenced = {v["category_id"] for v, _, _ in patches.values() if v.get("category_id")}
+    referenced.update(cid for _, _, cids in patches.values() for cid in cids or [])
+    if referenced:
+        known = set((await session.execute(sa.select(Category.id).where(Category.id.in_(referenced)))).scalars().all())
+        for pid, (values, _, cids) in list(patches.items()):
+            unknown = [cid for cid in [values.get("category_id"), *(cids or [])] if cid and cid not in known]
+            if unknown:
+                results[pid] = schemas.ProductBulkResult(
+                    id=pid, status="error", error=f"category not found: {', '.join(unknown)}"
+                )
+                del patches[pid]
+
+    groups: dict[tuple[str, ...], list[str]] = {}
+    for pid, (values, _, _) in patches.items():
+        groups.setdefault(tuple(sorted(values)), []).append(pid)
+    now = datetime.utcnow()
+    columns = Product.__table__.c
+    updated: dict[str, int] = {}
+    for fields, ids in groups.items():
+        rows = sa.values(
+            sa.column("id", sa.String),
+            sa.column("expected_version", sa.Integer),
+            *[sa.column(f, columns[f].type) for f in fields],
+            name="patch",
+        ).data([(pid, patches[pid][1], *[patches[pid][0][f] for f in fields]) for pid in ids])
+        # None 在 VALUES 中渲染为无类型的 NULL，整列都是 NULL 时会被推断为 text，需显式转换
+        expected = sa.cast(rows.c.expected_version, sa.Integer)
+        values: dict[str, Any] = {f: sa.cast(rows.c[f], columns[f].type) for f in fields}
+        stmt = (
+            sa.update(Product)
+            .where(Product.id == rows.c.id, sa.or_(expected.is_(None), Product.version == expected))
+            .values(**values, updated_at=now, version=Product.version + 1)
+            .returning(Product.id, Product.version)
+        )
+        updated.update((await session.execute(stmt)).all())
+
+    missed = [pid for pid in patches if pid not in updated]
+    existing: set[str] = set()
+    if missed:
+        existing = set((await session.execute(sa.select(Product.id).where(Product.id.in_(missed)))).scalars().all())
+    for pid in patches:
+        if pid in updated:
+            results[pid] = schemas.ProductBulkResult(id=pid, status="updated", version=updated[pid])
+        elif pid in existing:
+            results[pid] = schemas.ProductBulkResult(
+                id=pid, status="conflict", error="product was modified by another request"
+            )
+        else:
+            results[pid] = schemas.ProductBulkResult(id=pid, status="not_found", error="product not found")
+
+    # 自定义分类：一次删除不在目标集合内的关联，一次补齐缺少的关联
+    targets = {pid: cids for pid, (_, _, cids) in patches.items() if cids is not None and pid in updated}
+    if targets:
+        pairs = [(pid, cid) for pid, cids in targets.items() for cid in cids]
+        await session.execute(
+            sa.delete(ProductCategory).where(
+                ProductCategory.product_id.in_(list(targets)),
+                sa.tuple_(ProductCategory.product_id, ProductCategory.category_id).not_in(pairs),
+            )
+        )
+        if pairs:
+            await session.execute(
+                pg_insert(ProductCategory)
+                .values([{"product_id": pid, "category_id": cid} for pid, cid in pairs])
+                .on_conflict_do_nothing()
+            )
+    await session.flush()
+    return [results[pid] for pid in dict.fromkeys(item.id for item in items)]
+
+
+async def delete_products_bulk(session: AsyncSession, product_ids: list[str]) -> list[schemas.ProductBulkResult]:
+    # 有销售、进货或库存流水的商品保留历史，不删除（返回 in_use）；其余连同分类关联与库存行一起删除
+    ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+    existing = set((await session.execute(sa.select(Product.id).where(Product.id.in_(ids)))).scalars().all())
+    in_use: set[str] = set()
+    if existing:
+        referenced = sa.union(
+            sa.select(SalesItem.product_id).where(SalesItem.product_id.in_(existing)),
+            sa.select(PurchaseItem.product_id).where(PurchaseItem.product_id.in_(existing)),
+            sa.select(InventoryLog.product_id).where(InventoryLog.product_id.in_(existing)),
+        )
+        in_use = set((await session.execute(referenced)).scalars().all())
+    deletable = [pid for pid in ids if pid in existing and pid not in in_use]
+    if deletable:
+        await session.execute(sa.delete(ProductCategory).where(ProductCategory.product_id.in_(deletable)))
+        await session.execute(sa.delete(ProductAlias).where(ProductAlias.product_id.in_(deletable)))
+        await session.execute(sa.delete(Inventory).where(Inventory.product_id.in_(deletable)))
+        await session.execute(sa.delete(Product).where(Product.id.in_(deletable)))
+    await session.flush()
+    results = []
+    for pid in ids:
+        if pid not in existing:
+            results.append(schemas.ProductBulkResult(id=pid, status="not_found", error="product not found"))
+        elif pid in in_use:
+            results.append(
+                schemas.ProductBulkResult(
+                    id=pid, status="in_use", error="product has sales, purchase or inventory history"
+                )
+            )
+        else:
+            results.append(schemas.ProductBulkResult(id=pid, status="deleted"))
+    return results
+
+
 async def product_with_category(session: AsyncSession, product_id: str) -> schemas.Product:
     product = await session.get(Product, product_id)
     if not product:
@@ -235,6 +515,7 @@ async def product_with_category(session: AsyncSession, product_id: str) -> schem
                     name=category.name,
                     retail_multiplier=category.retail_multiplier,
                     is_custom=category.is_custom,
+                    version=category.version,
                 )
             )
     stmt = sa.select(Category).join(ProductCategory, Category.id == ProductCategory.category_id).where(
@@ -243,7 +524,11 @@ async def product_with_category(session: AsyncSession, product_id: str) -> schem
     extra = (await session.execute(stmt)).scalars().all()
     for c in extra:
         if not any(x.id == c.id for x in categories):
-            categories.append(schemas.Category(id=c.id, name=c.name, retail_multiplier=c.retail_multiplier, is_custom=c.is_custom))
+            categories.append(
+                schemas.Category(
+                    id=c.id, name=c.name, retail_multiplier=c.retail_multiplier, is_custom=c.is_custom, version=c.version
+                )
+            )
 
     return schemas.Product(
         id=product.id,
@@ -258,6 +543,7 @@ async def product_with_category(session: AsyncSession, product_id: str) -> schem
         pack_price_ref=product.pack_price_ref,
         img_url=product.img_url,
         effect_url=product.effect_url,
+        version=product.version,
     )
 
 
@@ -289,16 +575,27 @@ async def delete_category(session: AsyncSession, category_id: str, force: bool =
     return count
 
 
-async def upsert_category(session: AsyncSession, category_id: str, payload: schemas.Category) -> Category:
-    stmt = sa.select(Category).where(Category.id == category_id)
+async def upsert_category(
+    session: AsyncSession, category_id: str, payload: schemas.Category, expected_version: int | None = None
+) -> Category:
+    values: dict[str, Any] = {
+        "name": payload.name,
+        "retail_multiplier": payload.retail_multiplier,
+        "updated_at": datetime.utcnow(),
+        "version": Category.version + 1,
+    }
+    if payload.is_custom is not None:
+        values["is_custom"] = payload.is_custom
+    stmt = sa.update(Category).where(Category.id == category_id)
+    if expected_version is not None:
+        stmt = stmt.where(Category.version == expected_version)
+    stmt = stmt.values(**values).returning(Category).execution_options(populate_existing=True)
     existing = (await session.execute(stmt)).scalars().first()
     if existing:
-        existing.name = payload.name
-        existing.retail_multiplier = payload.retail_multiplier
-        if payload.is_custom is not None:
-            existing.is_custom = payload.is_custom
-        await session.flush()
         return existing
+    if expected_version is not None:
+        # If-Match 针对已存在的版本，分类不存在或版本已变都视为前置条件失败
+        raise VersionConflict("category was modified by another request")
     category = Category(
         id=payload.id or category_id,
         name=payload.name,
@@ -310,68 +607,139 @@ async def upsert_category(session: AsyncSession, category_id: str, payload: sche
     return category
 
 
-async def get_product_with_lock(session: AsyncSession, product_id: str) -> Product | None:
-    stmt = sa.select(Product).where(Product.id == product_id).with_for_update()
-    return (await session.execute(stmt)).scalars().first()
-
-
-async def get_inventory_record(
-    session: AsyncSession, product_id: str, warehouse_id: str = "default", create_if_missing: bool = True
-) -> Inventory | None:
-    stmt = (
-        sa.select(Inventory)
-        .where(Inventory.product_id == product_id, Inventory.warehouse_id == warehouse_id)
-        .with_for_update()
-    )
-    inv = (await session.execute(stmt)).scalars().first()
-    if inv:
-        return inv
-    if not create_if_missing:
-        return None
-    inv = Inventory(product_id=product_id, warehouse_id=warehouse_id, current_stock=0, loose_units=0)
-    session.add(inv)
-    await session.flush()
-    return inv
-
-
-def apply_unit_delta(inv: Inventory, product: Product, delta_units: int) -> None:
+def split_units(current_stock: int, loose_units: int | None, product: Product, delta_units: int) -> tuple[int, int]:
+    # 返回加减 delta_units 后的（箱数，散装数），总数最低为 0
     spec_qty = parse_spec_qty(product.spec)
     if spec_qty <= 0:
         spec_qty = 1
-    total_units = inv.current_stock * spec_qty + (inv.loose_units or 0)
+    total_units = current_stock * spec_qty + (loose_units or 0)
     total_units += delta_units
     if total_units < 0:
         total_units = 0
     if spec_qty == 1:
-        inv.current_stock = int(total_units)
-        inv.loose_units = 0
-    else:
-        inv.current_stock = int(total_units // spec_qty)
-        inv.loose_units = int(total_units % spec_qty)
+        return int(total_units), 0
+    return int(total_units // spec_qty), int(total_units % spec_qty)
+
+
+def apply_unit_delta(inv: Inventory, product: Product, delta_units: int) -> None:
+    # 调用方已持有库存行锁
+    inv.current_stock, inv.loose_units = split_units(inv.current_stock, inv.loose_units, product, delta_units)
     inv.updated_at = datetime.utcnow()
+    inv.version = (inv.version or 0) + 1
+
+
+async def lock_inventory_records(
+    session: AsyncSession, product_ids: list[str], warehouse_id: str = "default"
+) -> dict[str, Inventory]:
+    # 缺失的库存行先一次性补齐，再按 product_id 顺序 FOR UPDATE，避免并发死锁
+    ids = sorted({pid for pid in product_ids if pid})
+    if not ids:
+        return {}
+    await session.execute(
+        pg_insert(Inventory)
+        .values([{"product_id": pid, "warehouse_id": warehouse_id, "current_stock": 0, "loose_units": 0} for pid in ids])
+        .on_conflict_do_nothing(index_elements=[Inventory.product_id, Inventory.warehouse_id])
+    )
+    stmt = (
+        sa.select(Inventory)
+        .where(Inventory.product_id.in_(ids), Inventory.warehouse_id == warehouse_id)
+        .order_by(Inventory.product_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    with metrics.time_stock_lock("inventory_bulk"):
+        rows = (await session.execute(stmt)).scalars().all()
+    return {inv.product_id: inv for inv in rows}
+
+
+async def log_inventory_bulk(
+    session: AsyncSession, changes: list[tuple[str, int]], ref_type: str, ref_id: str, warehouse_id: str = "default"
+):
+    if not changes:
+        return
+    await session.execute(
+        sa.insert(InventoryLog),
+        [
+            {
+                "product_id": pid,
+                "warehouse_id": warehouse_id,
+                "change_qty": qty,
+                "type": "auto",
+                "ref_type": ref_type,
+                "ref_id": ref_id,
+            }
+            for pid, qty in changes
+        ],
+    )
 
 
-async def log_inventory(session: AsyncSession, product_id: str, qty: int, ref_type: str, ref_id: str, warehouse_id: str = "default"):
-    log = InventoryLog(
-        product_id=product_id,
-        warehouse_id=warehouse_id,
-        change_qty=qty,
-        type="auto",
-        ref_type=ref_type,
-        ref_id=ref_id,
+async def add_sales_daily(session: AsyncSession, rows: list[tuple[str, date, int, float]]):
+    # (商品, 日期, 数量, 金额) 合并后一次 upsert 累加到日汇总；按主键顺序写入，避免并发下单互相死锁
+    totals: dict[tuple[str, date], list[float]] = {}
+    for pid, day, qty, amount in rows:
+        total = totals.setdefault((pid, day), [0, 0.0])
+        total[0] += qty
+        total[1] += amount
+    if not totals:
+        return
+    values = [
+        {"product_id": pid, "day": day, "quantity": q, "amount": a} for (pid, day), (q, a) in sorted(totals.items())
+    ]
+    for start in range(0, len(values), UPSERT_CHUNK):
+        stmt = pg_insert(SalesDaily).values(values[start : start + UPSERT_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SalesDaily.product_id, SalesDaily.day],
+            set_={
+                "quantity": SalesDaily.quantity + stmt.excluded.quantity,
+                "amount": SalesDaily.amount + stmt.excluded.amount,
+            },
+        )
+        await session.execute(stmt)
+    # 离线单可能补记到已结束的日期，通知预测缓存重读这些天
+    earliest = min(day for _, day in totals)
+    if earliest < datetime.utcnow().date():
+        from app.services import forecast
+
+        forecast.cache.mark_dirty(earliest)
+
+
+async def rebuild_sales_daily(session: AsyncSession, since: date | None = None) -> int:
+    # 从 sales_item 重算日汇总（迁移回填、手工修数后使用）；since 为空时全部重算
+    day = sa.cast(SalesItem.created_at, sa.Date)
+    delete_stmt = sa.delete(SalesDaily)
+    select_stmt = sa.select(
+        SalesItem.product_id,
+        day,
+        sa.func.sum(SalesItem.quantity),
+        sa.func.sum(SalesItem.quantity * SalesItem.actual_sale_price),
+    ).group_by(SalesItem.product_id, day)
+    if since:
+        delete_stmt = delete_stmt.where(SalesDaily.day >= since)
+        select_stmt = select_stmt.where(SalesItem.created_at >= datetime.combine(since, time.min))
+    await session.execute(delete_stmt)
+    result = await session.execute(
+        sa.insert(SalesDaily).from_select(["product_id", "day", "quantity", "amount"], select_stmt)
     )
-    session.add(log)
-    await session.flush()
+    from app.services import forecast
+
+    forecast.cache.mark_dirty(since)
+    return result.rowcount
 
 
-async def create_sales_order(session: AsyncSession, payloads: List[schemas.SalesItemPayload], username: str) -> SalesOrder:
+async def create_sales_order(repo: "Repository", payloads: List[schemas.SalesItemPayload], username: str) -> SalesOrder:
     items: list[SalesItem] = []
     total_actual = 0.0
+    # 商品与库存行都按 id 顺序加锁，避免并发死锁
+    products = await repo.get_products([p.product_id for p in payloads], for_update=True)
     for payload in payloads:
-        product = await get_product_with_lock(session, payload.product_id)
-        if not product:
+        if payload.product_id not in products:
             raise ValueError(f"product {payload.product_id} not found")
-        price_info = await calculate_price_for_product(session, product)
+    prices = pricing.price_products(products.values(), await repo.load_pricing_context(list(products.values())))
+    inventory = await repo.lock_inventory(list(products))
+    changes: list[tuple[str, int]] = []
+    for payload in payloads:
+        product = products[payload.product_id]
+        price_info = prices[product.id]
         total_actual += payload.actual_price * payload.quantity
         sales_item = SalesItem(
             product_id=payload.product_id,
@@ -383,24 +751,203 @@ async def create_sales_order(session: AsyncSession, payloads: List[schemas.Sales
         items.append(sales_item)
 
         # deduct inventory
-        inv = await get_inventory_record(session, payload.product_id, create_if_missing=True)
-        apply_unit_delta(inv, product, -payload.quantity)
-        await log_inventory(session, payload.product_id, -payload.quantity, "sales", ref_id="auto")
+        apply_unit_delta(inventory[product.id], product, -payload.quantity)
+        changes.append((product.id, -payload.quantity))
 
     order = SalesOrder(total_actual_amount=total_actual, created_by=username)
     order.items = items
-    session.add(order)
-    await session.flush()
+    await repo.add_sales_order(order)
+    await repo.add_inventory_logs(changes, "sales", ref_id="auto")
+    await repo.add_sales_daily(
+        [(i.product_id, i.created_at.date(), i.quantity, i.actual_sale_price * i.quantity) for i in items]
+    )
     return order
 
 
-async def adjust_inventory(session: AsyncSession, req: schemas.InventoryAdjustRequest, username: str) -> Inventory:
-    product = await session.get(Product, req.product_id)
+def normalize_client_time(value: datetime | None, now: datetime) -> datetime:
+    if value is None:
+        return now
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    # 客户端时钟可能超前或严重滞后：不允许落在未来，也不早于回溯下限
+    return min(max(value, now - timedelta(days=MAX_CLIENT_BACKDATE_DAYS)), now)
+
+
+async def create_sales_orders_batch(
+    session: AsyncSession, orders: List[schemas.OfflineSalesOrder], username: str, ttl_seconds: int
+) -> list[schemas.SalesBatchResult]:
+    now = datetime.utcnow()
+    results: dict[str, schemas.SalesBatchResult] = {}
+    pending: list[schemas.OfflineSalesOrder] = []
+    seen: set[str] = set()
+    for order in orders:
+        if order.client_id not in seen:
+            seen.add(order.client_id)
+            pending.append(order)
+
+    # 已上传过的离线单直接返回原结果
+    if pending:
+        stmt = sa.select(IdempotencyKey.key, IdempotencyKey.order_id).where(
+            IdempotencyKey.key.in_([o.client_id for o in pending]),
+            IdempotencyKey.expires_at > now,
+            IdempotencyKey.order_id.is_not(None),
+        )
+        for key, order_id in (await session.execute(stmt)).all():
+            results[key] = schemas.SalesBatchResult(client_id=key, status="duplicate", order_id=order_id)
+        pending = [o for o in pending if o.client_id not in results]
+
+    product_ids = {item.product_id for o in pending for item in o.items}
+    products: dict[str, Product] = {}
+    if product_ids:
+        rows = (await session.execute(sa.select(Product).where(Product.id.in_(product_ids)))).scalars().all()
+        products = {p.id: p for p in rows}
+
+    valid: list[schemas.OfflineSalesOrder] = []
+    for order in pending:
+        error = None
+        if not order.items:
+            error = "empty order"
+        for item in order.items:
+            if item.product_id not in products:
+                error = f"product {item.product_id} not found"
+                break
+            if item.quantity <= 0:
+                error = f"invalid quantity for {item.product_id}"
+                break
+        if error:
+            results[order.client_id] = schemas.SalesBatchResult(client_id=order.client_id, status="error", error=error)
+        else:
+            valid.append(order)
+
+    if valid:
+        stmt = pg_insert(IdempotencyKey).values(
+            [{"key": o.client_id, "created_at": now, "expires_at": now + timedelta(seconds=ttl_seconds)} for o in valid]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.key],
+            set_={"order_id": None, "created_at": stmt.excluded.created_at, "expires_at": stmt.excluded.expires_at},
+            where=IdempotencyKey.expires_at <= now,
+        ).returning(IdempotencyKey.key)
+        claimed = {row[0] for row in (await session.execute(stmt)).all()}
+        # 未占到的键已被并发请求处理（插入冲突会等待对方提交），返回其订单号供客户端对账
+        taken = [o.client_id for o in valid if o.client_id not in claimed]
+        if taken:
+            rows = await session.execute(
+                sa.select(IdempotencyKey.key, IdempotencyKey.order_id).where(IdempotencyKey.key.in_(taken))
+            )
+            bound = dict(rows.all())
+            for key in taken:
+                results[key] = schemas.SalesBatchResult(client_id=key, status="duplicate", order_id=bound.get(key))
+        valid = [o for o in valid if o.client_id in claimed]
+
+    if valid:
+        prices = await calculate_prices_bulk(session, [products[pid] for pid in {i.product_id for o in valid for i in o.items}])
+        inventories = await lock_inventory_records(session, [i.product_id for o in valid for i in o.items])
+        order_rows: list[dict[str, Any]] = []
+        item_rows: list[dict[str, Any]] = []
+        log_changes: list[tuple[str, int]] = []
+        key_rows: list[dict[str, Any]] = []
+        for order in sorted(valid, key=lambda o: normalize_client_time(o.created_at, now)):
+            order_id = gen_uuid()
+            created_at = normalize_client_time(order.created_at, now)
+            total_actual = 0.0
+            for item in order.items:
+                product = products[item.product_id]
+                total_actual += item.actual_price * item.quantity
+                item_rows.append(
+                    {
+                        "id": gen_uuid(),
+                        "order_id": order_id,
+                        "product_id": item.product_id,
+                        "quantity": item.quantity,
+                        "snapshot_cost": product.base_cost_price,
+                        "snapshot_standard_price": prices[item.product_id].price,
+                        "actual_sale_price": item.actual_price,
+                        "created_at": created_at,
+                    }
+                )
+                apply_unit_delta(inventories[item.product_id], product, -item.quantity)
+                log_changes.append((item.product_id, -item.quantity))
+            order_rows.append(
+                {"id": order_id, "order_date": created_at, "total_actual_amount": total_actual, "created_by": username}
+            )
+            key_rows.append({"key": order.client_id, "order_id": order_id})
+            results[order.client_id] = schemas.SalesBatchResult(client_id=order.client_id, status="created", order_id=order_id)
+
+        await session.execute(sa.insert(SalesOrder), order_rows)
+        await session.execute(sa.insert(SalesItem), item_rows)
+        await log_inventory_bulk(session, log_changes, "sales", ref_id="batch")
+        await add_sales_daily(
+            session,
+            [
+                (r["product_id"], r["created_at"].date(), r["quantity"], r["actual_sale_price"] * r["quantity"])
+                for r in item_rows
+            ],
+        )
+        await session.execute(sa.update(IdempotencyKey), key_rows)
+        await session.flush()
+
+    return [results[o.client_id] for o in orders]
+
+
+async def get_sales_order_by_idempotency_key(session: AsyncSession, key: str) -> SalesOrder | None:
+    stmt = (
+        sa.select(SalesOrder)
+        .join(IdempotencyKey, IdempotencyKey.order_id == SalesOrder.id)
+        .where(IdempotencyKey.key == key, IdempotencyKey.expires_at > datetime.utcnow())
+        .options(selectinload(SalesOrder.items))
+    )
+    return (await session.execute(stmt)).scalars().first()
+
+
+async def claim_idempotency_key(session: AsyncSession, key: str, ttl_seconds: int) -> bool:
+    # 主键冲突时并发的同键事务会阻塞到前者提交；已过期的键允许被重新占用
+    now = datetime.utcnow()
+    stmt = pg_insert(IdempotencyKey).values(key=key, created_at=now, expires_at=now + timedelta(seconds=ttl_seconds))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.key],
+        set_={"order_id": None, "created_at": stmt.excluded.created_at, "expires_at": stmt.excluded.expires_at},
+        where=IdempotencyKey.expires_at <= now,
+    ).returning(IdempotencyKey.key)
+    return (await session.execute(stmt)).first() is not None
+
+
+async def bind_idempotency_key(session: AsyncSession, key: str, order_id: str):
+    await session.execute(sa.update(IdempotencyKey).where(IdempotencyKey.key == key).values(order_id=order_id))
+
+
+async def purge_expired_idempotency_keys(session: AsyncSession) -> int:
+    result = await session.execute(sa.delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow()))
+    return result.rowcount or 0
+
+
+async def adjust_inventory(
+    repo: "Repository", req: schemas.InventoryAdjustRequest, username: str, expected_version: int | None = None
+) -> Inventory:
+    product = (await repo.get_products([req.product_id])).get(req.product_id)
     if not product:
         raise ValueError("product not found")
-    inv = await get_inventory_record(session, req.product_id, create_if_missing=True)
-    apply_unit_delta(inv, product, req.delta)
-    await log_inventory(session, req.product_id, req.delta, "adjust", ref_id=username)
+    # 无竞争时：读取后按读到的版本条件更新，不加行锁；被并发修改则重读重试
+    inv = None
+    for _ in range(OPTIMISTIC_RETRIES):
+        current = await repo.get_inventory(req.product_id)
+        if current is None:
+            break
+        if expected_version is not None and current.version != expected_version:
+            raise VersionConflict("inventory was modified by another request")
+        stock, loose = split_units(current.current_stock, current.loose_units, product, req.delta)
+        inv = await repo.update_inventory(req.product_id, stock, loose, current.version)
+        if inv is not None:
+            break
+        if expected_version is not None:
+            raise VersionConflict("inventory was modified by another request")
+    if inv is None:
+        # 库存行不存在或持续冲突：退回行锁
+        inv = (await repo.lock_inventory([req.product_id]))[req.product_id]
+        if expected_version is not None and inv.version != expected_version:
+            raise VersionConflict("inventory was modified by another request")
+        apply_unit_delta(inv, product, req.delta)
+    await repo.add_inventory_logs([(req.product_id, req.delta)], "adjust", ref_id=username)
     return inv
 
 
@@ -416,6 +963,7 @@ async def receive_purchase(session: AsyncSession, po_id: str, items: List[schema
         raise ValueError("purchase order not found")
 
     item_map = {i.product_id: i for i in order.items}
+    deltas: dict[str, int] = {}
     for update in items:
         target = item_map.get(update.product_id)
         if not target:
@@ -423,11 +971,22 @@ async def receive_purchase(session: AsyncSession, po_id: str, items: List[schema
         previous_received = target.received_qty or 0
         target.received_qty = update.received_qty
         target.actual_cost = update.actual_cost or target.expected_cost
-        inv = await get_inventory_record(session, update.product_id, create_if_missing=True)
         delta = max(0, update.received_qty - previous_received)
         if delta:
-            inv.current_stock += delta
-            await log_inventory(session, update.product_id, delta, "purchase", ref_id=order.id)
+            deltas[update.product_id] = deltas.get(update.product_id, 0) + delta
+
+    if deltas:
+        # 到货数量按箱计，换算成最小单位后与销售扣减走同一套 apply_unit_delta
+        products = (await session.execute(sa.select(Product).where(Product.id.in_(list(deltas))))).scalars().all()
+        product_map = {p.id: p for p in products}
+        inventories = await lock_inventory_records(session, list(deltas))
+        for pid, delta in deltas.items():
+            product = product_map.get(pid)
+            inv = inventories.get(pid)
+            if not product or not inv:
+                continue
+            apply_unit_delta(inv, product, int(round(delta * parse_spec_qty(product.spec))))
+        await log_inventory_bulk(session, list(deltas.items()), "purchase", ref_id=order.id)
 
     if all(i.received_qty >= i.quantity for i in order.items):
         order.status = "完成"
@@ -439,6 +998,74 @@ async def receive_purchase(session: AsyncSession, po_id: str, items: List[schema
     return order
 
 
+async def list_purchase_orders(
+    session: AsyncSession,
+    statuses: list[str] | None = None,
+    supplier: str | None = None,
+    expected_from: date | None = None,
+    expected_to: date | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+    include_items: bool = False,
+) -> tuple[list[schemas.PurchaseOrderSummary], str | None]:
+    stmt = sa.select(PurchaseOrder)
+    if statuses:
+        stmt = stmt.where(PurchaseOrder.status.in_(statuses))
+    if supplier:
+        stmt = stmt.where(PurchaseOrder.supplier == supplier)
+    if expected_from:
+        stmt = stmt.where(PurchaseOrder.expected_date >= expected_from)
+    if expected_to:
+        stmt = stmt.where(PurchaseOrder.expected_date <= expected_to)
+    if cursor:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        stmt = stmt.where(sa.tuple_(PurchaseOrder.created_at, PurchaseOrder.id) < sa.tuple_(cursor_ts, cursor_id))
+    stmt = stmt.order_by(PurchaseOrder.created_at.desc(), PurchaseOrder.id.desc()).limit(limit + 1)
+    if include_items:
+        stmt = stmt.options(selectinload(PurchaseOrder.items))
+    orders = (await session.execute(stmt)).scalars().all()
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    if not orders:
+        return [], None
+
+    # 行数与到货进度在 SQL 中聚合，只针对当前页
+    agg_stmt = (
+        sa.select(
+            PurchaseItem.purchase_order_id,
+            sa.func.count(PurchaseItem.id),
+            sa.func.coalesce(sa.func.sum(PurchaseItem.quantity), 0),
+            sa.func.coalesce(sa.func.sum(PurchaseItem.received_qty), 0),
+        )
+        .where(PurchaseItem.purchase_order_id.in_([o.id for o in orders]))
+        .group_by(PurchaseItem.purchase_order_id)
+    )
+    agg_map = {oid: (int(cnt), int(qty), int(received)) for oid, cnt, qty, received in (await session.execute(agg_stmt)).all()}
+
+    result: list[schemas.PurchaseOrderSummary] = []
+    for order in orders:
+        line_count, total_qty, received_qty = agg_map.get(order.id, (0, 0, 0))
+        result.append(
+            schemas.PurchaseOrderSummary(
+                id=order.id,
+                status=order.status,
+                supplier=order.supplier,
+                expected_date=order.expected_date,
+                remark=order.remark,
+                created_by=order.created_by,
+                created_at=order.created_at,
+                line_count=line_count,
+                total_qty=total_qty,
+                received_qty=received_qty,
+                progress=round(received_qty / total_qty, 4) if total_qty else 0,
+                items=[schemas.PurchaseItem.model_validate(i) for i in order.items] if include_items else None,
+            )
+        )
+    last = orders[-1]
+    next_cursor = encode_cursor(last.created_at, last.id) if has_more else None
+    return result, next_cursor
+
+
 async def create_purchase_order(session: AsyncSession, po: schemas.PurchaseOrder) -> PurchaseOrder:
     order = PurchaseOrder(
         id=po.id or None,
@@ -463,16 +1090,89 @@ async def create_purchase_order(session: AsyncSession, po: schemas.PurchaseOrder
     return order
 
 
-async def dashboard_realtime(session: AsyncSession) -> Tuple[float, float, float, float, float, int, float, float | None]:
-    from datetime import datetime, timezone
+def day_range(day: date) -> tuple[datetime, datetime]:
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
 
-    today = datetime.utcnow().date()
-    stmt = sa.select(SalesItem).where(sa.func.date(SalesItem.created_at) == today)
-    items = (await session.execute(stmt)).scalars().all()
-    orders = len(items)
-    actual = sum(item.actual_sale_price * item.quantity for item in items)
-    expected = sum(item.snapshot_standard_price * item.quantity for item in items)
-    cost = sum(item.snapshot_cost * item.quantity for item in items)
+
+async def list_sales_orders(
+    session: AsyncSession,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    created_by: str | None = None,
+    product_id: str | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+) -> tuple[list[schemas.SalesOrderSummary], str | None]:
+    stmt = sa.select(SalesOrder.id, SalesOrder.order_date, SalesOrder.created_by, SalesOrder.total_actual_amount)
+    if date_from:
+        stmt = stmt.where(SalesOrder.order_date >= day_range(date_from)[0])
+    if date_to:
+        stmt = stmt.where(SalesOrder.order_date < day_range(date_to)[1])
+    if created_by:
+        stmt = stmt.where(SalesOrder.created_by == created_by)
+    if product_id:
+        stmt = stmt.where(
+            sa.exists().where(SalesItem.order_id == SalesOrder.id, SalesItem.product_id == product_id)
+        )
+    if cursor:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        stmt = stmt.where(sa.tuple_(SalesOrder.order_date, SalesOrder.id) < sa.tuple_(cursor_ts, cursor_id))
+    stmt = stmt.order_by(SalesOrder.order_date.desc(), SalesOrder.id.desc()).limit(limit + 1)
+    rows = (await session.execute(stmt)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], None
+
+    agg_stmt = (
+        sa.select(
+            SalesItem.order_id,
+            sa.func.count(SalesItem.id),
+            sa.func.coalesce(sa.func.sum(SalesItem.quantity), 0),
+            sa.func.coalesce(sa.func.sum(SalesItem.snapshot_standard_price * SalesItem.quantity), 0),
+            sa.func.coalesce(sa.func.sum(SalesItem.actual_sale_price * SalesItem.quantity), 0),
+            sa.func.coalesce(sa.func.sum(SalesItem.snapshot_cost * SalesItem.quantity), 0),
+        )
+        .where(SalesItem.order_id.in_([r.id for r in rows]))
+        .group_by(SalesItem.order_id)
+    )
+    agg_map = {row[0]: row[1:] for row in (await session.execute(agg_stmt)).all()}
+
+    result: list[schemas.SalesOrderSummary] = []
+    for row in rows:
+        item_count, qty, expected, actual, cost = agg_map.get(row.id, (0, 0, 0, 0, 0))
+        gross_profit = float(actual) - float(cost)
+        result.append(
+            schemas.SalesOrderSummary(
+                id=row.id,
+                order_date=row.order_date,
+                created_by=row.created_by,
+                total_actual_amount=round2(row.total_actual_amount or 0),
+                item_count=int(item_count),
+                total_qty=int(qty),
+                expected_amount=round2(float(expected)),
+                cost_amount=round2(float(cost)),
+                gross_profit=round2(gross_profit),
+                gross_margin=round2(gross_profit / float(actual) * 100) if actual else 0,
+            )
+        )
+    last = rows[-1]
+    next_cursor = encode_cursor(last.order_date, last.id) if has_more else None
+    return result, next_cursor
+
+
+async def dashboard_realtime(session: AsyncSession) -> Tuple[float, float, float, float, float, int, float, float | None]:
+    start, end = day_range(datetime.utcnow().date())
+    stmt = sa.select(
+        sa.func.count(SalesItem.id),
+        sa.func.coalesce(sa.func.sum(SalesItem.actual_sale_price * SalesItem.quantity), 0),
+        sa.func.coalesce(sa.func.sum(SalesItem.snapshot_standard_price * SalesItem.quantity), 0),
+        sa.func.coalesce(sa.func.sum(SalesItem.snapshot_cost * SalesItem.quantity), 0),
+    ).where(SalesItem.created_at >= start, SalesItem.created_at < end)
+    orders, actual, expected, cost = (await session.execute(stmt)).one()
+    orders = int(orders)
+    actual, expected, cost = float(actual), float(expected), float(cost)
     gross_profit = actual - cost
     avg_ticket = actual / orders if orders else 0
     receipt_diff = actual - expected
@@ -484,6 +1184,22 @@ async def dashboard_realtime(session: AsyncSession) -> Tuple[float, float, float
     return actual_display, expected, receipt_diff_display, diff_rate_display, gross_profit, orders, avg_ticket, manual
 
 
+async def build_dashboard_realtime(session: AsyncSession) -> schemas.DashboardRealtime:
+    actual, expected, diff, diff_rate, gp, orders, avg, manual = await dashboard_realtime(session)
+    gross_margin = (gp / actual * 100) if actual else 0
+    return schemas.DashboardRealtime(
+        actual_sales=round(actual, 2),
+        expected_sales=round(expected, 2),
+        receipt_diff=round(diff, 2),
+        receipt_diff_rate=round(diff_rate, 2),
+        gross_profit=round(gp, 2),
+        orders=orders,
+        avg_ticket=round(avg, 2),
+        gross_margin=round(gross_margin, 2),
+        manual_receipt=manual,
+    )
+
+
 async def get_manual_receipt(session: AsyncSession) -> float | None:
     today = datetime.utcnow().date()
     rec = (await session.execute(sa.select(DailyReceipt).where(DailyReceipt.date == today))).scalars().first()
@@ -505,16 +1221,21 @@ async def set_manual_receipt(session: AsyncSession, value: float):
 async def dashboard_inventory_value(session: AsyncSession) -> Tuple[float, float]:
     cost_total = 0.0
     retail_total = 0.0
-    inv_rows = (await session.execute(sa.select(Inventory))).scalars().all()
-    for inv in inv_rows:
-        product = await session.get(Product, inv.product_id)
-        if not product:
-            continue
-        price_info = await calculate_price_for_product(session, product)
-        spec_qty = parse_spec_qty(product.spec)
-        total_units = inv.current_stock * spec_qty + (inv.loose_units or 0)
+    rows = (
+        await session.execute(
+            sa.select(Product, sa.func.sum(Inventory.current_stock), sa.func.sum(Inventory.loose_units))
+            .join(Inventory, Inventory.product_id == Product.id)
+            .group_by(Product.id)
+        )
+    ).all()
+    links: dict[str, list[str]] = {}
+    for pid, cid in (await session.execute(sa.select(ProductCategory.product_id, ProductCategory.category_id))).all():
+        links.setdefault(pid, []).append(cid)
+    ctx = await load_pricing_context(session, [row[0] for row in rows], links)
+    for product, boxes, loose in rows:
+        total_units = int(boxes or 0) * parse_spec_qty(product.spec) + int(loose or 0)
         cost_total += product.base_cost_price * total_units
-        retail_total += price_info.price * total_units
+        retail_total += pricing.price_product(product, ctx).price * total_units
     return cost_total, retail_total
 
 
@@ -538,12 +1259,43 @@ async def total_receipts(session: AsyncSession) -> float:
     return float(total or 0)
 
 
-def round2(value: float) -> float:
-    return round(value + 1e-9, 2)
+async def load_pricing_context(
+    session: AsyncSession, products: list[Product], links: dict[str, list[str]] | None = None
+) -> pricing.PricingContext:
+    # 一次预取一批商品定价所需的分类系数、自定义分类关联与全局系数；已查过关联时可直接传入 links
+    if links is None:
+        links = {}
+        product_ids = [p.id for p in products]
+        if product_ids:
+            link_rows = (
+                await session.execute(
+                    sa.select(ProductCategory.product_id, ProductCategory.category_id).where(
+                        ProductCategory.product_id.in_(product_ids)
+                    )
+                )
+            ).all()
+            for pid, cid in link_rows:
+                links.setdefault(pid, []).append(cid)
+    category_ids = {p.category_id for p in products if p.category_id}
+    for cids in links.values():
+        category_ids.update(cids)
+    categories: list[Any] = []
+    if category_ids:
+        categories = (
+            await session.execute(sa.select(Category.id, Category.retail_multiplier).where(Category.id.in_(category_ids)))
+        ).all()
+    return pricing.build_context(categories, await get_global_multiplier(session), links)
+
+
+async def calculate_prices_bulk(session: AsyncSession, products: list[Product]) -> dict[str, pricing.PriceResult]:
+    if not products:
+        return {}
+    ctx = await load_pricing_context(session, products)
+    return pricing.price_products(products, ctx)
 
 
 async def list_products_with_inventory(
-    session: AsyncSession,
+    repo: "Repository",
     offset: int = 0,
     limit: int = 50,
     category_id: str | None = None,
@@ -551,8 +1303,8 @@ async def list_products_with_inventory(
     custom_category_ids: list[str] | None = None,
     merchant_category_ids: list[str] | None = None,
     keyword: str | None = None,
-) -> tuple[list[schemas.ProductListItem], int, str]:
-    where_clause = []
+) -> tuple[list[dict[str, Any]], int, str]:
+    # 返回与 schemas.ProductListItem 字段顺序、类型一致的 dict，由路由直接序列化（见 serialization.py）
     custom_ids = set([c for c in (custom_category_ids or []) if c])
     if category_ids:
         custom_ids.update([c for c in category_ids if c])
@@ -560,71 +1312,14 @@ async def list_products_with_inventory(
     if category_id:
         merchant_ids.add(category_id)
 
-    if merchant_ids:
-        if "__uncategorized__" in merchant_ids:
-            where_clause.append(
-                sa.or_(Product.category_id.is_(None), Product.category_id.in_([m for m in merchant_ids if m != "__uncategorized__"]))
-            )
-        else:
-            where_clause.append(Product.category_id.in_(list(merchant_ids)))
-    if custom_ids:
-        subq = sa.select(ProductCategory.product_id).where(ProductCategory.category_id.in_(list(custom_ids)))
-        where_clause.append(Product.id.in_(subq))
-    if keyword:
-        like = f"%{keyword}%"
-        where_clause.append(Product.name.ilike(like))
-
-    count_stmt = sa.select(sa.func.count()).select_from(Product)
-    if where_clause:
-        count_stmt = count_stmt.where(*where_clause)
-    total = (await session.execute(count_stmt)).scalar_one()
-
-    stmt = sa.select(Product)
-    if where_clause:
-        stmt = stmt.where(*where_clause)
-    stmt = stmt.offset(offset).limit(limit)
-    products = (await session.execute(stmt)).scalars().all()
+    products, total = await repo.search_products(merchant_ids, custom_ids, keyword, offset, limit)
     if not products:
         return [], 0, "empty"
 
-    product_ids = [p.id for p in products]
-
-    # 并行获取库存与分类关联
-    inv_stmt = (
-        sa.select(Inventory.product_id, sa.func.sum(Inventory.current_stock), sa.func.sum(Inventory.loose_units))
-        .where(Inventory.product_id.in_(product_ids))
-        .group_by(Inventory.product_id)
-    )
-    pc_stmt = sa.select(ProductCategory.product_id, ProductCategory.category_id).where(
-        ProductCategory.product_id.in_(product_ids)
-    )
-    inv_rows, pc_rows = await asyncio.gather(
-        session.execute(inv_stmt),
-        session.execute(pc_stmt),
-    )
+    inventory_map, product_to_category_ids, category_map = await repo.load_product_details(products)
 
-    inventory_map: dict[str, int] = {}
-    for pid, box_qty, loose_qty in inv_rows.all():
-        inventory_map[pid] = (int(box_qty or 0), int(loose_qty or 0))
-
-    product_to_category_ids: dict[str, list[str]] = {}
-    for pid, cid in pc_rows.all():
-        product_to_category_ids.setdefault(pid, []).append(cid)
-
-    # 收集需要的分类 ID
-    category_ids_needed = set()
-    for p in products:
-        if p.category_id:
-            category_ids_needed.add(p.category_id)
-        for cid in product_to_category_ids.get(p.id, []):
-            category_ids_needed.add(cid)
-    category_map: dict[str, Category] = {}
-    if category_ids_needed:
-        cats = (await session.execute(sa.select(Category).where(Category.id.in_(category_ids_needed)))).scalars().all()
-        category_map = {c.id: c for c in cats}
-
-    result: list[schemas.ProductListItem] = []
-    global_multiplier = await get_global_multiplier(session)
+    result: list[dict[str, Any]] = []
+    ctx = pricing.build_context(category_map.values(), await repo.get_global_multiplier(), product_to_category_ids)
     max_ts = None
     for product in products:
         spec_clean = normalize_spec(product.spec)
@@ -632,29 +1327,7 @@ async def list_products_with_inventory(
         total_units = box_qty * parse_spec_qty(product.spec) + loose_qty
         stock = total_units
         # 价格计算纯内存
-        if product.fixed_retail_price is not None and product.fixed_retail_price > 0:
-            price_val = product.fixed_retail_price
-            basis = "例外价"
-        elif product.retail_multiplier:
-            price_val = round2(product.base_cost_price * product.retail_multiplier)
-            basis = "商品系数"
-        else:
-            multipliers: list[float] = []
-            if product.category_id:
-                cat = category_map.get(product.category_id)
-                if cat and cat.retail_multiplier:
-                    multipliers.append(cat.retail_multiplier)
-            for cid in product_to_category_ids.get(product.id, []):
-                cat = category_map.get(cid)
-                if cat and cat.retail_multiplier:
-                    multipliers.append(cat.retail_multiplier)
-            if multipliers:
-                chosen = max(multipliers)
-                price_val = round2(product.base_cost_price * chosen)
-                basis = "分类系数"
-            else:
-                price_val = round2(product.base_cost_price * global_multiplier)
-                basis = "全局系数"
+        price_val, basis = pricing.price_product(product, ctx)
 
         retail_total = price_val * total_units
         cost_total = product.base_cost_price * total_units
@@ -675,20 +1348,20 @@ async def list_products_with_inventory(
             if cat.id not in category_ids:
                 category_ids.append(cat.id)
         result.append(
-            schemas.ProductListItem(
-                id=product.id,
-                name=product.name,
-                spec=spec_clean,
-                category_name="、".join([n for n in category_names if n]) or category_name,
-                category_ids=category_ids,
-                base_cost_price=product.base_cost_price,
-                standard_price=price_val,
-                price_basis=basis,
-                stock=stock,
-                retail_total=round2(retail_total),
-                cost_total=round2(cost_total),
-                effect_url=product.effect_url,
-            )
+            {
+                "id": product.id,
+                "name": product.name,
+                "spec": spec_clean,
+                "category_name": "、".join([n for n in category_names if n]) or category_name,
+                "category_ids": category_ids,
+                "base_cost_price": float(product.base_cost_price),
+                "standard_price": float(price_val),
+                "price_basis": basis,
+                "stock": int(stock),
+                "retail_total": float(round2(retail_total)),
+                "cost_total": float(round2(cost_total)),
+                "effect_url": product.effect_url,
+            }
         )
         if product.updated_at:
             max_ts = max(max_ts or product.updated_at, product.updated_at)
@@ -696,42 +1369,47 @@ async def list_products_with_inventory(
     return result, total, version
 
 
-async def inventory_overview(session: AsyncSession, with_version: bool = False) -> tuple[list[schemas.InventoryOverviewItem], str] | list[schemas.InventoryOverviewItem]:
-    inv_rows = (await session.execute(sa.select(Inventory))).scalars().all()
-    items: list[schemas.InventoryOverviewItem] = []
+async def inventory_overview(session: AsyncSession, with_version: bool = False) -> tuple[list[dict[str, Any]], str] | list[dict[str, Any]]:
+    # 一次联表取出，行直接组装为与 schemas.InventoryOverviewItem 一致的 dict
+    stmt = (
+        sa.select(
+            Inventory.current_stock,
+            Inventory.loose_units,
+            Inventory.updated_at,
+            Product.id,
+            Product.name,
+            Product.spec,
+            Product.base_cost_price,
+            Category.name,
+        )
+        .join(Product, Product.id == Inventory.product_id)
+        .outerjoin(Category, Category.id == Product.category_id)
+    )
+    items: list[dict[str, Any]] = []
     max_ts = None
-    for inv in inv_rows:
-        product = await session.get(Product, inv.product_id)
-        if not product:
-            continue
-        spec_qty = parse_spec_qty(product.spec)
-        box_price = product.base_cost_price * spec_qty
-        if spec_qty == 1:
-            box_count = inv.current_stock
-            loose_count = 0
-        else:
-            box_count = inv.current_stock
-            loose_count = inv.loose_units or 0
-        category_name = None
-        if product.category_id:
-            category = await session.get(Category, product.category_id)
-            category_name = category.name if category else None
+    for current_stock, loose_units, updated_at, product_id, name, spec, base_cost_price, category_name in (
+        await session.execute(stmt)
+    ).all():
+        spec_qty = parse_spec_qty(spec)
+        box_price = base_cost_price * spec_qty
+        box_count = current_stock
+        loose_count = 0 if spec_qty == 1 else (loose_units or 0)
         total_units = box_count * spec_qty + loose_count
-        cost_total = product.base_cost_price * total_units
+        cost_total = base_cost_price * total_units
         items.append(
-            schemas.InventoryOverviewItem(
-                product_id=product.id,
-                name=product.name,
-                spec=product.spec,
-                category_name=category_name,
-                base_cost_price=product.base_cost_price,
-                box_price=round2(box_price),
-                box_count=box_count,
-                loose_count=loose_count,
-                cost_total=round2(cost_total),
-            )
+            {
+                "product_id": product_id,
+                "name": name,
+                "spec": spec,
+                "category_name": category_name,
+                "base_cost_price": float(base_cost_price),
+                "box_price": float(round2(box_price)),
+                "box_count": int(box_count),
+                "loose_count": int(loose_count),
+                "cost_total": float(round2(cost_total)),
+            }
         )
-        if inv.updated_at:
-            max_ts = max(max_ts or inv.updated_at, inv.updated_at)
+        if updated_at:
+            max_ts = max(max_ts or updated_at, updated_at)
     version = (max_ts or datetime.utcnow()).isoformat()
     return (items, version) if with_version else items
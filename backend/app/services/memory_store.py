@@ -0,0 +1,378 @@
+"""
+内存存储（`YH_STORAGE=memory`）：不连数据库运行登录、定价、商品列表、下单与库存调整，用于快速测试与容量压测。
+
+- 主表按主键放在 dict 中，另维护 openid、商品名、商家分类、自定义分类的二级索引，查询不做全表扫描；
+- 记录直接使用 ORM 实体（不挂 session），定价与扣库存走 logic/pricing 中与生产相同的函数；
+- MemoryRepository 实现 repository.Repository：写操作在一个全局锁内进行（相当于行锁），
+  rollback 按撤销日志恢复库存与幂等键，commit 时清空日志。
+
+默认载入少量演示数据；`YH_MEMORY_SEED_PRODUCTS=N` 另外生成 N 个合成商品（固定随机种子）。
+"""
+
+import asyncio
+import os
+import random
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable
+
+from app.models.entities import (
+    Category,
+    IdempotencyKey,
+    Inventory,
+    InventoryLog,
+    Product,
+    SalesOrder,
+    User,
+    gen_uuid,
+)
+from app.services import logic, pricing
+
+UNCATEGORIZED = "__uncategorized__"
+SEED_PRODUCTS = int(os.getenv("YH_MEMORY_SEED_PRODUCTS", "0"))
+
+
+class MemoryStore:
+    def __init__(self):
+        self.global_multiplier = logic.DEFAULT_GLOBAL_MULTIPLIER
+        self.categories: dict[str, Category] = {}
+        self.products: dict[str, Product] = {}
+        # 商品 id -> 自定义分类 id 列表
+        self.links: dict[str, list[str]] = {}
+        self.products_by_name: dict[str, set[str]] = {}
+        # 商家分类（Product.category_id，未分类为 None）与自定义分类的反向索引
+        self.products_by_merchant: dict[str | None, set[str]] = {}
+        self.products_by_custom: dict[str, set[str]] = {}
+        # 商品 id -> 仓库 id -> 库存行
+        self.inventory: dict[str, dict[str, Inventory]] = {}
+        self.inventory_logs: list[InventoryLog] = []
+        self.users: dict[str, User] = {}
+        self.users_by_openid: dict[str, User] = {}
+        self.sales_orders: dict[str, SalesOrder] = {}
+        # (商品 id, 日期) -> [数量, 金额]
+        self.sales_daily: dict[tuple[str, date], list[float]] = {}
+        self.idempotency_keys: dict[str, IdempotencyKey] = {}
+        self.lock = asyncio.Lock()
+        self._seq: dict[str, int] = {}
+
+    def add_category(self, category: Category) -> Category:
+        category.id = category.id or gen_uuid()
+        category.is_custom = bool(category.is_custom)
+        category.updated_at = category.updated_at or datetime.utcnow()
+        category.version = category.version or 1
+        self.categories[category.id] = category
+        return category
+
+    def add_product(self, product: Product, custom_category_ids: Iterable[str] = ()) -> Product:
+        product.id = product.id or gen_uuid()
+        product.base_cost_price = product.base_cost_price or 0
+        product.updated_at = product.updated_at or datetime.utcnow()
+        product.version = product.version or 1
+        self.products[product.id] = product
+        self._seq.setdefault(product.id, len(self._seq))
+        self.products_by_name.setdefault(product.name, set()).add(product.id)
+        self.products_by_merchant.setdefault(product.category_id, set()).add(product.id)
+        links = list(dict.fromkeys(c for c in custom_category_ids if c))
+        if links:
+            self.links[product.id] = links
+        for cid in links:
+            self.products_by_custom.setdefault(cid, set()).add(product.id)
+        return product
+
+    def set_stock(self, product_id: str, boxes: int, loose: int = 0, warehouse_id: str = "default") -> Inventory:
+        inv = Inventory(
+            product_id=product_id,
+            warehouse_id=warehouse_id,
+            current_stock=boxes,
+            loose_units=loose,
+            updated_at=datetime.utcnow(),
+            version=1,
+        )
+        self.inventory.setdefault(product_id, {})[warehouse_id] = inv
+        return inv
+
+    def add_user(self, user: User) -> User:
+        user.id = user.id or gen_uuid()
+        self.users[user.id] = user
+        self.users_by_openid[user.openid] = user
+        return user
+
+    def ordered(self, product_ids: Iterable[str]) -> list[str]:
+        return sorted(product_ids, key=self._seq.__getitem__)
+
+
+class MemoryRepository:
+    def __init__(self, store: MemoryStore):
+        self.store = store
+        self._undo: list[Any] = []
+        self._locked = False
+
+    async def _acquire(self):
+        if not self._locked:
+            await self.store.lock.acquire()
+            self._locked = True
+
+    def _release(self):
+        if self._locked:
+            self._locked = False
+            self.store.lock.release()
+
+    async def get_user(self, user_id: str) -> User | None:
+        return self.store.users.get(user_id)
+
+    async def get_user_by_openid(self, openid: str) -> User | None:
+        return self.store.users_by_openid.get(openid)
+
+    async def add_user(self, user: User) -> User:
+        self.store.add_user(user)
+        self._undo.append(lambda: (self.store.users.pop(user.id, None), self.store.users_by_openid.pop(user.openid, None)))
+        return user
+
+    async def get_products(self, product_ids: Iterable[str], for_update: bool = False) -> dict[str, Product]:
+        if for_update:
+            await self._acquire()
+        products = self.store.products
+        return {pid: products[pid] for pid in sorted(set(product_ids)) if pid in products}
+
+    async def get_global_multiplier(self) -> float:
+        return self.store.global_multiplier
+
+    async def search_products(
+        self, merchant_ids: set[str], custom_ids: set[str], keyword: str | None, offset: int, limit: int
+    ) -> tuple[list[Product], int]:
+        store = self.store
+        candidates: set[str] | None = None
+        if merchant_ids:
+            candidates = set()
+            for cid in merchant_ids:
+                candidates |= store.products_by_merchant.get(None if cid == UNCATEGORIZED else cid, set())
+        if custom_ids:
+            linked: set[str] = set()
+            for cid in custom_ids:
+                linked |= store.products_by_custom.get(cid, set())
+            candidates = linked if candidates is None else candidates & linked
+        if keyword:
+            # 按去重后的商品名匹配（ILIKE '%kw%' 语义）
+            kw = keyword.lower()
+            named: set[str] = set()
+            for name, ids in store.products_by_name.items():
+                if kw in name.lower():
+                    named |= ids
+            candidates = named if candidates is None else candidates & named
+        if candidates is None:
+            ids = list(store.products)
+        else:
+            ids = store.ordered(candidates)
+        return [store.products[pid] for pid in ids[offset : offset + limit]], len(ids)
+
+    async def load_product_details(
+        self, products: list[Product]
+    ) -> tuple[dict[str, tuple[int, int]], dict[str, list[str]], dict[str, Category]]:
+        store = self.store
+        product_ids = [p.id for p in products]
+        stock: dict[str, tuple[int, int]] = {}
+        for pid in product_ids:
+            rows = store.inventory.get(pid)
+            if rows:
+                stock[pid] = (
+                    sum(inv.current_stock for inv in rows.values()),
+                    sum(inv.loose_units or 0 for inv in rows.values()),
+                )
+        links = {pid: list(store.links[pid]) for pid in product_ids if pid in store.links}
+        category_ids = {p.category_id for p in products if p.category_id}
+        for cids in links.values():
+            category_ids.update(cids)
+        categories = {cid: store.categories[cid] for cid in category_ids if cid in store.categories}
+        return stock, links, categories
+
+    async def load_pricing_context(self, products: list[Product]) -> pricing.PricingContext:
+        _, links, categories = await self.load_product_details(products)
+        return pricing.build_context(categories.values(), self.store.global_multiplier, links)
+
+    async def get_inventory(self, product_id: str, warehouse_id: str = "default") -> Inventory | None:
+        return self.store.inventory.get(product_id, {}).get(warehouse_id)
+
+    async def lock_inventory(self, product_ids: list[str], warehouse_id: str = "default") -> dict[str, Inventory]:
+        await self._acquire()
+        result: dict[str, Inventory] = {}
+        for pid in sorted({pid for pid in product_ids if pid}):
+            inv = self.store.inventory.get(pid, {}).get(warehouse_id)
+            if inv is None:
+                inv = self.store.set_stock(pid, 0, 0, warehouse_id)
+                self._undo.append(lambda pid=pid: self.store.inventory[pid].pop(warehouse_id, None))
+            else:
+                self._save(inv)
+            result[pid] = inv
+        return result
+
+    async def update_inventory(
+        self, product_id: str, current_stock: int, loose_units: int, expected_version: int, warehouse_id: str = "default"
+    ) -> Inventory | None:
+        inv = self.store.inventory.get(product_id, {}).get(warehouse_id)
+        if inv is None or inv.version != expected_version:
+            return None
+        self._save(inv)
+        inv.current_stock, inv.loose_units = current_stock, loose_units
+        inv.updated_at = datetime.utcnow()
+        inv.version += 1
+        return inv
+
+    def _save(self, inv: Inventory):
+        saved = (inv.current_stock, inv.loose_units, inv.updated_at, inv.version)
+        self._undo.append(lambda: self._restore(inv, saved))
+
+    @staticmethod
+    def _restore(inv: Inventory, saved: tuple[int, int, datetime, int]):
+        inv.current_stock, inv.loose_units, inv.updated_at, inv.version = saved
+
+    async def add_inventory_logs(
+        self, changes: list[tuple[str, int]], ref_type: str, ref_id: str, warehouse_id: str = "default"
+    ):
+        now = datetime.utcnow()
+        logs = self.store.inventory_logs
+        size = len(logs)
+        logs.extend(
+            InventoryLog(
+                id=gen_uuid(),
+                product_id=pid,
+                warehouse_id=warehouse_id,
+                change_date=now,
+                change_qty=qty,
+                type="auto",
+                ref_type=ref_type,
+                ref_id=ref_id,
+            )
+            for pid, qty in changes
+        )
+        self._undo.append(lambda: logs.__delitem__(slice(size, None)))
+
+    async def add_sales_order(self, order: SalesOrder) -> SalesOrder:
+        now = datetime.utcnow()
+        order.id = order.id or gen_uuid()
+        order.order_date = order.order_date or now
+        for item in order.items:
+            item.id = item.id or gen_uuid()
+            item.order_id = order.id
+            item.created_at = item.created_at or order.order_date
+        self.store.sales_orders[order.id] = order
+        self._undo.append(lambda: self.store.sales_orders.pop(order.id, None))
+        return order
+
+    async def add_sales_daily(self, rows: list[tuple[str, date, int, float]]):
+        daily = self.store.sales_daily
+        for pid, day, qty, amount in rows:
+            total = daily.setdefault((pid, day), [0, 0.0])
+            total[0] += qty
+            total[1] += amount
+            self._undo.append(lambda total=total, qty=qty, amount=amount: self._subtract(total, qty, amount))
+
+    @staticmethod
+    def _subtract(total: list[float], qty: int, amount: float):
+        total[0] -= qty
+        total[1] -= amount
+
+    async def get_sales_order_by_idempotency_key(self, key: str) -> SalesOrder | None:
+        record = self.store.idempotency_keys.get(key)
+        if record is None or record.order_id is None or record.expires_at <= datetime.utcnow():
+            return None
+        return self.store.sales_orders.get(record.order_id)
+
+    async def claim_idempotency_key(self, key: str, ttl_seconds: int) -> bool:
+        now = datetime.utcnow()
+        keys = self.store.idempotency_keys
+        previous = keys.get(key)
+        if previous is not None and previous.expires_at > now:
+            return False
+        keys[key] = IdempotencyKey(key=key, created_at=now, expires_at=now + timedelta(seconds=ttl_seconds))
+        self._undo.append(lambda: keys.__setitem__(key, previous) if previous else keys.pop(key, None))
+        return True
+
+    async def bind_idempotency_key(self, key: str, order_id: str):
+        record = self.store.idempotency_keys.get(key)
+        if record is not None:
+            record.order_id = order_id
+
+    async def purge_expired_idempotency_keys(self) -> int:
+        now = datetime.utcnow()
+        keys = self.store.idempotency_keys
+        expired = [k for k, record in keys.items() if record.expires_at <= now]
+        for k in expired:
+            del keys[k]
+        return len(expired)
+
+    async def commit(self):
+        self._undo.clear()
+        self._release()
+
+    async def rollback(self):
+        while self._undo:
+            self._undo.pop()()
+        self._release()
+
+
+def seed_demo(store: MemoryStore):
+    for category in (
+        Category(id="sparkler", name="烟花组合", retail_multiplier=1.8),
+        Category(id="cracker", name="鞭炮", retail_multiplier=1.6),
+        Category(id="toy", name="玩具烟花", retail_multiplier=None),
+        Category(id="festival", name="春节热卖", retail_multiplier=2.0, is_custom=True),
+    ):
+        store.add_category(category)
+    demo = [
+        (Product(id="p1", name="吉祥如意组合", category_id="sparkler", spec="16", base_cost_price=68), ["festival"], 120),
+        (
+            Product(id="p2", name="喜庆连环炮", category_id="cracker", spec="1000", base_cost_price=42, fixed_retail_price=96),
+            [],
+            80,
+        ),
+        (Product(id="p3", name="星河梦幻棒", category_id="toy", spec="10", base_cost_price=12), [], 260),
+    ]
+    for product, links, stock in demo:
+        store.add_product(product, links)
+        store.set_stock(product.id, stock)
+    store.add_user(User(id="u-owner", username="老板", role="owner", openid="owner"))
+
+
+def seed_synthetic(store: MemoryStore, count: int, seed: int = 0):
+    # 少量例外价/商品系数，部分商品挂 1~2 个自定义分类，箱规不为 1 时带散装库存
+    rng = random.Random(seed)
+    merchant = [
+        store.add_category(Category(id=f"mc{i}", name=f"商家分类{i}", retail_multiplier=rng.choice([None, 1.6, 1.8, 2.0])))
+        for i in range(20)
+    ]
+    custom = [
+        store.add_category(
+            Category(id=f"cc{i}", name=f"自定义分类{i}", retail_multiplier=rng.choice([None, 1.7, 2.2]), is_custom=True)
+        )
+        for i in range(10)
+    ]
+    for i in range(count):
+        spec = rng.choice(["1", "6", "12", "24", "36"])
+        cost = round(rng.uniform(5, 400), 2)
+        roll = rng.random()
+        product = Product(
+            id=f"m{i:06d}",
+            name=f"合成商品{i}",
+            category_id=None if rng.random() < 0.05 else rng.choice(merchant).id,
+            spec=spec,
+            base_cost_price=cost,
+            fixed_retail_price=round(cost * 2.1, 2) if roll < 0.05 else None,
+            retail_multiplier=1.9 if 0.05 <= roll < 0.1 else None,
+        )
+        links = [c.id for c in rng.sample(custom, rng.choice([0, 0, 1, 2]))]
+        store.add_product(product, links)
+        spec_qty = int(spec)
+        store.set_stock(product.id, rng.randint(0, 200), rng.randint(0, spec_qty - 1) if spec_qty > 1 else 0)
+
+
+_store: MemoryStore | None = None
+
+
+def get_store() -> MemoryStore:
+    # 首次使用时才建库，SQL 模式下不占内存
+    global _store
+    if _store is None:
+        _store = MemoryStore()
+        seed_demo(_store)
+        if SEED_PRODUCTS:
+            seed_synthetic(_store, SEED_PRODUCTS)
+    return _store
@@ -0,0 +1,146 @@
+"""
+Prometheus 指标（依赖可选的 prometheus-client，未安装时所有埋点为空操作）。
+
+- 多 worker：设置 `PROMETHEUS_MULTIPROC_DIR` 指向一个空目录（每次部署前清空），
+  各 worker 写入共享目录，`GET /metrics` 汇总所有 worker 的数据；
+- `YH_METRICS=0` 可关闭埋点。
+
+指标：
+- `yh_http_request_duration_seconds{method,route,status}`：按路由模板的请求耗时
+- `yh_db_pool_connections{state}`：连接池占用（checked_out / size）
+- `yh_sales_orders_total{source}` / `yh_sales_items_total{source}`：销售单与明细数（rate() 即每秒）
+- `yh_stock_lock_wait_seconds{kind}`：库存/商品行锁等待耗时
+- `yh_cache_requests_total{cache,result}`：缓存命中/未命中
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.responses import Response
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # pragma: no cover - 可选依赖
+    prometheus_client = None
+
+METRICS_ENABLED = prometheus_client is not None and os.getenv("YH_METRICS", "1").lower() not in {"0", "false", "no"}
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LOCK_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class _Noop:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, *args, **kwargs):
+        pass
+
+    def inc(self, *args, **kwargs):
+        pass
+
+    def dec(self, *args, **kwargs):
+        pass
+
+    def set(self, *args, **kwargs):
+        pass
+
+
+if METRICS_ENABLED:
+    REQUEST_LATENCY = prometheus_client.Histogram(
+        "yh_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+    )
+    DB_POOL = prometheus_client.Gauge(
+        "yh_db_pool_connections", "DB pool connections", ["state"], multiprocess_mode="livesum"
+    )
+    SALES_ORDERS = prometheus_client.Counter("yh_sales_orders_total", "Sales orders created", ["source"])
+    SALES_ITEMS = prometheus_client.Counter("yh_sales_items_total", "Sales line items created", ["source"])
+    STOCK_LOCK_WAIT = prometheus_client.Histogram(
+        "yh_stock_lock_wait_seconds", "Time spent acquiring stock row locks", ["kind"], buckets=LOCK_BUCKETS
+    )
+    CACHE_REQUESTS = prometheus_client.Counter("yh_cache_requests_total", "Cache lookups", ["cache", "result"])
+else:
+    REQUEST_LATENCY = DB_POOL = SALES_ORDERS = SALES_ITEMS = STOCK_LOCK_WAIT = _Noop()
+    CACHE_REQUESTS = _Noop()
+
+
+class MetricsMiddleware:
+    # 纯 ASGI 中间件，避免 BaseHTTPMiddleware 的额外任务开销
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # 未匹配的路径统一归类，防止标签基数膨胀
+            route_path = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.labels(scope["method"], route_path, str(status_holder["status"])).observe(
+                time.perf_counter() - started
+            )
+
+
+def instrument_pool(engine: Engine):
+    if not METRICS_ENABLED:
+        return
+    DB_POOL.labels("size").set(getattr(engine.pool, "size", lambda: 0)())
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_conn, conn_record, conn_proxy):
+        DB_POOL.labels("checked_out").inc()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_conn, conn_record):
+        DB_POOL.labels("checked_out").dec()
+
+
+@contextmanager
+def time_stock_lock(kind: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STOCK_LOCK_WAIT.labels(kind).observe(time.perf_counter() - started)
+
+
+def record_sales(orders: int, items: int, source: str = "single"):
+    SALES_ORDERS.labels(source).inc(orders)
+    SALES_ITEMS.labels(source).inc(items)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def mark_process_dead():
+    if METRICS_ENABLED and MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render() -> Response:
+    if not METRICS_ENABLED:
+        return Response("# metrics disabled (prometheus-client not installed or YH_METRICS=0)\n", media_type="text/plain")
+    if MULTIPROCESS:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry), media_type=prometheus_client.CONTENT_TYPE_LATEST)
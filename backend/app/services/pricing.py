@@ -1,6 +1,66 @@
-from typing import Dict
+"""
+标准价定价规则（唯一实现，纯函数、不访问数据库）。
 
-from app.models.schemas import Product, Category, PriceCalcResponse
+优先级：例外价（fixed_retail_price > 0）> 商品系数 > 所属分类系数（商家分类与自定义分类中取最大）> 全局系数。
+调用方先把所需数据预取为 PricingContext（见 logic.load_pricing_context），再对单个商品或一批商品定价；
+repricing 模块的向量化计算遵循同一规则，utils/pricing_check.py 可对比两者。
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Mapping, NamedTuple
+
+from app.models.schemas import Category, PriceCalcResponse, PricingBasis, Product
+
+BASIS_FIXED: PricingBasis = "例外价"
+BASIS_PRODUCT: PricingBasis = "商品系数"
+BASIS_CATEGORY: PricingBasis = "分类系数"
+BASIS_GLOBAL: PricingBasis = "全局系数"
+BASIS_ORDER: tuple[PricingBasis, ...] = (BASIS_FIXED, BASIS_PRODUCT, BASIS_CATEGORY, BASIS_GLOBAL)
+
+
+class PriceResult(NamedTuple):
+    price: float
+    basis: PricingBasis
+
+
+@dataclass
+class PricingContext:
+    global_multiplier: float
+    # 分类 id -> 系数（None 表示未设置）
+    category_multipliers: Dict[str, float | None] = field(default_factory=dict)
+    # 商品 id -> 自定义分类 id 列表
+    links: Dict[str, list[str]] = field(default_factory=dict)
+
+
+def price_product(product: Any, ctx: PricingContext) -> PriceResult:
+    # product 可以是 ORM 实体或 schema，只读取 id/base_cost_price/fixed_retail_price/retail_multiplier/category_id
+    cost = product.base_cost_price or 0
+    if product.fixed_retail_price is not None and product.fixed_retail_price > 0:
+        return PriceResult(product.fixed_retail_price, BASIS_FIXED)
+    if product.retail_multiplier:
+        return PriceResult(round2(cost * product.retail_multiplier), BASIS_PRODUCT)
+    best = None
+    for cid in (product.category_id, *ctx.links.get(product.id, ())):
+        multiplier = ctx.category_multipliers.get(cid) if cid else None
+        if multiplier and (best is None or multiplier > best):
+            best = multiplier
+    if best is not None:
+        return PriceResult(round2(cost * best), BASIS_CATEGORY)
+    return PriceResult(round2(cost * ctx.global_multiplier), BASIS_GLOBAL)
+
+
+def price_products(products: Iterable[Any], ctx: PricingContext) -> Dict[str, PriceResult]:
+    return {p.id: price_product(p, ctx) for p in products}
+
+
+def build_context(
+    categories: Iterable[Any], global_multiplier: float, links: Mapping[str, list[str]] | None = None
+) -> PricingContext:
+    return PricingContext(
+        global_multiplier=global_multiplier,
+        category_multipliers={c.id: c.retail_multiplier for c in categories},
+        links=dict(links or {}),
+    )
 
 
 def calculate_standard_price(
@@ -8,15 +68,9 @@ def calculate_standard_price(
     category_lookup: Dict[str, Category],
     global_multiplier: float,
 ) -> PriceCalcResponse:
-    cost = product.base_cost_price or 0
-    if product.fixed_retail_price is not None:
-        return PriceCalcResponse(price=product.fixed_retail_price, basis="例外价")
-
-    category = category_lookup.get(product.category_id)
-    if category and category.retail_multiplier:
-        return PriceCalcResponse(price=round2(cost * category.retail_multiplier), basis="分类系数")
-
-    return PriceCalcResponse(price=round2(cost * global_multiplier), basis="全局系数")
+    links = {product.id: [c.id for c in product.categories if c.id]} if product.categories else None
+    result = price_product(product, build_context(category_lookup.values(), global_multiplier, links))
+    return PriceCalcResponse(price=result.price, basis=result.basis)
 
 
 def round2(value: float) -> float:
@@ -0,0 +1,159 @@
+"""
+请求级性能剖析（可选开启）：统计每个请求的 SQL 条数、数据库耗时、最慢语句、返回行数与 Python 耗时。
+
+- 设置环境变量 `YH_PROFILING=1` 后，main 会注册引擎事件与中间件；
+- 每个响应附带 `X-Query-Count`、`X-DB-Time-ms`、`Server-Timing` 头；
+- `GET /metrics/requests` 返回按路由聚合的统计及最近的慢语句；
+- 测试辅助：`with assert_max_queries(3): ...` 超出上限时抛 AssertionError，tests/test_query_counts.py 用它们锁定热点列表接口的查询条数。
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+PROFILING_ENABLED = os.getenv("YH_PROFILING", "").lower() in {"1", "true", "yes"}
+SLOW_STATEMENTS_KEPT = 5
+
+
+@dataclass
+class RequestStats:
+    query_count: int = 0
+    db_time: float = 0.0
+    rows: int = 0
+    slowest: list[tuple[float, str]] = field(default_factory=list)
+
+    def record(self, statement: str, elapsed: float, rows: int):
+        self.query_count += 1
+        self.db_time += elapsed
+        self.rows += max(rows, 0)
+        self.slowest.append((elapsed, statement))
+        self.slowest.sort(key=lambda x: x[0], reverse=True)
+        del self.slowest[SLOW_STATEMENTS_KEPT:]
+
+
+@dataclass
+class RouteStats:
+    requests: int = 0
+    queries: int = 0
+    max_queries: int = 0
+    db_time: float = 0.0
+    total_time: float = 0.0
+    rows: int = 0
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("yh_request_stats", default=None)
+_routes: dict[str, RouteStats] = {}
+_slow: list[tuple[float, str, str]] = []
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("yh_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["yh_query_start"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    rows = cursor.rowcount
+    if rows is None or rows < 0:
+        # asyncpg 适配器对 SELECT 不返回 rowcount，结果已整体缓存在游标上
+        rows = len(getattr(cursor, "_rows", None) or ())
+    stats.record(statement, time.perf_counter() - started, rows)
+
+
+def instrument_engine(engine: Engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _route_key(request: Request) -> str:
+    route = request.scope.get("route")
+    path = getattr(route, "path", None) or request.url.path
+    return f"{request.method} {path}"
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next) -> Response:
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+        key = _route_key(request)
+        route = _routes.setdefault(key, RouteStats())
+        route.requests += 1
+        route.queries += stats.query_count
+        route.max_queries = max(route.max_queries, stats.query_count)
+        route.db_time += stats.db_time
+        route.total_time += total
+        route.rows += stats.rows
+        for elapsed, statement in stats.slowest:
+            _slow.append((elapsed, key, statement))
+        _slow.sort(key=lambda x: x[0], reverse=True)
+        del _slow[20:]
+
+        py_time = max(total - stats.db_time, 0)
+        response.headers["X-Query-Count"] = str(stats.query_count)
+        response.headers["X-DB-Time-ms"] = f"{stats.db_time * 1000:.2f}"
+        response.headers["Server-Timing"] = (
+            f"db;dur={stats.db_time * 1000:.2f};desc=\"{stats.query_count} queries\", "
+            f"app;dur={py_time * 1000:.2f}, total;dur={total * 1000:.2f}"
+        )
+        return response
+
+
+def snapshot() -> dict:
+    routes = {}
+    for key, r in sorted(_routes.items()):
+        routes[key] = {
+            "requests": r.requests,
+            "avg_queries": round(r.queries / r.requests, 2) if r.requests else 0,
+            "max_queries": r.max_queries,
+            "avg_db_ms": round(r.db_time / r.requests * 1000, 3) if r.requests else 0,
+            "avg_total_ms": round(r.total_time / r.requests * 1000, 3) if r.requests else 0,
+            "avg_python_ms": round(max(r.total_time - r.db_time, 0) / r.requests * 1000, 3) if r.requests else 0,
+            "avg_rows": round(r.rows / r.requests, 1) if r.requests else 0,
+        }
+    slow = [{"ms": round(e * 1000, 3), "route": k, "statement": s[:500]} for e, k, s in _slow]
+    return {"routes": routes, "slowest_statements": slow}
+
+
+@contextmanager
+def capture_queries() -> Iterator[RequestStats]:
+    # 测试中直接统计一段代码的 SQL，需先 instrument_engine
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[RequestStats]:
+    with capture_queries() as stats:
+        yield stats
+    if stats.query_count > limit:
+        statements = "\n".join(s for _, s in stats.slowest)
+        raise AssertionError(f"expected at most {limit} queries, got {stats.query_count}; slowest:\n{statements}")
+
+
+def assert_response_queries(response, limit: int):
+    # 配合 TestClient/httpx：按响应头断言端点的查询条数上限
+    count = int(response.headers.get("X-Query-Count", "0"))
+    if count > limit:
+        raise AssertionError(f"{response.request.method} {response.request.url.path}: {count} queries > {limit}")
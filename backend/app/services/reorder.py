@@ -0,0 +1,171 @@
+"""
+补货建议与低库存预警：按销量日汇总（sales_daily）计算每个商品在短、长两个滑动窗口内的日均销量，
+与当前库存、未到货的采购数量比较，给出预警级别与建议采购箱数，可直接生成采购单草稿交给 create_purchase_order。
+
+- 日均销量取短窗口与长窗口中较大的一个：节前放量时短窗口先升高，淡季回落时长窗口兜底；
+  use_forecast 时再与春节预测（forecast）在计划期（到货周期 + 覆盖天数）内的日均需求取较大值，
+  节前一次备足，不必等短窗口销量涨起来；
+- 可售天数 = 库存 / 日均销量；在途 = 未完成采购单中 quantity - received_qty（按箱，换算为件）；
+- 级别：out 已断货，critical 库存撑不到到货（可售天数 < 到货周期），low 库存加在途低于补货点
+  （日均销量 ×（到货周期 + 安全天数）），ok 其余；
+- 建议箱数 = 向上取整((日均销量 ×（到货周期 + 覆盖天数）- 库存 - 在途) / 每箱件数)。
+
+日汇总在下单事务内增量累加，这里只读窗口内的汇总行，不扫描销售明细。
+"""
+
+import math
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import schemas
+from app.models.entities import Inventory, Product, PurchaseItem, PurchaseOrder, SalesDaily
+from app.services import forecast, logic
+
+SHORT_WINDOW_DAYS = 7
+LONG_WINDOW_DAYS = 28
+LEVELS = ("out", "critical", "low", "ok")
+
+
+@dataclass
+class ReorderParams:
+    lead_days: int = 7  # 下单到到货的天数
+    cover_days: int = 14  # 到货后希望覆盖的天数
+    safety_days: int = 3
+    use_forecast: bool = False
+
+
+async def load_velocity(session: AsyncSession, today: date) -> dict[str, tuple[int, int]]:
+    # 商品 -> (短窗口销量, 长窗口销量)，窗口均含今天
+    short_start = today - timedelta(days=SHORT_WINDOW_DAYS - 1)
+    long_start = today - timedelta(days=LONG_WINDOW_DAYS - 1)
+    stmt = (
+        sa.select(
+            SalesDaily.product_id,
+            sa.func.coalesce(sa.func.sum(SalesDaily.quantity).filter(SalesDaily.day >= short_start), 0),
+            sa.func.sum(SalesDaily.quantity),
+        )
+        .where(SalesDaily.day >= long_start, SalesDaily.day <= today)
+        .group_by(SalesDaily.product_id)
+    )
+    return {pid: (int(short), int(long)) for pid, short, long in (await session.execute(stmt)).all()}
+
+
+async def load_open_purchases(session: AsyncSession, product_ids: list[str]) -> dict[str, int]:
+    # 未完成采购单中尚未到货的箱数
+    stmt = (
+        sa.select(PurchaseItem.product_id, sa.func.sum(PurchaseItem.quantity - PurchaseItem.received_qty))
+        .join(PurchaseOrder, PurchaseOrder.id == PurchaseItem.purchase_order_id)
+        .where(
+            PurchaseItem.product_id.in_(product_ids),
+            PurchaseOrder.status != "完成",
+            PurchaseItem.quantity > PurchaseItem.received_qty,
+        )
+        .group_by(PurchaseItem.product_id)
+    )
+    return {pid: int(boxes or 0) for pid, boxes in (await session.execute(stmt)).all()}
+
+
+async def load_stock(session: AsyncSession, product_ids: list[str]) -> dict[str, tuple[int, int]]:
+    stmt = (
+        sa.select(Inventory.product_id, sa.func.sum(Inventory.current_stock), sa.func.sum(Inventory.loose_units))
+        .where(Inventory.product_id.in_(product_ids))
+        .group_by(Inventory.product_id)
+    )
+    return {pid: (int(boxes or 0), int(loose or 0)) for pid, boxes, loose in (await session.execute(stmt)).all()}
+
+
+def evaluate(
+    product: Product,
+    stock_units: float,
+    on_order_units: float,
+    short_qty: int,
+    long_qty: int,
+    params: ReorderParams,
+    forecast_rate: float | None = None,
+) -> schemas.ReorderSuggestion:
+    spec_qty = logic.parse_spec_qty(product.spec)
+    short_rate = short_qty / SHORT_WINDOW_DAYS
+    long_rate = long_qty / LONG_WINDOW_DAYS
+    velocity = max(short_rate, long_rate, forecast_rate or 0)
+    days_of_cover = stock_units / velocity if velocity > 0 else None
+    if stock_units <= 0:
+        level = "out"
+    elif days_of_cover is not None and days_of_cover < params.lead_days:
+        level = "critical"
+    elif stock_units + on_order_units < velocity * (params.lead_days + params.safety_days):
+        level = "low"
+    else:
+        level = "ok"
+    shortfall = velocity * (params.lead_days + params.cover_days) - stock_units - on_order_units
+    boxes = math.ceil(shortfall / spec_qty) if level != "ok" and shortfall > 0 else 0
+    return schemas.ReorderSuggestion(
+        product_id=product.id,
+        name=product.name,
+        spec=product.spec,
+        level=level,
+        stock_units=int(stock_units),
+        on_order_units=int(on_order_units),
+        velocity_short=round(short_rate, 2),
+        velocity_long=round(long_rate, 2),
+        velocity_forecast=round(forecast_rate, 2) if forecast_rate is not None else None,
+        days_of_cover=round(days_of_cover, 1) if days_of_cover is not None else None,
+        suggested_boxes=boxes,
+        expected_cost=product.base_cost_price,
+    )
+
+
+async def suggest(
+    session: AsyncSession, params: ReorderParams | None = None, include_ok: bool = False, today: date | None = None
+) -> list[schemas.ReorderSuggestion]:
+    # 只评估长窗口内有销量（或计划期内有预测需求）的商品；按级别、可售天数排序
+    params = params or ReorderParams()
+    today = today or datetime.utcnow().date()
+    velocity = await load_velocity(session, today)
+    rates: dict[str, float] = {}
+    if params.use_forecast:
+        rates = await forecast.cache.demand_rates(session, today, params.lead_days + params.cover_days)
+    product_ids = list(velocity.keys() | rates.keys())
+    if not product_ids:
+        return []
+    products = (await session.execute(sa.select(Product).where(Product.id.in_(product_ids)))).scalars().all()
+    stock = await load_stock(session, product_ids)
+    open_boxes = await load_open_purchases(session, product_ids)
+
+    items: list[schemas.ReorderSuggestion] = []
+    for product in products:
+        spec_qty = logic.parse_spec_qty(product.spec)
+        boxes, loose = stock.get(product.id, (0, 0))
+        short_qty, long_qty = velocity.get(product.id, (0, 0))
+        item = evaluate(
+            product,
+            boxes * spec_qty + loose,
+            open_boxes.get(product.id, 0) * spec_qty,
+            short_qty,
+            long_qty,
+            params,
+            rates.get(product.id, 0.0) if params.use_forecast else None,
+        )
+        if include_ok or item.level != "ok":
+            items.append(item)
+    items.sort(key=lambda i: (LEVELS.index(i.level), i.days_of_cover if i.days_of_cover is not None else math.inf))
+    return items
+
+
+def build_purchase_draft(
+    suggestions: list[schemas.ReorderSuggestion], supplier: str, expected_date: date, created_by: str, remark: str | None
+) -> schemas.PurchaseOrder:
+    return schemas.PurchaseOrder(
+        status="待到货",
+        supplier=supplier,
+        expected_date=expected_date,
+        remark=remark,
+        created_by=created_by,
+        items=[
+            schemas.PurchaseItem(product_id=s.product_id, quantity=s.suggested_boxes, expected_cost=s.expected_cost)
+            for s in suggestions
+            if s.suggested_boxes > 0
+        ],
+    )
@@ -0,0 +1,225 @@
+"""
+数据访问接口。logic 中的核心业务流程（登录建号、定价、下单扣库存、库存调整、幂等键）只依赖 Repository：
+
+- SqlRepository：生产实现，包装请求内的 AsyncSession；
+- memory_store.MemoryRepository：带二级索引的内存实现（`YH_STORAGE=memory`），用于快速测试与容量压测。
+
+两种实现返回同样的 ORM 实体对象，业务规则（pricing.price_product、logic.apply_unit_delta）只有一份。
+"""
+
+import asyncio
+from datetime import date, datetime
+from typing import Iterable, Protocol
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.entities import Category, Inventory, Product, ProductCategory, SalesOrder, User
+from app.services import logic, metrics, pricing
+
+UNCATEGORIZED = "__uncategorized__"
+
+
+class Repository(Protocol):
+    async def get_user(self, user_id: str) -> User | None: ...
+
+    async def get_user_by_openid(self, openid: str) -> User | None: ...
+
+    async def add_user(self, user: User) -> User: ...
+
+    async def get_products(self, product_ids: Iterable[str], for_update: bool = False) -> dict[str, Product]: ...
+
+    async def get_global_multiplier(self) -> float: ...
+
+    async def search_products(
+        self, merchant_ids: set[str], custom_ids: set[str], keyword: str | None, offset: int, limit: int
+    ) -> tuple[list[Product], int]: ...
+
+    async def load_product_details(
+        self, products: list[Product]
+    ) -> tuple[dict[str, tuple[int, int]], dict[str, list[str]], dict[str, Category]]: ...
+
+    async def load_pricing_context(self, products: list[Product]) -> pricing.PricingContext: ...
+
+    async def get_inventory(self, product_id: str, warehouse_id: str = "default") -> Inventory | None: ...
+
+    async def lock_inventory(self, product_ids: list[str], warehouse_id: str = "default") -> dict[str, Inventory]: ...
+
+    async def update_inventory(
+        self, product_id: str, current_stock: int, loose_units: int, expected_version: int, warehouse_id: str = "default"
+    ) -> Inventory | None: ...
+
+    async def add_inventory_logs(
+        self, changes: list[tuple[str, int]], ref_type: str, ref_id: str, warehouse_id: str = "default"
+    ): ...
+
+    async def add_sales_order(self, order: SalesOrder) -> SalesOrder: ...
+
+    async def add_sales_daily(self, rows: list[tuple[str, date, int, float]]): ...
+
+    async def get_sales_order_by_idempotency_key(self, key: str) -> SalesOrder | None: ...
+
+    async def claim_idempotency_key(self, key: str, ttl_seconds: int) -> bool: ...
+
+    async def bind_idempotency_key(self, key: str, order_id: str): ...
+
+    async def purge_expired_idempotency_keys(self) -> int: ...
+
+    async def commit(self): ...
+
+    async def rollback(self): ...
+
+
+class SqlRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_user(self, user_id: str) -> User | None:
+        return await self.session.get(User, user_id)
+
+    async def get_user_by_openid(self, openid: str) -> User | None:
+        return (await self.session.execute(sa.select(User).where(User.openid == openid))).scalars().first()
+
+    async def add_user(self, user: User) -> User:
+        self.session.add(user)
+        await self.session.flush()
+        return user
+
+    async def get_products(self, product_ids: Iterable[str], for_update: bool = False) -> dict[str, Product]:
+        ids = sorted(set(product_ids))
+        if not ids:
+            return {}
+        stmt = sa.select(Product).where(Product.id.in_(ids))
+        if for_update:
+            # 按 id 顺序加锁，避免并发下单互相死锁
+            stmt = stmt.order_by(Product.id).with_for_update()
+            with metrics.time_stock_lock("product"):
+                rows = (await self.session.execute(stmt)).scalars().all()
+        else:
+            rows = (await self.session.execute(stmt)).scalars().all()
+        return {p.id: p for p in rows}
+
+    async def get_global_multiplier(self) -> float:
+        return await logic.get_global_multiplier(self.session)
+
+    async def search_products(
+        self, merchant_ids: set[str], custom_ids: set[str], keyword: str | None, offset: int, limit: int
+    ) -> tuple[list[Product], int]:
+        where_clause = []
+        if merchant_ids:
+            if UNCATEGORIZED in merchant_ids:
+                where_clause.append(
+                    sa.or_(Product.category_id.is_(None), Product.category_id.in_([m for m in merchant_ids if m != UNCATEGORIZED]))
+                )
+            else:
+                where_clause.append(Product.category_id.in_(list(merchant_ids)))
+        if custom_ids:
+            subq = sa.select(ProductCategory.product_id).where(ProductCategory.category_id.in_(list(custom_ids)))
+            where_clause.append(Product.id.in_(subq))
+        if keyword:
+            like = f"%{keyword}%"
+            where_clause.append(Product.name.ilike(like))
+
+        count_stmt = sa.select(sa.func.count()).select_from(Product)
+        if where_clause:
+            count_stmt = count_stmt.where(*where_clause)
+        total = (await self.session.execute(count_stmt)).scalar_one()
+
+        stmt = sa.select(Product)
+        if where_clause:
+            stmt = stmt.where(*where_clause)
+        stmt = stmt.offset(offset).limit(limit)
+        return list((await self.session.execute(stmt)).scalars().all()), total
+
+    async def load_product_details(
+        self, products: list[Product]
+    ) -> tuple[dict[str, tuple[int, int]], dict[str, list[str]], dict[str, Category]]:
+        # 并行获取库存与分类关联
+        product_ids = [p.id for p in products]
+        inv_stmt = (
+            sa.select(Inventory.product_id, sa.func.sum(Inventory.current_stock), sa.func.sum(Inventory.loose_units))
+            .where(Inventory.product_id.in_(product_ids))
+            .group_by(Inventory.product_id)
+        )
+        pc_stmt = sa.select(ProductCategory.product_id, ProductCategory.category_id).where(
+            ProductCategory.product_id.in_(product_ids)
+        )
+        inv_rows, pc_rows = await asyncio.gather(
+            self.session.execute(inv_stmt),
+            self.session.execute(pc_stmt),
+        )
+        stock = {pid: (int(box_qty or 0), int(loose_qty or 0)) for pid, box_qty, loose_qty in inv_rows.all()}
+        links: dict[str, list[str]] = {}
+        for pid, cid in pc_rows.all():
+            links.setdefault(pid, []).append(cid)
+
+        category_ids = {p.category_id for p in products if p.category_id}
+        for cids in links.values():
+            category_ids.update(cids)
+        categories: dict[str, Category] = {}
+        if category_ids:
+            rows = (await self.session.execute(sa.select(Category).where(Category.id.in_(category_ids)))).scalars().all()
+            categories = {c.id: c for c in rows}
+        return stock, links, categories
+
+    async def load_pricing_context(self, products: list[Product]) -> pricing.PricingContext:
+        return await logic.load_pricing_context(self.session, products)
+
+    async def get_inventory(self, product_id: str, warehouse_id: str = "default") -> Inventory | None:
+        return await self.session.get(Inventory, (product_id, warehouse_id), populate_existing=True)
+
+    async def lock_inventory(self, product_ids: list[str], warehouse_id: str = "default") -> dict[str, Inventory]:
+        return await logic.lock_inventory_records(self.session, product_ids, warehouse_id)
+
+    async def update_inventory(
+        self, product_id: str, current_stock: int, loose_units: int, expected_version: int, warehouse_id: str = "default"
+    ) -> Inventory | None:
+        stmt = (
+            sa.update(Inventory)
+            .where(
+                Inventory.product_id == product_id,
+                Inventory.warehouse_id == warehouse_id,
+                Inventory.version == expected_version,
+            )
+            .values(
+                current_stock=current_stock,
+                loose_units=loose_units,
+                updated_at=datetime.utcnow(),
+                version=Inventory.version + 1,
+            )
+            .returning(Inventory)
+            .execution_options(populate_existing=True)
+        )
+        return (await self.session.execute(stmt)).scalars().first()
+
+    async def add_inventory_logs(
+        self, changes: list[tuple[str, int]], ref_type: str, ref_id: str, warehouse_id: str = "default"
+    ):
+        await logic.log_inventory_bulk(self.session, changes, ref_type, ref_id, warehouse_id)
+
+    async def add_sales_order(self, order: SalesOrder) -> SalesOrder:
+        self.session.add(order)
+        await self.session.flush()
+        return order
+
+    async def add_sales_daily(self, rows: list[tuple[str, date, int, float]]):
+        await logic.add_sales_daily(self.session, rows)
+
+    async def get_sales_order_by_idempotency_key(self, key: str) -> SalesOrder | None:
+        return await logic.get_sales_order_by_idempotency_key(self.session, key)
+
+    async def claim_idempotency_key(self, key: str, ttl_seconds: int) -> bool:
+        return await logic.claim_idempotency_key(self.session, key, ttl_seconds)
+
+    async def bind_idempotency_key(self, key: str, order_id: str):
+        await logic.bind_idempotency_key(self.session, key, order_id)
+
+    async def purge_expired_idempotency_keys(self) -> int:
+        return await logic.purge_expired_idempotency_keys(self.session)
+
+    async def commit(self):
+        await self.session.commit()
+
+    async def rollback(self):
+        if self.session.in_transaction():
+            await self.session.rollback()
@@ -0,0 +1,296 @@
+"""
+目录批量调价与模拟：把整个商品目录按列装入数组，在拟定的全局/分类系数下一次算出
+全部商品的标准价、库存零售货值与毛利率。
+
+- simulate：只计算不落库，返回与当前价格的汇总差异（变动数、涨/降、按定价依据分布、货值与毛利率变化、影响最大的商品）；
+- apply：写入选定方案（全局系数、分类系数），并批量刷新受影响商品的 updated_at，使列表缓存失效。
+
+定价规则与 pricing.price_product 一致（例外价 > 商品系数 > 所属分类中最大的系数 > 全局系数），可用 utils/pricing_check.py 对比。
+列数据以 array 模块存放；安装可选依赖 numpy（`pip install ".[pricing]"`）时向量化计算，否则逐个计算，结果相同。
+"""
+
+import math
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import schemas
+from app.models.entities import Category, Inventory, Product, ProductCategory, SystemConfig
+from app.services import logic, pricing
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+BASIS_NAMES = pricing.BASIS_ORDER
+UPDATE_CHUNK = 1000
+
+
+@dataclass
+class Catalog:
+    product_ids: list[str] = field(default_factory=list)
+    names: list[str] = field(default_factory=list)
+    cost: array = field(default_factory=lambda: array("d"))
+    # 缺省值用 NaN 表示
+    fixed_price: array = field(default_factory=lambda: array("d"))
+    product_multiplier: array = field(default_factory=lambda: array("d"))
+    units: array = field(default_factory=lambda: array("d"))
+    category_ids: list[str] = field(default_factory=list)
+    category_multiplier: array = field(default_factory=lambda: array("d"))
+    # 商品-分类关联（含商家分类），按下标存放
+    edge_product: array = field(default_factory=lambda: array("q"))
+    edge_category: array = field(default_factory=lambda: array("q"))
+    global_multiplier: float = logic.DEFAULT_GLOBAL_MULTIPLIER
+
+
+def _nan_if_unset(value: float | None) -> float:
+    # 与 pricing.price_product 的真值判断一致：None 与 0 视为未设置
+    return float(value) if value else math.nan
+
+
+async def load_catalog(session: AsyncSession) -> Catalog:
+    catalog = Catalog()
+    category_rows = (await session.execute(sa.select(Category.id, Category.retail_multiplier))).all()
+    category_index: dict[str, int] = {}
+    for cid, multiplier in category_rows:
+        category_index[cid] = len(catalog.category_ids)
+        catalog.category_ids.append(cid)
+        catalog.category_multiplier.append(_nan_if_unset(multiplier))
+
+    product_rows = (
+        await session.execute(
+            sa.select(
+                Product.id,
+                Product.name,
+                Product.base_cost_price,
+                Product.fixed_retail_price,
+                Product.retail_multiplier,
+                Product.category_id,
+                Product.spec,
+            ).order_by(Product.id)
+        )
+    ).all()
+    stock_rows = (
+        await session.execute(
+            sa.select(
+                Inventory.product_id,
+                sa.func.sum(Inventory.current_stock),
+                sa.func.sum(Inventory.loose_units),
+            ).group_by(Inventory.product_id)
+        )
+    ).all()
+    stock = {pid: (int(boxes or 0), int(loose or 0)) for pid, boxes, loose in stock_rows}
+
+    product_index: dict[str, int] = {}
+    for pid, name, cost, fixed, multiplier, category_id, spec in product_rows:
+        idx = len(catalog.product_ids)
+        product_index[pid] = idx
+        catalog.product_ids.append(pid)
+        catalog.names.append(name)
+        catalog.cost.append(float(cost or 0))
+        catalog.fixed_price.append(float(fixed) if fixed is not None and fixed > 0 else math.nan)
+        catalog.product_multiplier.append(_nan_if_unset(multiplier))
+        boxes, loose = stock.get(pid, (0, 0))
+        catalog.units.append(boxes * logic.parse_spec_qty(spec) + loose)
+        if category_id in category_index:
+            catalog.edge_product.append(idx)
+            catalog.edge_category.append(category_index[category_id])
+
+    link_rows = (await session.execute(sa.select(ProductCategory.product_id, ProductCategory.category_id))).all()
+    for pid, cid in link_rows:
+        if pid in product_index and cid in category_index:
+            catalog.edge_product.append(product_index[pid])
+            catalog.edge_category.append(category_index[cid])
+
+    catalog.global_multiplier = await logic.get_global_multiplier(session)
+    return catalog
+
+
+def scenario_multipliers(catalog: Catalog, scenario: schemas.PricingScenario) -> tuple[float, array]:
+    multipliers = array("d", catalog.category_multiplier)
+    index = {cid: i for i, cid in enumerate(catalog.category_ids)}
+    for cid, value in scenario.category_multipliers.items():
+        if cid not in index:
+            raise ValueError(f"category not found: {cid}")
+        if value is not None and value <= 0:
+            raise ValueError(f"invalid multiplier for category {cid}")
+        multipliers[index[cid]] = _nan_if_unset(value)
+    global_multiplier = scenario.global_multiplier or catalog.global_multiplier
+    return global_multiplier, multipliers
+
+
+def compute_prices(catalog: Catalog, global_multiplier: float, category_multiplier: array) -> tuple[array, array]:
+    # 返回（标准价，定价依据下标），依据下标对应 BASIS_NAMES
+    if np is not None:
+        return _compute_prices_numpy(catalog, global_multiplier, category_multiplier)
+    n = len(catalog.product_ids)
+    best = [math.nan] * n
+    for p, c in zip(catalog.edge_product, catalog.edge_category):
+        m = category_multiplier[c]
+        if not math.isnan(m) and (math.isnan(best[p]) or m > best[p]):
+            best[p] = m
+    prices = array("d", bytes(8 * n))
+    basis = array("b", bytes(n))
+    for i in range(n):
+        if not math.isnan(catalog.fixed_price[i]):
+            prices[i], basis[i] = catalog.fixed_price[i], 0
+        elif not math.isnan(catalog.product_multiplier[i]):
+            prices[i], basis[i] = pricing.round2(catalog.cost[i] * catalog.product_multiplier[i]), 1
+        elif not math.isnan(best[i]):
+            prices[i], basis[i] = pricing.round2(catalog.cost[i] * best[i]), 2
+        else:
+            prices[i], basis[i] = pricing.round2(catalog.cost[i] * global_multiplier), 3
+    return prices, basis
+
+
+def _compute_prices_numpy(catalog: Catalog, global_multiplier: float, category_multiplier: array) -> tuple[array, array]:
+    n = len(catalog.product_ids)
+    cost = np.asarray(catalog.cost)
+    fixed = np.asarray(catalog.fixed_price)
+    product_multiplier = np.asarray(catalog.product_multiplier)
+    best = np.full(n, np.nan)
+    if len(catalog.edge_product):
+        edge_product = np.asarray(catalog.edge_product)
+        edge_category = np.asarray(catalog.edge_category)
+        # fmax 忽略 NaN：没有系数的分类不参与取最大值
+        np.fmax.at(best, edge_product, np.asarray(category_multiplier)[edge_category])
+    has_fixed = ~np.isnan(fixed)
+    has_product = ~has_fixed & ~np.isnan(product_multiplier)
+    has_category = ~has_fixed & ~has_product & ~np.isnan(best)
+    basis = np.select([has_fixed, has_product, has_category], [0, 1, 2], default=3).astype(np.int8)
+    multiplier = np.select([has_product, has_category], [product_multiplier, best], default=global_multiplier)
+    prices = np.where(has_fixed, fixed, np.round(cost * multiplier + 1e-9, 2))
+    return array("d", prices.tobytes()), array("b", basis.tobytes())
+
+
+def summarize(
+    catalog: Catalog,
+    global_multiplier: float,
+    before: tuple[array, array],
+    after: tuple[array, array],
+    top: int,
+) -> schemas.PricingSimulation:
+    old_prices, _ = before
+    new_prices, new_basis = after
+    units = catalog.units
+    if np is not None:
+        old = np.asarray(old_prices)
+        new = np.asarray(new_prices)
+        u = np.asarray(units)
+        cost_value = float(np.dot(np.asarray(catalog.cost), u))
+        before_value = float(np.dot(old, u))
+        after_value = float(np.dot(new, u))
+        delta = new - old
+        changed_mask = np.abs(delta) >= 0.005
+        raised = int(np.count_nonzero(delta >= 0.005))
+        lowered = int(np.count_nonzero(delta <= -0.005))
+        rates = np.divide(delta, old, out=np.zeros_like(delta), where=(old != 0) & changed_mask)
+        avg_rate = float(rates[changed_mask].mean()) if changed_mask.any() else 0.0
+        counts = np.bincount(np.asarray(new_basis), minlength=len(BASIS_NAMES))
+        basis_counts = {BASIS_NAMES[i]: int(counts[i]) for i in range(len(BASIS_NAMES))}
+        impact = np.abs(delta * u) + np.abs(delta) * 1e-6
+        order = np.argsort(-impact[changed_mask], kind="stable")[:top]
+        top_idx = np.flatnonzero(changed_mask)[order].tolist()
+    else:
+        cost_value = sum(c * n for c, n in zip(catalog.cost, units))
+        before_value = sum(p * n for p, n in zip(old_prices, units))
+        after_value = sum(p * n for p, n in zip(new_prices, units))
+        changed_idx = [i for i in range(len(old_prices)) if abs(new_prices[i] - old_prices[i]) >= 0.005]
+        raised = sum(1 for i in changed_idx if new_prices[i] > old_prices[i])
+        lowered = len(changed_idx) - raised
+        rates = [(new_prices[i] - old_prices[i]) / old_prices[i] for i in changed_idx if old_prices[i]]
+        avg_rate = sum(rates) / len(changed_idx) if changed_idx else 0.0
+        basis_counts = {name: 0 for name in BASIS_NAMES}
+        for b in new_basis:
+            basis_counts[BASIS_NAMES[b]] += 1
+
+        def impact(i: int) -> float:
+            diff = abs(new_prices[i] - old_prices[i])
+            return diff * units[i] + diff * 1e-6
+
+        top_idx = sorted(changed_idx, key=lambda i: -impact(i))[:top]
+
+    def margin(value: float) -> float:
+        return round((value - cost_value) / value * 100, 2) if value else 0.0
+
+    return schemas.PricingSimulation(
+        products=len(catalog.product_ids),
+        changed=raised + lowered,
+        raised=raised,
+        lowered=lowered,
+        global_multiplier=global_multiplier,
+        basis_counts=basis_counts,
+        cost_value=round(cost_value, 2),
+        retail_value_before=round(before_value, 2),
+        retail_value_after=round(after_value, 2),
+        retail_value_diff=round(after_value - before_value, 2),
+        margin_rate_before=margin(before_value),
+        margin_rate_after=margin(after_value),
+        avg_change_rate=round(avg_rate * 100, 2),
+        top_changes=[
+            schemas.PricingChange(
+                product_id=catalog.product_ids[i],
+                name=catalog.names[i],
+                old_price=old_prices[i],
+                new_price=new_prices[i],
+                basis=BASIS_NAMES[new_basis[i]],
+                units=units[i],
+            )
+            for i in top_idx
+        ],
+    )
+
+
+def changed_product_ids(catalog: Catalog, before: tuple[array, array], after: tuple[array, array]) -> list[str]:
+    old_prices, old_basis = before
+    new_prices, new_basis = after
+    return [
+        pid
+        for pid, op, np_, ob, nb in zip(catalog.product_ids, old_prices, new_prices, old_basis, new_basis)
+        if abs(np_ - op) >= 0.005 or ob != nb
+    ]
+
+
+async def simulate(
+    session: AsyncSession, scenario: schemas.PricingScenario
+) -> tuple[schemas.PricingSimulation, Catalog, tuple[array, array], tuple[array, array]]:
+    catalog = await load_catalog(session)
+    before = compute_prices(catalog, catalog.global_multiplier, catalog.category_multiplier)
+    global_multiplier, category_multiplier = scenario_multipliers(catalog, scenario)
+    after = compute_prices(catalog, global_multiplier, category_multiplier)
+    return summarize(catalog, global_multiplier, before, after, scenario.top), catalog, before, after
+
+
+async def apply(session: AsyncSession, scenario: schemas.PricingScenario) -> schemas.PricingSimulation:
+    result, catalog, before, after = await simulate(session, scenario)
+    now = datetime.utcnow()
+    if scenario.global_multiplier is not None:
+        await session.execute(
+            sa.update(SystemConfig)
+            .where(SystemConfig.key == "global_multiplier")
+            .values(value=str(scenario.global_multiplier))
+        )
+    if scenario.category_multipliers:
+        await session.execute(
+            sa.update(Category.__table__)
+            .where(Category.__table__.c.id == sa.bindparam("b_id"))
+            .values(
+                retail_multiplier=sa.bindparam("b_multiplier"),
+                updated_at=now,
+                version=Category.__table__.c.version + 1,
+            ),
+            [{"b_id": cid, "b_multiplier": value} for cid, value in scenario.category_multipliers.items()],
+        )
+    changed = changed_product_ids(catalog, before, after)
+    for i in range(0, len(changed), UPDATE_CHUNK):
+        await session.execute(
+            sa.update(Product)
+            .where(Product.id.in_(changed[i : i + UPDATE_CHUNK]))
+            .values(updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    return result
@@ -0,0 +1,36 @@
+"""
+大列表响应的快速序列化：商品列表、库存总览等接口直接把查询结果组装成 dict，由 orjson 编码为字节，
+不再逐行构造 pydantic 对象、也不经过 response_model 的二次校验（路由直接返回 FastJSONResponse，
+response_model 只用于生成接口文档）。
+
+输出格式与 FastAPI 默认的 JSONResponse 相同（紧凑分隔符、中文不转义），未安装 orjson（`pip install ".[json]"`）时
+回退到标准库 json，与 JSONResponse 逐字节一致。使用 orjson 时已知的差异：
+- 绝对值 >= 1e16 或 < 1e-4 的浮点数指数写法不同（orjson `1e16`、`1e-7`、`0.00001`，json `1e+16`、`1e-07`、`1e-05`），
+  解析后数值相同；其余浮点数（价格、金额等）输出相同；
+- NaN / Infinity：orjson 输出 `null`，回退路径与 JSONResponse 抛出 ValueError。快速路径的数据来自数据库数值列，
+  不含非有限值，因此不逐个检查。
+tests/test_serialization.py 覆盖上述行为；utils/serialization_check.py 用真实数据对比两条路径。
+"""
+
+import json
+from typing import Any
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
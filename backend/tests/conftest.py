@@ -0,0 +1,42 @@
+import os
+import tempfile
+from pathlib import Path
+
+# 必须在导入 app 之前设置：引擎与剖析中间件在导入时创建。
+# 默认使用临时 sqlite；YH_TEST_DATABASE_URL 可指向专用的 Postgres 测试库（会清空表）。
+_tmp = tempfile.mkdtemp(prefix="yh-test-")
+os.environ["DATABASE_URL"] = os.getenv("YH_TEST_DATABASE_URL", f"sqlite+aiosqlite:///{Path(_tmp) / 'test.db'}")
+os.environ["YH_PROFILING"] = "1"
+os.environ["YH_STORAGE"] = "postgres"
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from app.db import Base, SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services import catalog, logic  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as session:
+        await logic.ensure_defaults(session)
+        await session.commit()
+    catalog.snapshot.on_event("resync", None)
+    yield SessionLocal
+    # 连接绑定在当前事件循环上，每个测试结束后释放
+    await engine.dispose()
+
+
+@pytest.fixture
+async def client(db):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        yield c
@@ -0,0 +1,22 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_snapshot_revalidates_with_weak_etag(client):
+    first = await client.get("/api/catalog/snapshot", headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    for tag in (etag, f"W/{etag}", f'"other", W/{etag}'):
+        response = await client.get("/api/catalog/snapshot", headers={"Accept-Encoding": "gzip", "If-None-Match": tag})
+        assert response.status_code == 304, tag
+
+    # 不同编码的表示也按弱比较视为同一版本
+    identity = await client.get(
+        "/api/catalog/snapshot", headers={"Accept-Encoding": "identity", "If-None-Match": f"W/{etag}"}
+    )
+    assert identity.status_code == 304
+
+    stale = await client.get("/api/catalog/snapshot", headers={"If-None-Match": 'W/"stale"'})
+    assert stale.status_code == 200
@@ -0,0 +1,33 @@
+import pytest
+
+from app.models import schemas
+from app.services import logic
+
+pytestmark = pytest.mark.anyio
+
+
+def adjust(product_id: str, delta: int) -> dict:
+    return {"product_id": product_id, "delta": delta, "reason": "盘点"}
+
+
+async def test_adjust_returns_etag_for_next_conditional_write(client, db):
+    async with db() as session:
+        product = await logic.create_product(session, schemas.Product(name="吉祥", spec="10", base_cost_price=3))
+        await session.commit()
+
+    first = await client.post("/api/inventory/adjust", json=adjust(product.id, 5))
+    assert first.status_code == 200
+    assert first.headers["ETag"] == f'"{first.json()["version"]}"'
+
+    # 用上次响应的 ETag 直接发下一次条件写，无需重新读取
+    second = await client.post(
+        "/api/inventory/adjust", json=adjust(product.id, -2), headers={"If-Match": first.headers["ETag"]}
+    )
+    assert second.status_code == 200
+    assert second.headers["ETag"] == f'"{second.json()["version"]}"'
+    assert second.headers["ETag"] != first.headers["ETag"]
+
+    stale = await client.post(
+        "/api/inventory/adjust", json=adjust(product.id, 1), headers={"If-Match": first.headers["ETag"]}
+    )
+    assert stale.status_code == 412
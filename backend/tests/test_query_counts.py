@@ -0,0 +1,83 @@
+"""
+热点列表接口的查询条数：数据量增加后条数不变（没有按行的 N+1 查询）。
+条数上限来自 YH_PROFILING 中间件的 X-Query-Count 头与 profiling.capture_queries。
+"""
+
+import pytest
+
+from app.models import schemas
+from app.models.entities import ProductCategory
+from app.services import catalog, logic, profiling
+from app.services.repository import SqlRepository
+
+pytestmark = pytest.mark.anyio
+
+# 路径 -> 允许的最多查询条数
+LIST_ENDPOINTS = {
+    "/api/products?limit=100": 6,
+    "/api/products?limit=100&keyword=吉祥": 6,
+    "/api/inventory/overview": 1,
+    "/api/categories": 1,
+    "/api/categories/summary": 5,
+    "/api/sales?limit=100": 2,
+}
+
+
+async def seed(session_factory, start: int, count: int):
+    # 每批带商家分类、自定义分类关联与销售单，覆盖列表中需要逐行补充的字段
+    async with session_factory() as session:
+        merchant = await logic.create_category(
+            session, schemas.Category(name=f"商家{start}", is_custom=False, retail_multiplier=1.6)
+        )
+        custom = await logic.create_category(
+            session, schemas.Category(name=f"自定义{start}", is_custom=True, retail_multiplier=2.0)
+        )
+        products = []
+        for i in range(start, start + count):
+            products.append(
+                await logic.create_product(
+                    session,
+                    schemas.Product(name=f"吉祥{i}", spec="10", base_cost_price=3 + i, category_id=merchant.id),
+                )
+            )
+        session.add_all(ProductCategory(product_id=p.id, category_id=custom.id) for p in products[::2])
+        await session.flush()
+        repo = SqlRepository(session)
+        for p in products:
+            await logic.create_sales_order(
+                repo, [schemas.SalesItemPayload(product_id=p.id, quantity=1, actual_price=5)], "owner"
+            )
+        await session.commit()
+    # 直接写库不经过路由，补发路由会发布的事件，使目录快照重建
+    catalog.snapshot.on_event("resync", None)
+
+
+async def query_counts(client) -> dict[str, int]:
+    counts = {}
+    for path, limit in LIST_ENDPOINTS.items():
+        response = await client.get(path)
+        assert response.status_code == 200, path
+        profiling.assert_response_queries(response, limit)
+        counts[path] = int(response.headers["X-Query-Count"])
+    return counts
+
+
+async def test_list_endpoints_do_not_scale_queries_with_rows(client, db):
+    await seed(db, 0, 3)
+    small = await query_counts(client)
+    await seed(db, 3, 40)
+    large = await query_counts(client)
+    assert large == small
+
+
+async def test_price_lookups_prefetch_context(db):
+    await seed(db, 0, 30)
+    async with db() as session:
+        repo = SqlRepository(session)
+        with profiling.assert_max_queries(6):
+            items, total, _ = await logic.list_products_with_inventory(repo, offset=0, limit=100)
+        assert total == 30 and len(items) == 30
+        with profiling.capture_queries() as stats:
+            overview = await logic.inventory_overview(session)
+        assert len(overview) == 30
+        assert stats.query_count == 1
@@ -0,0 +1,64 @@
+import json
+import math
+import random
+
+import pytest
+from fastapi.responses import JSONResponse
+
+from app.services import serialization
+
+BACKENDS = ["json", pytest.param("orjson", marks=pytest.mark.skipif(serialization.orjson is None, reason="orjson"))]
+
+# 绝对值 >= 1e16 或 < 1e-4：orjson 与 json 的指数写法不同
+EXPONENT_FLOATS = [1e16, 1.2345678901234568e17, 1e22, 1.5e300, 1e-5, 1e-7, -3e-9]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(serialization, "orjson", None)
+    return request.param
+
+
+def reference(content) -> bytes:
+    return JSONResponse(content).body
+
+
+def test_matches_json_response(backend):
+    rng = random.Random(7)
+    content = {
+        "items": [
+            {
+                "id": f"p{i}",
+                "name": f"烟花{i} \"双响\"\n",
+                "spec": None,
+                "price": round(rng.uniform(0, 100000), rng.choice([0, 1, 2, 4])),
+                "stock": rng.randint(-5, 10**12),
+                "is_custom": i % 2 == 0,
+                "categories": [],
+            }
+            for i in range(500)
+        ],
+        "edges": [0.0, -0.0, 0.1, 12.34, 0.0001, 9999999999999998.0, 2.0**53, 5e-324, -1.5],
+        "total": 500,
+    }
+    assert serialization.dumps(content) == reference(content)
+
+
+@pytest.mark.parametrize("value", EXPONENT_FLOATS)
+def test_exponent_floats_round_trip(backend, value):
+    encoded = serialization.dumps({"v": value})
+    assert json.loads(encoded)["v"] == value
+    if backend == "json":
+        assert encoded == reference({"v": value})
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf])
+def test_non_finite_floats(backend, value):
+    with pytest.raises(ValueError):
+        reference({"v": value})
+    if backend == "json":
+        with pytest.raises(ValueError):
+            serialization.dumps({"v": value})
+    else:
+        assert serialization.dumps({"v": value}) == b'{"v":null}'
@@ -0,0 +1,235 @@
+"""
+端到端压测：在不同并发下测量主要接口的 p50/p95/p99 延迟与吞吐，结果写入 JSON，可与上次结果对比。
+
+前置：用 seed_data.py 灌好数据。默认在进程内通过 ASGI 直接调用 app（不经网络，便于对比代码改动）；
+指定 --base-url 则压测已启动的服务（如 4 worker 的 uvicorn）。
+
+运行：
+  uv run python backend/utils/benchmark.py --output files/bench.json
+  uv run python backend/utils/benchmark.py --base-url http://127.0.0.1:8000 --concurrency 1 8 32
+  uv run python backend/utils/benchmark.py --output files/bench_new.json --compare files/bench.json
+
+POST /api/sales 会真实写库（下单、扣库存），只能对压测库使用。
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+Scenario = Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+
+
+@dataclass
+class Catalog:
+    product_ids: list[str] = field(default_factory=list)
+    category_ids: list[str] = field(default_factory=list)
+
+
+def build_scenarios(catalog: Catalog) -> dict[str, Scenario]:
+    async def products_page(client, rng):
+        return await client.get("/api/products", params={"offset": rng.randint(0, 200) * 20, "limit": 20})
+
+    async def products_category(client, rng):
+        if not catalog.category_ids:
+            return await products_page(client, rng)
+        return await client.get("/api/products", params={"category_ids": rng.choice(catalog.category_ids), "limit": 20})
+
+    async def products_keyword(client, rng):
+        return await client.get("/api/products", params={"keyword": rng.choice(["吉祥", "礼花", "鞭炮", "0001"])})
+
+    async def inventory_overview(client, rng):
+        return await client.get("/api/inventory/overview")
+
+    async def dashboard_realtime(client, rng):
+        return await client.get("/api/dashboard/realtime")
+
+    async def dashboard_inventory_value(client, rng):
+        return await client.get("/api/dashboard/inventory_value")
+
+    async def dashboard_performance(client, rng):
+        return await client.get("/api/dashboard/performance")
+
+    async def price_batch(client, rng):
+        ids = rng.sample(catalog.product_ids, min(len(catalog.product_ids), 30))
+        return await client.post("/api/price/calculate", json={"product_ids": ids})
+
+    async def create_sales(client, rng):
+        items = [
+            {"product_id": pid, "quantity": rng.randint(1, 6), "actual_price": round(rng.uniform(5, 200), 2)}
+            for pid in rng.sample(catalog.product_ids, min(len(catalog.product_ids), rng.randint(1, 5)))
+        ]
+        return await client.post("/api/sales", params={"username": "bench"}, json=items)
+
+    return {
+        "products.page": products_page,
+        "products.category": products_category,
+        "products.keyword": products_keyword,
+        "inventory.overview": inventory_overview,
+        "dashboard.realtime": dashboard_realtime,
+        "dashboard.inventory_value": dashboard_inventory_value,
+        "dashboard.performance": dashboard_performance,
+        "price.batch": price_batch,
+        "sales.create": create_sales,
+    }
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+async def run_level(
+    client: httpx.AsyncClient, scenario: Scenario, concurrency: int, requests: int, seed: int
+) -> dict[str, Any]:
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker(worker_id: int):
+        nonlocal remaining, errors
+        rng = random.Random(seed * 1000 + worker_id)
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                resp = await scenario(client, rng)
+                if resp.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    wall = time.perf_counter() - wall_start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0,
+        "mean_ms": round(statistics.fmean(latencies), 3) if latencies else 0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(latencies[-1], 3) if latencies else 0,
+    }
+
+
+async def load_catalog(client: httpx.AsyncClient) -> Catalog:
+    catalog = Catalog()
+    resp = await client.get("/api/products", params={"limit": 100})
+    resp.raise_for_status()
+    catalog.product_ids = [p["id"] for p in resp.json()["items"]]
+    resp = await client.get("/api/categories")
+    resp.raise_for_status()
+    catalog.category_ids = [c["id"] for c in resp.json() if c.get("is_custom")]
+    return catalog
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_client(args: argparse.Namespace) -> httpx.AsyncClient:
+    if args.base_url:
+        limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+        return httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits)
+    from app.main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout)
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    results: list[dict[str, Any]] = []
+    async with make_client(args) as client:
+        catalog = await load_catalog(client)
+        if not catalog.product_ids:
+            raise SystemExit("没有商品数据，请先运行 seed_data.py")
+        scenarios = build_scenarios(catalog)
+        for name, scenario in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            await run_level(client, scenario, 1, args.warmup, args.seed)
+            for concurrency in args.concurrency:
+                level = await run_level(client, scenario, concurrency, args.requests, args.seed)
+                level["scenario"] = name
+                results.append(level)
+                print(
+                    f"{name:<28} c={concurrency:<4} rps={level['throughput_rps']:>9.1f} "
+                    f"p50={level['p50_ms']:>8.2f}ms p99={level['p99_ms']:>8.2f}ms err={level['errors']}"
+                )
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "target": args.base_url or "in-process",
+            "python": platform.python_version(),
+            "requests_per_level": args.requests,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict[str, Any], previous: dict[str, Any]):
+    prev = {(r["scenario"], r["concurrency"]): r for r in previous.get("results", [])}
+    print(f"\n对比 {previous.get('meta', {}).get('git_revision')} -> {current['meta'].get('git_revision')}")
+    for r in current["results"]:
+        old = prev.get((r["scenario"], r["concurrency"]))
+        if not old:
+            continue
+
+        def delta(key: str) -> str:
+            if not old[key]:
+                return "n/a"
+            return f"{(r[key] - old[key]) / old[key] * 100:+.1f}%"
+
+        print(
+            f"{r['scenario']:<28} c={r['concurrency']:<4} rps {delta('throughput_rps'):>8} "
+            f"p50 {delta('p50_ms'):>8} p99 {delta('p99_ms'):>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口延迟/吞吐压测")
+    parser.add_argument("--base-url", help="压测已启动的服务；缺省为进程内 ASGI")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="每个并发级别的请求数")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="*", help="只运行指定场景")
+    parser.add_argument("--output", help="结果 JSON 路径")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        path = Path(args.output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已写入 {path}")
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 清理商品固定零售价。
 - 规则：若 base_cost_price * spec 与 fixed_retail_price 相差不超过 ±5%，则清除 fixed_retail_price（置为空）。
 - 未清除的商品打印日志（ID、名称、base_cost_price、spec、fixed_retail_price、预期箱价）。
+- 通过 logic.update_products_bulk 一次批量更新，同时刷新 version/updated_at（列表与目录缓存随之失效）。
 
 运行：
   uv run python backend/utils/clean_fixed_retail_price.py
@@ -14,7 +15,9 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db import SessionLocal
+from app.models import schemas
 from app.models.entities import Product
+from app.services import logic
 
 NUM_RE = re.compile(r"(\d+(?:\.\d+)?)")
 TOLERANCE = 0.05  # 5%
@@ -36,7 +39,7 @@ def parse_spec(spec: Optional[str]) -> float:
 async def main():
     async with SessionLocal() as session:  # type: AsyncSession
         products = (await session.execute(select(Product))).scalars().all()
-        cleaned = 0
+        patches: list[schemas.ProductPatch] = []
         kept: list[tuple[str, str, float, float, float, float]] = []
         for p in products:
             if p.fixed_retail_price is None:
@@ -48,12 +51,14 @@ async def main():
                 continue
             diff_ratio = abs(p.fixed_retail_price - expected_pack) / expected_pack
             if diff_ratio <= TOLERANCE:
-                p.fixed_retail_price = None
-                cleaned += 1
+                patches.append(schemas.ProductPatch(id=p.id, version=p.version, fixed_retail_price=None))
             else:
                 kept.append((p.id, p.name, p.base_cost_price, spec_qty, p.fixed_retail_price, expected_pack))
-        if cleaned:
+        cleaned = 0
+        if patches:
+            results = await logic.update_products_bulk(session, patches)
             await session.commit()
+            cleaned = sum(1 for r in results if r.status == "updated")
         print(f"清理完成，清除 {cleaned} 条固定零售价。")
         if kept:
             print("未清除的商品（供检查）：")
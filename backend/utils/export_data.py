@@ -0,0 +1,60 @@
+"""
+导出销售明细、销售单、库存流水、商品快照供离线分析（app/services/export.py），服务端游标分批写出，内存占用恒定。
+- 默认写入 backend/files/export/，每个数据集一个或多个文件（按 --partition 分区）；
+- --format columnar：安装 pyarrow 时为 parquet，否则为 csv.gz；
+- --start/--end 为 UTC 日期（含两端），不指定时取数据中的最早/最晚日期；商品快照不支持日期筛选。
+
+运行：
+  uv run python backend/utils/export_data.py
+  uv run python backend/utils/export_data.py sales_items orders --format columnar --start 2025-01-01 --end 2025-12-31 --partition month
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import date
+from pathlib import Path
+
+from app.services import export
+
+OUTPUT_DIR = Path(__file__).resolve().parent.parent / "files" / "export"
+
+
+async def run(args: argparse.Namespace):
+    out_dir = Path(args.out)
+    for name in args.datasets or list(export.DATASETS):
+        dated = export.get_dataset(name).date_column is not None
+        started = time.perf_counter()
+        files = await export.export_dataset(
+            name,
+            out_dir,
+            fmt=args.format,
+            start=args.start if dated else None,
+            end=args.end if dated else None,
+            partition=args.partition if dated else "none",
+            chunk_size=args.chunk_size,
+        )
+        rows = sum(f.rows for f in files)
+        print(f"{name}: {rows} 行，{len(files)} 个文件，{time.perf_counter() - started:.1f}s")
+        for f in files:
+            print(f"  {f.path}  {f.rows}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式导出销售与库存数据")
+    parser.add_argument("datasets", nargs="*", help=f"{' / '.join(export.DATASETS)}，默认导出全部")
+    parser.add_argument("--format", default="csv", choices=export.FORMATS)
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    parser.add_argument("--partition", default="none", choices=export.PARTITIONS)
+    parser.add_argument("--chunk-size", type=int, default=export.CHUNK_SIZE)
+    parser.add_argument("--out", default=str(OUTPUT_DIR))
+    args = parser.parse_args()
+    unknown = [d for d in args.datasets if d not in export.DATASETS]
+    if unknown:
+        parser.error(f"unknown dataset: {', '.join(unknown)}")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
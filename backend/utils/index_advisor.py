@@ -0,0 +1,234 @@
+"""
+索引顾问 / 查询计划回归检查。
+
+对本地已灌数的数据库执行 app.services.logic 中的热点查询，抓取它们实际发出的 SELECT，
+逐条执行 EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)：
+- 扫描行数超过阈值的顺序扫描（Seq Scan）会被标记；
+- 与基线文件对比：出现新的大表顺序扫描、或总代价超过基线的 --cost-factor 倍，视为计划回归。
+有标记或回归时以非零状态码退出，可直接放进 CI。
+
+运行：
+  uv run python backend/utils/index_advisor.py                      # 仅报告
+  uv run python backend/utils/index_advisor.py --update-baseline    # 写入/刷新基线
+  uv run python backend/utils/index_advisor.py --baseline files/plan_baseline.json --seq-scan-rows 5000
+
+EXPLAIN ANALYZE 会真正执行语句，所有语句均在回滚的事务中执行。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db import load_database_url
+from app.models.entities import Category, Product, ProductCategory, SalesOrder
+from app.services import logic
+from app.services.repository import SqlRepository
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent.parent / "files" / "plan_baseline.json"
+
+
+async def sample_ids(session: AsyncSession) -> dict[str, Any]:
+    product = (await session.execute(sa.select(Product).limit(1))).scalars().first()
+    category_id = (
+        await session.execute(sa.select(Product.category_id).where(Product.category_id.is_not(None)).limit(1))
+    ).scalar()
+    custom_id = (await session.execute(sa.select(ProductCategory.category_id).limit(1))).scalar()
+    clerk = (await session.execute(sa.select(SalesOrder.created_by).limit(1))).scalar()
+    category_name = (await session.execute(sa.select(Category.name).limit(1))).scalar()
+    return {
+        "product": product,
+        "product_name": product.name if product else "",
+        "category_id": category_id,
+        "custom_id": custom_id,
+        "clerk": clerk,
+        "category_name": category_name or "",
+    }
+
+
+HotQuery = Callable[[AsyncSession, dict[str, Any]], Awaitable[Any]]
+
+
+def hot_queries() -> dict[str, HotQuery]:
+    today = datetime.utcnow().date()
+    return {
+        "products.page": lambda s, ids: logic.list_products_with_inventory(SqlRepository(s), offset=0, limit=20),
+        "products.deep_page": lambda s, ids: logic.list_products_with_inventory(SqlRepository(s), offset=2000, limit=20),
+        "products.merchant_category": lambda s, ids: logic.list_products_with_inventory(
+            SqlRepository(s), merchant_category_ids=[ids["category_id"]] if ids["category_id"] else None
+        ),
+        "products.custom_category": lambda s, ids: logic.list_products_with_inventory(
+            SqlRepository(s), category_ids=[ids["custom_id"]] if ids["custom_id"] else None
+        ),
+        "products.keyword": lambda s, ids: logic.list_products_with_inventory(SqlRepository(s), keyword=ids["product_name"][:2]),
+        "price.calculate": lambda s, ids: logic.calculate_price_for_product(SqlRepository(s), ids["product"]),
+        "sales.history": lambda s, ids: logic.list_sales_orders(s, date_from=today - timedelta(days=7)),
+        "sales.history_clerk": lambda s, ids: logic.list_sales_orders(s, created_by=ids["clerk"]),
+        "sales.history_product": lambda s, ids: logic.list_sales_orders(s, product_id=ids["product"].id),
+        "dashboard.realtime": lambda s, ids: logic.dashboard_realtime(s),
+        "purchase.query": lambda s, ids: logic.list_purchase_orders(s, statuses=["待到货"]),
+        "import.product_by_name": lambda s, ids: s.execute(
+            sa.select(Product).where(Product.name == ids["product_name"])
+        ),
+        "import.category_by_name": lambda s, ids: s.execute(
+            sa.select(Category).where(Category.name == ids["category_name"])
+        ),
+    }
+
+
+def walk(node: dict) -> list[dict]:
+    nodes = [node]
+    for child in node.get("Plans", []):
+        nodes.extend(walk(child))
+    return nodes
+
+
+def summarize_plan(plan: dict, seq_scan_rows: int) -> dict:
+    root = plan["Plan"]
+    scans: list[str] = []
+    flagged: list[dict] = []
+    for node in walk(root):
+        node_type = node.get("Node Type", "")
+        relation = node.get("Relation Name")
+        if relation:
+            scans.append(f"{node_type}:{relation}:{node.get('Index Name', '')}")
+        if node_type == "Seq Scan":
+            loops = node.get("Actual Loops", 1) or 1
+            scanned = (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * loops
+            if scanned >= seq_scan_rows:
+                flagged.append({"relation": relation, "rows_scanned": scanned, "filter": node.get("Filter")})
+    return {
+        "total_cost": root.get("Total Cost", 0),
+        "execution_ms": plan.get("Execution Time", 0),
+        "shared_hit": root.get("Shared Hit Blocks", 0),
+        "shared_read": root.get("Shared Read Blocks", 0),
+        "scans": sorted(set(scans)),
+        "seq_scans": flagged,
+    }
+
+
+async def capture_and_explain(engine, name: str, query: HotQuery, ids: dict, seq_scan_rows: int) -> list[dict]:
+    captured: list[tuple[str, Any]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            captured.append((statement, parameters))
+
+    Session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        async with Session() as session:
+            await query(session, ids)
+            await session.rollback()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    results: list[dict] = []
+    seen: set[str] = set()
+    async with engine.connect() as conn:
+        for idx, (statement, parameters) in enumerate(captured):
+            key = hashlib.sha1(statement.encode("utf-8")).hexdigest()[:12]
+            if key in seen:
+                continue
+            seen.add(key)
+            trans = await conn.begin()
+            try:
+                raw = (
+                    await conn.exec_driver_sql(
+                        "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters
+                    )
+                ).scalar_one()
+            finally:
+                await trans.rollback()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+            summary = summarize_plan(plan, seq_scan_rows)
+            summary.update({"query": name, "statement_id": f"{name}#{idx}", "sql_hash": key, "sql": statement})
+            results.append(summary)
+    return results
+
+
+def compare(results: list[dict], baseline: dict, cost_factor: float) -> list[str]:
+    regressions: list[str] = []
+    for item in results:
+        base = baseline.get(item["statement_id"])
+        if not base or base.get("sql_hash") != item["sql_hash"]:
+            continue
+        base_seq = {s["relation"] for s in base.get("seq_scans", [])}
+        for seq in item["seq_scans"]:
+            if seq["relation"] not in base_seq:
+                regressions.append(f"{item['statement_id']}: new seq scan on {seq['relation']} ({seq['rows_scanned']} rows)")
+        base_cost = base.get("total_cost") or 0
+        if base_cost and item["total_cost"] > base_cost * cost_factor:
+            regressions.append(
+                f"{item['statement_id']}: total cost {item['total_cost']:.1f} > {cost_factor}x baseline {base_cost:.1f}"
+            )
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> int:
+    engine = create_async_engine(load_database_url(), future=True)
+    try:
+        Session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        async with Session() as session:
+            ids = await sample_ids(session)
+        if not ids["product"]:
+            print("数据库中没有商品，请先灌数（见 utils/seed_data.py）")
+            return 2
+        results: list[dict] = []
+        for name, query in hot_queries().items():
+            if args.only and name not in args.only:
+                continue
+            results.extend(await capture_and_explain(engine, name, query, ids, args.seq_scan_rows))
+    finally:
+        await engine.dispose()
+
+    flagged = [r for r in results if r["seq_scans"]]
+    for r in results:
+        mark = "SEQ" if r["seq_scans"] else "ok "
+        print(f"[{mark}] {r['statement_id']:<34} cost={r['total_cost']:>10.1f} time={r['execution_ms']:>8.2f}ms")
+        for seq in r["seq_scans"]:
+            print(f"       seq scan on {seq['relation']}: {seq['rows_scanned']} rows, filter={seq['filter']}")
+
+    baseline_path = Path(args.baseline)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {r["statement_id"]: {k: v for k, v in r.items() if k != "sql"} for r in results}
+        baseline_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"基线已写入 {baseline_path}")
+        return 0
+
+    regressions: list[str] = []
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.cost_factor)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+    if regressions or (flagged and not args.allow_seq_scans):
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点查询 EXPLAIN 检查与计划回归对比")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", help="将完整结果写入 JSON 文件")
+    parser.add_argument("--seq-scan-rows", type=int, default=10000, help="顺序扫描行数超过该值即标记")
+    parser.add_argument("--cost-factor", type=float, default=2.0, help="总代价超过基线倍数视为回归")
+    parser.add_argument("--allow-seq-scans", action="store_true", help="只对回归返回非零状态码")
+    parser.add_argument("--only", nargs="*", help="只检查指定查询名")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
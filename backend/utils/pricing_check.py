@@ -0,0 +1,302 @@
+"""
+定价差异检查：pricing.price_product 统一定价前，标准价有三套实现，这里原样保留旧规则（去掉数据库访问与回写），
+对库中全部商品逐一对比新旧结果，并按预期的行为变化归类：
+
+- 旧 calculate_price_for_product（单品接口、下单快照、库存货值）：有自定义分类系数时只在自定义分类中取最大，
+  没有才看商家分类；并把选中的分类系数回写到 product.retail_multiplier。新规则在商家分类与自定义分类中一起取最大；
+- 旧 pricing.calculate_standard_price（内存模式）：例外价不要求大于 0，忽略商品系数与自定义分类；
+- 旧 price_with_prefetch（商品列表、批量定价）：与新规则一致，必须完全相同；
+- repricing 的列式/向量化计算（调价模拟）：与新规则必须完全相同。
+
+FIXTURES 固定了每一类预期差异的最小样例，每次运行先校验；库中出现不属于任何预期类别的差异时以非零状态码退出。
+旧单品定价回写的商品系数会让之后的分类调价不再生效。商品系数与所属分类（商家或自定义）某个系数相同的，
+列为疑似回写值；但脚本无法区分回写值与人工特意设置的同值系数，默认只列出，确认后用 --apply 清除
+（--keep 排除需要保留的商品）。商品系数与所属分类系数都不相同的（可能是回写后分类系数又被修改）只列出，供人工确认。
+
+运行：
+  uv run python backend/utils/pricing_check.py
+  uv run python backend/utils/pricing_check.py --limit 50
+  uv run python backend/utils/pricing_check.py --apply --keep <product_id> --keep <product_id>
+"""
+
+import argparse
+import asyncio
+import sys
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Callable
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db import load_database_url
+from app.services.events import PG_CHANNEL
+from app.models.entities import Product, ProductCategory
+from app.services import logic, pricing, repricing
+from app.services.pricing import PricingContext, PriceResult, round2
+
+MISMATCH = "未预期的差异"
+
+
+# ---- 旧实现（逻辑原样保留，不访问数据库、不回写） ----
+
+
+def legacy_price_for_product(product: Any, ctx: PricingContext) -> PriceResult:
+    if product.fixed_retail_price is not None and product.fixed_retail_price > 0:
+        return PriceResult(product.fixed_retail_price, "例外价")
+    if product.retail_multiplier:
+        return PriceResult(round2(product.base_cost_price * product.retail_multiplier), "商品系数")
+    multipliers = [m for m in (ctx.category_multipliers.get(c) for c in ctx.links.get(product.id, ())) if m]
+    if product.category_id and not multipliers:
+        multiplier = ctx.category_multipliers.get(product.category_id)
+        if multiplier:
+            multipliers.append(multiplier)
+    if multipliers:
+        return PriceResult(round2(product.base_cost_price * max(multipliers)), "分类系数")
+    return PriceResult(round2(product.base_cost_price * ctx.global_multiplier), "全局系数")
+
+
+def legacy_standard_price(product: Any, ctx: PricingContext) -> PriceResult:
+    cost = product.base_cost_price or 0
+    if product.fixed_retail_price is not None:
+        return PriceResult(product.fixed_retail_price, "例外价")
+    multiplier = ctx.category_multipliers.get(product.category_id)
+    if multiplier:
+        return PriceResult(round2(cost * multiplier), "分类系数")
+    return PriceResult(round2(cost * ctx.global_multiplier), "全局系数")
+
+
+def legacy_price_with_prefetch(product: Any, ctx: PricingContext) -> PriceResult:
+    if product.fixed_retail_price is not None and product.fixed_retail_price > 0:
+        return PriceResult(product.fixed_retail_price, "例外价")
+    if product.retail_multiplier:
+        return PriceResult(round2(product.base_cost_price * product.retail_multiplier), "商品系数")
+    multipliers: list[float] = []
+    for cid in [product.category_id, *ctx.links.get(product.id, [])]:
+        multiplier = ctx.category_multipliers.get(cid) if cid else None
+        if multiplier:
+            multipliers.append(multiplier)
+    if multipliers:
+        return PriceResult(round2(product.base_cost_price * max(multipliers)), "分类系数")
+    return PriceResult(round2(product.base_cost_price * ctx.global_multiplier), "全局系数")
+
+
+# ---- 预期差异的归类：返回原因，无法解释时返回 MISMATCH ----
+
+
+def _link_best(product: Any, ctx: PricingContext) -> float | None:
+    values = [m for m in (ctx.category_multipliers.get(c) for c in ctx.links.get(product.id, ())) if m]
+    return max(values) if values else None
+
+
+def explain_price_for_product(product: Any, ctx: PricingContext) -> str:
+    merchant = ctx.category_multipliers.get(product.category_id) if product.category_id else None
+    link_best = _link_best(product, ctx)
+    if link_best is not None and merchant and merchant > link_best:
+        return "商家分类系数高于自定义分类（旧实现只看自定义分类）"
+    return MISMATCH
+
+
+def explain_standard_price(product: Any, ctx: PricingContext) -> str:
+    if product.fixed_retail_price is not None and product.fixed_retail_price <= 0:
+        return "例外价不大于 0（旧实现仍按例外价）"
+    if product.fixed_retail_price is not None:
+        return MISMATCH
+    if product.retail_multiplier:
+        return "商品系数（旧实现忽略）"
+    merchant = ctx.category_multipliers.get(product.category_id) if product.category_id else None
+    link_best = _link_best(product, ctx)
+    if link_best is not None and (not merchant or link_best > merchant):
+        return "自定义分类系数更高（旧实现忽略自定义分类）"
+    return MISMATCH
+
+
+LEGACY_PATHS: list[tuple[str, Callable[[Any, PricingContext], PriceResult], Callable[[Any, PricingContext], str]]] = [
+    ("calculate_price_for_product", legacy_price_for_product, explain_price_for_product),
+    ("calculate_standard_price", legacy_standard_price, explain_standard_price),
+    ("price_with_prefetch", legacy_price_with_prefetch, lambda product, ctx: MISMATCH),
+]
+
+
+def _product(**kwargs) -> SimpleNamespace:
+    values = {"id": "p", "base_cost_price": 10.0, "fixed_retail_price": None, "retail_multiplier": None, "category_id": None}
+    return SimpleNamespace(**{**values, **kwargs})
+
+
+FIXTURE_CTX = PricingContext(
+    global_multiplier=1.5,
+    category_multipliers={"merchant_high": 2.5, "merchant_low": 1.2, "custom_mid": 1.8, "custom_none": None},
+    links={"linked": ["custom_mid"], "linked_none": ["custom_none"]},
+)
+
+# (说明, 商品, 新规则结果, {旧实现: 旧结果与差异原因；未列出的旧实现应与新规则相同})
+FIXTURES: list[tuple[str, SimpleNamespace, PriceResult, dict[str, tuple[PriceResult, str]]]] = [
+    ("全局系数", _product(), PriceResult(15.0, "全局系数"), {}),
+    ("例外价", _product(fixed_retail_price=99.0), PriceResult(99.0, "例外价"), {}),
+    (
+        "例外价为 0",
+        _product(fixed_retail_price=0.0),
+        PriceResult(15.0, "全局系数"),
+        {"calculate_standard_price": (PriceResult(0.0, "例外价"), "例外价不大于 0（旧实现仍按例外价）")},
+    ),
+    (
+        "商品系数",
+        _product(retail_multiplier=3.0, category_id="merchant_low"),
+        PriceResult(30.0, "商品系数"),
+        {"calculate_standard_price": (PriceResult(12.0, "分类系数"), "商品系数（旧实现忽略）")},
+    ),
+    (
+        "商家分类系数高于自定义分类",
+        _product(id="linked", category_id="merchant_high"),
+        PriceResult(25.0, "分类系数"),
+        {"calculate_price_for_product": (PriceResult(18.0, "分类系数"), "商家分类系数高于自定义分类（旧实现只看自定义分类）")},
+    ),
+    (
+        "自定义分类系数高于商家分类",
+        _product(id="linked", category_id="merchant_low"),
+        PriceResult(18.0, "分类系数"),
+        {"calculate_standard_price": (PriceResult(12.0, "分类系数"), "自定义分类系数更高（旧实现忽略自定义分类）")},
+    ),
+    (
+        "只有自定义分类",
+        _product(id="linked"),
+        PriceResult(18.0, "分类系数"),
+        {"calculate_standard_price": (PriceResult(15.0, "全局系数"), "自定义分类系数更高（旧实现忽略自定义分类）")},
+    ),
+    ("自定义分类未设系数", _product(id="linked_none", category_id="merchant_low"), PriceResult(12.0, "分类系数"), {}),
+]
+
+
+def classify(product: Any, ctx: PricingContext, new: PriceResult) -> dict[str, tuple[PriceResult, str]]:
+    # 旧实现 -> (旧结果, 差异原因)，结果相同的旧实现不出现
+    diffs = {}
+    for name, legacy, explain in LEGACY_PATHS:
+        old = legacy(product, ctx)
+        if abs(old.price - new.price) >= 0.005 or old.basis != new.basis:
+            diffs[name] = (old, explain(product, ctx))
+    return diffs
+
+
+def check_fixtures() -> list[str]:
+    failures = []
+    for label, product, expected, expected_diffs in FIXTURES:
+        new = pricing.price_product(product, FIXTURE_CTX)
+        if new != expected:
+            failures.append(f"{label}: 新规则 {new} != {expected}")
+        diffs = classify(product, FIXTURE_CTX, new)
+        if diffs != expected_diffs:
+            failures.append(f"{label}: 旧实现差异 {diffs} != {expected_diffs}")
+    return failures
+
+
+async def run(args: argparse.Namespace) -> int:
+    failures = check_fixtures()
+    print(f"固定样例 {len(FIXTURES)} 个，失败 {len(failures)} 个")
+    for line in failures:
+        print(f"  {line}")
+
+    engine = create_async_engine(load_database_url(), future=True)
+    Session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    try:
+        async with Session() as session:
+            products = (await session.execute(sa.select(Product))).scalars().all()
+            links: dict[str, list[str]] = {}
+            for pid, cid in (await session.execute(sa.select(ProductCategory.product_id, ProductCategory.category_id))).all():
+                links.setdefault(pid, []).append(cid)
+            ctx = await logic.load_pricing_context(session, products, links)
+            scalar = pricing.price_products(products, ctx)
+
+            catalog = await repricing.load_catalog(session)
+            prices, basis = repricing.compute_prices(catalog, catalog.global_multiplier, catalog.category_multiplier)
+    finally:
+        await engine.dispose()
+
+    vector_mismatches = []
+    for i, pid in enumerate(catalog.product_ids):
+        expected = scalar[pid]
+        got = (prices[i], repricing.BASIS_NAMES[basis[i]])
+        if abs(expected.price - got[0]) >= 0.005 or expected.basis != got[1]:
+            vector_mismatches.append((pid, catalog.names[i], expected, got))
+
+    reasons: dict[str, Counter] = {name: Counter() for name, _, _ in LEGACY_PATHS}
+    unexpected = []
+    written_back = []
+    stale_multipliers = []
+    for product in products:
+        new = scalar[product.id]
+        for name, (old, reason) in classify(product, ctx, new).items():
+            reasons[name][reason] += 1
+            if reason == MISMATCH:
+                unexpected.append((name, product, new, old))
+        if product.retail_multiplier:
+            own = {ctx.category_multipliers.get(c) for c in (product.category_id, *ctx.links.get(product.id, ())) if c}
+            if product.retail_multiplier in own:
+                written_back.append(product)
+            else:
+                stale_multipliers.append(product)
+
+    mode = "numpy" if repricing.np is not None else "array"
+    print(f"商品 {len(products)}，向量化实现（{mode}）与逐个定价不一致 {len(vector_mismatches)} 个")
+    for pid, name, expected, got in vector_mismatches[: args.limit]:
+        print(f"  {pid} {name}: {expected.price} {expected.basis} != {got[0]} {got[1]}")
+    for name, counter in reasons.items():
+        total = sum(counter.values())
+        print(f"旧 {name} 与新规则不同 {total} 个")
+        for reason, count in counter.most_common():
+            print(f"  {reason}: {count}")
+    for name, product, new, old in unexpected[: args.limit]:
+        print(f"  [{name}] {product.id} {product.name}: 旧 {old.price} {old.basis} / 新 {new.price} {new.basis}")
+    print(f"商品系数与所属分类系数相同 {len(written_back)} 个（疑似旧单品定价回写，确认后可用 --apply 清除）")
+    for product in written_back[: args.limit]:
+        print(f"  {product.id} {product.name}: 商品系数 {product.retail_multiplier}")
+    print(f"商品系数与所属分类系数都不相同 {len(stale_multipliers)} 个（可能是旧回写后分类系数已修改，请人工确认）")
+    for product in stale_multipliers[: args.limit]:
+        print(f"  {product.id} {product.name}: 商品系数 {product.retail_multiplier}")
+
+    if args.apply:
+        keep = set(args.keep)
+        targets = [p for p in written_back if p.id not in keep]
+        cleared = await clear_multipliers(targets)
+        print(f"已清除商品系数 {cleared} 个，保留 {len(written_back) - len(targets)} 个，跳过（期间已被修改）{len(targets) - cleared} 个")
+    return 1 if failures or vector_mismatches or unexpected else 0
+
+
+async def clear_multipliers(products: list[Any]) -> int:
+    # 按检查时读到的版本与系数条件更新，期间被修改过的商品跳过
+    if not products:
+        return 0
+    engine = create_async_engine(load_database_url(), future=True)
+    try:
+        async with engine.begin() as conn:
+            cleared = 0
+            for product in products:
+                result = await conn.execute(
+                    sa.update(Product)
+                    .where(
+                        Product.id == product.id,
+                        Product.version == product.version,
+                        Product.retail_multiplier == product.retail_multiplier,
+                    )
+                    .values(retail_multiplier=None, version=Product.version + 1)
+                )
+                cleared += result.rowcount
+            if cleared and conn.dialect.name == "postgresql":
+                # 通知启用了 postgres 事件转发的 worker 刷新商品目录与看板（事务提交后送达）
+                await conn.execute(
+                    sa.select(sa.func.pg_notify(PG_CHANNEL, '{"origin": "pricing_check", "reason": "pricing"}'))
+                )
+    finally:
+        await engine.dispose()
+    return cleared
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比新旧定价实现与向量化定价的结果")
+    parser.add_argument("--limit", type=int, default=20, help="每类最多列出的商品数")
+    parser.add_argument("--apply", action="store_true", help="清除疑似回写的商品系数（默认只列出）")
+    parser.add_argument("--keep", action="append", default=[], metavar="PRODUCT_ID", help="--apply 时保留的商品，可重复")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
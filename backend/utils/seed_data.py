@@ -0,0 +1,276 @@
+"""
+合成数据生成器：向本地数据库批量灌入商品、分类、多分类关联、库存以及多年的销售单与库存流水，
+供 index_advisor.py / benchmark.py 使用。相同参数与 --seed 生成的数据一致（日期以运行当天为终点），便于对比不同版本。
+
+运行：
+  uv run python backend/utils/seed_data.py --reset
+  uv run python backend/utils/seed_data.py --reset --products 20000 --years 3 --orders-per-day 400
+
+注意：--reset 会清空业务表，只能对本地/压测库使用。
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from app.db import load_database_url
+from app.migrations import run_migrations
+from app.services import logic
+from app.services.forecast import LUNAR_NEW_YEAR
+from app.models.entities import (
+    Category,
+    Inventory,
+    InventoryLog,
+    Product,
+    ProductCategory,
+    PurchaseItem,
+    PurchaseOrder,
+    SalesItem,
+    SalesOrder,
+)
+
+CHUNK_SIZE = 5000
+SPECS = ["1", "1", "6", "10", "12", "20", "24", "36", "100"]
+NAME_PARTS = ["吉祥", "如意", "满天星", "金龙", "凤凰", "礼花", "连珠", "旋转", "喷泉", "鞭炮", "冲天", "彩珠", "花炮", "雷霆", "牡丹"]
+CLERKS = ["owner", "店员1", "店员2", "店员3"]
+
+TRUNCATE_TABLES = [
+    "sales_daily",
+    "inventory_log",
+    "sales_item",
+    "sales_order",
+    "purchase_item",
+    "purchase_order",
+    "inventory",
+    "product_category",
+    "product_alias",
+    "product",
+    "category",
+    "idempotency_key",
+]
+
+
+def make_id(rng: random.Random) -> str:
+    # 由随机源生成 uuid，保证同一 --seed 的数据可复现
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def season_factor(day: date) -> float:
+    # 春节前三周逐步放量，除夕前后达到峰值，元宵后回落
+    best = 0.0
+    for lny in LUNAR_NEW_YEAR.values():
+        offset = (day - lny).days
+        if -21 <= offset <= 0:
+            best = max(best, 3 + 27 * (21 + offset) / 21)
+        elif 0 < offset <= 15:
+            best = max(best, 8 * (15 - offset) / 15 + 1)
+    return 1 + best
+
+
+async def insert_chunks(conn: AsyncConnection, table: sa.Table, rows: list[dict[str, Any]]):
+    for i in range(0, len(rows), CHUNK_SIZE):
+        await conn.execute(table.insert(), rows[i : i + CHUNK_SIZE])
+
+
+async def seed(args: argparse.Namespace):
+    rng = random.Random(args.seed)
+    engine = create_async_engine(load_database_url(), future=True)
+    started = time.perf_counter()
+    await run_migrations(engine)
+    async with engine.begin() as conn:
+        if args.reset:
+            await conn.exec_driver_sql(f"TRUNCATE {', '.join(TRUNCATE_TABLES)} CASCADE")
+
+        now = datetime.utcnow()
+        categories = [
+            {
+                "id": make_id(rng),
+                "name": f"分类{i:03d}",
+                "retail_multiplier": rng.choice([None, 1.4, 1.6, 1.8, 2.0]),
+                "is_custom": False,
+                "updated_at": now,
+            }
+            for i in range(args.categories)
+        ]
+        custom = [
+            {
+                "id": make_id(rng),
+                "name": f"自定义{i:03d}",
+                "retail_multiplier": rng.choice([None, None, 1.7, 2.2]),
+                "is_custom": True,
+                "updated_at": now,
+            }
+            for i in range(args.custom_categories)
+        ]
+        await insert_chunks(conn, Category.__table__, categories + custom)
+
+        products: list[dict[str, Any]] = []
+        for i in range(args.products):
+            cost = round(rng.uniform(2, 300), 2)
+            roll = rng.random()
+            products.append(
+                {
+                    "id": make_id(rng),
+                    "name": f"{rng.choice(NAME_PARTS)}{rng.choice(NAME_PARTS)}{i:06d}",
+                    "category_id": rng.choice(categories)["id"] if categories and rng.random() > 0.05 else None,
+                    "spec": rng.choice(SPECS),
+                    "base_cost_price": cost,
+                    "fixed_retail_price": round(cost * 2.1, 2) if roll < 0.05 else None,
+                    "retail_multiplier": 1.9 if 0.05 <= roll < 0.15 else None,
+                    "updated_at": now,
+                }
+            )
+        await insert_chunks(conn, Product.__table__, products)
+
+        links: list[dict[str, Any]] = []
+        for p in products:
+            k = min(len(custom), rng.randint(0, args.links_per_product))
+            for c in rng.sample(custom, k):
+                links.append({"product_id": p["id"], "category_id": c["id"]})
+        await insert_chunks(conn, ProductCategory.__table__, links)
+
+        inventory = [
+            {
+                "product_id": p["id"],
+                "warehouse_id": "default",
+                "current_stock": rng.randint(0, 200),
+                "loose_units": 0,
+                "updated_at": now,
+            }
+            for p in products
+        ]
+        await insert_chunks(conn, Inventory.__table__, inventory)
+
+        orders: list[dict[str, Any]] = []
+        items: list[dict[str, Any]] = []
+        logs: list[dict[str, Any]] = []
+        total_orders = 0
+        total_items = 0
+        start_day = now.date() - timedelta(days=int(365 * args.years))
+        day = start_day
+        while day <= now.date() and products:
+            count = int(args.orders_per_day * season_factor(day) * rng.uniform(0.7, 1.3))
+            for _ in range(count):
+                order_id = make_id(rng)
+                ts = datetime.combine(day, datetime.min.time()) + timedelta(seconds=rng.randint(8 * 3600, 22 * 3600))
+                total = 0.0
+                for _ in range(rng.randint(1, args.items_per_order)):
+                    p = rng.choice(products)
+                    qty = rng.randint(1, 12)
+                    standard = p["fixed_retail_price"] or round(p["base_cost_price"] * 1.5, 2)
+                    actual = round(standard * rng.uniform(0.85, 1.0), 2)
+                    total += actual * qty
+                    items.append(
+                        {
+                            "id": make_id(rng),
+                            "order_id": order_id,
+                            "product_id": p["id"],
+                            "quantity": qty,
+                            "snapshot_cost": p["base_cost_price"],
+                            "snapshot_standard_price": standard,
+                            "actual_sale_price": actual,
+                            "created_at": ts,
+                        }
+                    )
+                    if args.with_logs:
+                        logs.append(
+                            {
+                                "id": make_id(rng),
+                                "product_id": p["id"],
+                                "warehouse_id": "default",
+                                "change_date": ts,
+                                "change_qty": -qty,
+                                "type": "auto",
+                                "ref_type": "sales",
+                                "ref_id": "seed",
+                            }
+                        )
+                orders.append(
+                    {
+                        "id": order_id,
+                        "order_date": ts,
+                        "total_actual_amount": round(total, 2),
+                        "created_by": rng.choice(CLERKS),
+                    }
+                )
+            # 按块落库，控制内存
+            if len(items) >= CHUNK_SIZE * 4 or day == now.date():
+                await insert_chunks(conn, SalesOrder.__table__, orders)
+                await insert_chunks(conn, SalesItem.__table__, items)
+                await insert_chunks(conn, InventoryLog.__table__, logs)
+                total_orders += len(orders)
+                total_items += len(items)
+                orders, items, logs = [], [], []
+            day += timedelta(days=1)
+        # 直接批量写入的销售明细不经过下单流程，统一重算日汇总
+        await logic.rebuild_sales_daily(conn)
+
+        purchase_orders: list[dict[str, Any]] = []
+        purchase_items: list[dict[str, Any]] = []
+        for i in range(args.purchase_orders):
+            po_id = make_id(rng)
+            purchase_orders.append(
+                {
+                    "id": po_id,
+                    "status": rng.choice(["待到货", "部分到货", "完成"]),
+                    "supplier": f"供应商{rng.randint(1, 20)}",
+                    "expected_date": now.date() + timedelta(days=rng.randint(-60, 30)),
+                    "created_by": "owner",
+                    "created_at": now - timedelta(minutes=i),
+                }
+            )
+            for p in rng.sample(products, min(len(products), rng.randint(1, 20))):
+                qty = rng.randint(10, 100)
+                purchase_items.append(
+                    {
+                        "id": make_id(rng),
+                        "purchase_order_id": po_id,
+                        "product_id": p["id"],
+                        "quantity": qty,
+                        "expected_cost": p["base_cost_price"],
+                        "received_qty": rng.randint(0, qty),
+                    }
+                )
+        await insert_chunks(conn, PurchaseOrder.__table__, purchase_orders)
+        await insert_chunks(conn, PurchaseItem.__table__, purchase_items)
+
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.exec_driver_sql("ANALYZE")
+    await engine.dispose()
+    elapsed = time.perf_counter() - started
+    print(
+        f"已生成 分类 {len(categories) + len(custom)}，商品 {len(products)}，关联 {len(links)}，"
+        f"销售单 {total_orders}，明细 {total_items}，耗时 {elapsed:.1f}s"
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="生成压测/索引检查用的合成数据")
+    parser.add_argument("--reset", action="store_true", help="清空业务表后再生成")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=40)
+    parser.add_argument("--custom-categories", type=int, default=30)
+    parser.add_argument("--links-per-product", type=int, default=3)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--orders-per-day", type=int, default=60)
+    parser.add_argument("--items-per-order", type=int, default=4)
+    parser.add_argument("--purchase-orders", type=int, default=500)
+    parser.add_argument("--no-logs", dest="with_logs", action="store_false", help="不生成库存流水")
+    return parser
+
+
+def main():
+    asyncio.run(seed(build_parser().parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+序列化一致性检查：商品列表与库存总览的快速路径（dict + serialization.dumps）与
+FastAPI 默认路径（按 response_model 校验、序列化后由 JSONResponse 编码）逐字节比较，
+不一致时列出首个差异并以非零状态码退出。同时比较 orjson 与标准库回退的输出。
+
+运行：
+  uv run python backend/utils/serialization_check.py
+  uv run python backend/utils/serialization_check.py --pages 20 --limit 100
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from typing import Any
+
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db import load_database_url
+from app.models import schemas
+from app.services import logic, serialization
+from app.services.repository import SqlRepository
+
+
+def reference_bytes(model: Any, content: Any) -> bytes:
+    # 与 FastAPI serialize_response + JSONResponse.render 相同的处理
+    adapter = TypeAdapter(model)
+    data = adapter.dump_python(adapter.validate_python(content), mode="json", by_alias=True)
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def stdlib_bytes(content: Any) -> bytes:
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def first_difference(a: bytes, b: bytes) -> str:
+    i = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+    return f"偏移 {i}: {a[max(0, i - 60) : i + 60]!r} != {b[max(0, i - 60) : i + 60]!r}"
+
+
+async def run(args: argparse.Namespace) -> int:
+    engine = create_async_engine(load_database_url(), future=True)
+    Session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    cases: list[tuple[str, Any, Any]] = []
+    try:
+        async with Session() as session:
+            repo = SqlRepository(session)
+            for page in range(args.pages):
+                items, total, _ = await logic.list_products_with_inventory(repo, offset=page * args.limit, limit=args.limit)
+                if not items:
+                    break
+                cases.append((f"products[{page}]", schemas.ProductListResponse, {"items": items, "total": total}))
+            overview = await logic.inventory_overview(session)
+            cases.append(("inventory.overview", list[schemas.InventoryOverviewItem], overview))
+    finally:
+        await engine.dispose()
+
+    failures = 0
+    for name, model, content in cases:
+        fast = serialization.dumps(content)
+        for label, expected in (("response_model", reference_bytes(model, content)), ("json", stdlib_bytes(content))):
+            if fast != expected:
+                failures += 1
+                print(f"  {name} 与 {label} 不一致，{first_difference(fast, expected)}")
+    mode = "orjson" if serialization.orjson is not None else "json"
+    print(f"检查 {len(cases)} 个响应（{mode}），不一致 {failures} 处")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比快速序列化与 response_model 序列化的输出")
+    parser.add_argument("--pages", type=int, default=5, help="检查的商品列表页数")
+    parser.add_argument("--limit", type=int, default=100, help="每页商品数")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
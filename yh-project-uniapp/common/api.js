@@ -17,7 +17,8 @@ function request(path, options = {}) {
         if (res.statusCode >= 200 && res.statusCode < 300) {
           resolve(res.data)
         } else {
-          reject(res.data || { message: '请求失败' })
+          // statusCode 供页面区分 412（数据已被他人修改）等情况
+          reject({ ...(res.data || { message: '请求失败' }), statusCode: res.statusCode })
         }
       },
       fail: reject
@@ -78,7 +79,62 @@ async function cachedRequest(path, options = {}, cacheKey) {
   })
 }
 
+// 看板推送：服务端在销售/库存/收款变更后推送最新数据，返回 { close }
+function subscribeDashboard(onMessage) {
+  const url = `${API_BASE_URL.replace(/^http/, 'ws')}/api/dashboard/ws`
+  let closed = false
+  let task = null
+  let retryTimer = null
+
+  const connect = () => {
+    task = uni.connectSocket({ url, complete: () => {} })
+    task.onMessage((res) => {
+      try {
+        const msg = JSON.parse(res.data)
+        if (msg.type !== 'ping') onMessage(msg)
+      } catch (e) {}
+    })
+    task.onClose(() => {
+      if (!closed) retryTimer = setTimeout(connect, 3000)
+    })
+  }
+  connect()
+
+  return {
+    close() {
+      closed = true
+      clearTimeout(retryTimer)
+      if (task) task.close({})
+    }
+  }
+}
+
+// 目录快照为列式结构，展开为与商品列表接口相近的对象数组
+export function expandCatalog(snapshot) {
+  const cats = snapshot.categories
+  const cols = snapshot.products
+  return cols.id.map((id, i) => {
+    const catIdx = cols.categories[i] || []
+    return {
+      id,
+      name: cols.name[i],
+      spec: cols.spec[i],
+      category_ids: catIdx.map((c) => cats.id[c]),
+      category_name: catIdx.map((c) => cats.name[c]).join('、') || null,
+      base_cost_price: cols.cost[i],
+      standard_price: cols.price[i],
+      price_basis: snapshot.basis_names[cols.basis[i]],
+      stock: cols.stock[i],
+      effect_url: cols.effect_url[i]
+    }
+  })
+}
+
 export const api = {
+  subscribeDashboard,
+  getCatalogSnapshot() {
+    return cachedRequest('/api/catalog/snapshot', {}, 'catalog_snapshot')
+  },
   getRealtime() {
     return request('/api/dashboard/realtime')
   },
@@ -97,16 +153,35 @@ export const api = {
   getPurchaseOrders() {
     return request('/api/purchase-orders')
   },
-  createSales(items, username) {
+  // 低库存预警与建议采购量（只返回 out/critical/low）
+  getReorderSuggestions() {
+    return request('/api/inventory/reorder')
+  },
+  getFestivalForecast({ categoryId = '', limit = 50 } = {}) {
+    const params = [`limit=${limit}`]
+    if (categoryId) params.push(`category_id=${encodeURIComponent(categoryId)}`)
+    return request(`/api/forecast/festival?${params.join('&')}`)
+  },
+  createReorderPurchase(payload) {
+    return request('/api/purchase-orders/reorder', {
+      method: 'POST',
+      data: payload
+    })
+  },
+  createSales(items, username, idempotencyKey) {
     const qs = username ? `?username=${encodeURIComponent(username)}` : ''
     return request(`/api/sales${qs}`, {
       method: 'POST',
-      data: items
+      data: items,
+      header: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {}
     })
   },
   calculatePrice(productId) {
     return request(`/api/price/calculate/${productId}`)
   },
+  calculatePrices(productIds) {
+    return request('/api/price/calculate', { method: 'POST', data: { product_ids: productIds } })
+  },
   getProducts({
     offset = 0,
     limit = 20,
@@ -148,6 +223,11 @@ export const api = {
     const path = '/api/categories'
     return cachedRequest(path, {}, `cache:${path}`)
   },
+  // 每个分类的商品数、库存件数与货值（含“未分类”汇总行）
+  getCategorySummary() {
+    const path = '/api/categories/summary'
+    return cachedRequest(path, {}, `cache:${path}`)
+  },
   createCategory(data) {
     return request('/api/categories', { method: 'POST', data })
   },
@@ -164,6 +244,26 @@ export const api = {
       data: { product_ids: productIds }
     })
   },
+  // 批量增删分类下的商品：items 为 [{ category_id, add: [], remove: [] }]
+  assignCategories(items) {
+    return request('/api/categories/assignments', {
+      method: 'POST',
+      data: { items }
+    })
+  },
+  // 批量部分更新：items 为 [{ id, version?, ...要修改的字段 }]，逐条返回 updated/conflict/not_found/error
+  batchUpdateProducts(items) {
+    return request('/api/products/batch', {
+      method: 'POST',
+      data: { items }
+    })
+  },
+  batchDeleteProducts(productIds) {
+    return request('/api/products/batch/delete', {
+      method: 'POST',
+      data: { product_ids: productIds }
+    })
+  },
   createProduct(payload) {
     return request('/api/products', {
       method: 'POST',